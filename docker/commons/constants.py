@@ -178,6 +178,17 @@ ENV_VAULT_HOST = 'VAULT_URL'
 ENV_VAULT_PORT = 'VAULT_SERVICE_SERVICE_PORT'
 
 ENV_FORCE_RESCAN = 'FORCE_RESCAN'
+ENV_EXECUTOR_WORKERS = 'EXECUTOR_WORKERS'
+ENV_STREAM_METRICS = 'STREAM_METRICS'
+ENV_METRICS_STREAM_BUFFER = 'METRICS_STREAM_BUFFER'
+ENV_METRICS_MEMORY_LIMIT_MB = 'METRICS_MEMORY_LIMIT_MB'
+ENV_S3_CACHE_DIR = 'S3_CACHE_DIR'
+ENV_S3_CACHE_MAX_SIZE_MB = 'S3_CACHE_MAX_SIZE_MB'
+ENV_COMPRESS_RESULTS = 'COMPRESS_RESULTS'
+ENV_CLUSTERING_CACHE = 'CLUSTERING_CACHE'
+ENV_CLUSTERING_ENGINE = 'CLUSTERING_ENGINE'
+ENV_CLUSTERING_SEED = 'CLUSTERING_SEED'
+ENV_HISTORY_BATCH_SIZE = 'HISTORY_BATCH_SIZE'
 ENV_LM_TOKEN_LIFETIME_MINUTES = 'lm_token_lifetime_minutes'
 ENV_MODULAR_SECRETS_SERVICE_MODE = 'modular_secrets_service_mode'
 ENV_MODULAR_SDK_MONGO_URI = 'MODULAR_SDK_MONGO_URI'
@@ -1,6 +1,10 @@
+import multiprocessing
 import os.path
-from typing import Tuple, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Tuple, Optional, Set, Iterable, Sized
 
+import mongoengine
 from modular_sdk.commons.constants import ParentType
 from modular_sdk.models.application import Application
 from modular_sdk.models.parent import Parent
@@ -12,6 +16,7 @@ from commons.constants import (JOB_STEP_INITIALIZATION,
 from commons.exception import ExecutorException, LicenseForbiddenException
 from commons.log_helper import get_logger
 from commons.profiler import profiler
+from models import init_connection
 from models.algorithm import Algorithm
 from models.job import Job, JobStatusEnum, JobTenantStatusEnum
 from models.parent_attributes import LicensesParentMeta
@@ -19,11 +24,15 @@ from models.recommendation_history import RecommendationTypeEnum
 from models.storage import Storage
 from services import SERVICE_PROVIDER
 from services.algorithm_service import AlgorithmService
+from services.customer_preferences_service import \
+    CustomerPreferencesService
 from services.defect_dojo_service import DefectDojoService
 from services.environment_service import EnvironmentService
+from services.job_journal_service import JobJournalService
 from services.job_service import JobService
 from services.license_manager_service import LicenseManagerService
 from services.meta_service import MetaService
+from services.metric_frame import MetricFrame
 from services.metrics_service import MetricsService, \
     INSUFFICIENT_DATA_ERROR_TEMPLATE
 from services.mocked_data_service import MockedDataService
@@ -39,6 +48,8 @@ from services.rightsizer_application_service import \
 from services.rightsizer_parent_service import RightSizerParentService
 from services.schedule.schedule_service import ScheduleService
 from services.setting_service import SettingsService
+from services.shape_price_service import ShapePriceService
+from services.shape_service import ShapeService
 from services.storage_service import StorageService
 
 algorithm_service: AlgorithmService = SERVICE_PROVIDER.algorithm_service()
@@ -65,6 +76,13 @@ recommendation_history_service: RecommendationHistoryService = (
 meta_service: MetaService = SERVICE_PROVIDER.meta_service()
 resource_group_service: ResourceGroupService = (
     SERVICE_PROVIDER.resource_group_service())
+job_journal_service: JobJournalService = (
+    SERVICE_PROVIDER.job_journal_service())
+shape_service: ShapeService = SERVICE_PROVIDER.shape_service()
+shape_price_service: ShapePriceService = (
+    SERVICE_PROVIDER.shape_price_service())
+customer_preferences_service: CustomerPreferencesService = (
+    SERVICE_PROVIDER.customer_preferences_service())
 
 _LOG = get_logger('r8s-executor')
 
@@ -76,6 +94,7 @@ LICENSED_APPLICATION_ID = environment_service.get_licensed_application_id()
 PARENT_ID = environment_service.get_licensed_parent_id()
 
 DOJO_APPLICATION_MAP = {}
+WORKER_START_METHOD = 'forkserver'
 
 
 def set_job_fail_reason(exception: Exception):
@@ -122,6 +141,184 @@ def submit_licensed_job(application: Application, tenant_name: str):
     return licensed_job
 
 
+def _get_worker_caches(cloud: Optional[str], algorithm: Algorithm,
+                       parent_meta: LicensesParentMeta) -> tuple:
+    """
+    Job-scoped caches to restore in worker processes: workers are not
+    forked, so they do not inherit the caches of the current process.
+    Shape catalog of the cloud and its shapes allowed by the parent
+    are loaded here before they are sent. Price tables are sent as
+    loaded so far, tables of other (region, os) are loaded once per
+    worker.
+    """
+    if cloud:
+        catalog = shape_service.get_catalog(
+            cloud=cloud.upper(), resource_type=algorithm.resource_type)
+        if parent_meta:
+            customer_preferences_service.get_allowed_catalog_shapes(
+                catalog=catalog, parent_meta=parent_meta)
+    # sent as a single tuple: allowed shapes refer to the catalogs by
+    # identity, which is kept within one pickled object
+    return (shape_service.get_catalogs(),
+            shape_price_service.get_price_tables(),
+            customer_preferences_service.get_allowed_shapes_cache())
+
+
+def _init_instance_worker(shape_catalogs: dict = None,
+                          price_tables: dict = None,
+                          allowed_shapes_cache: dict = None):
+    # pymongo clients can not be shared, each worker opens its own one
+    mongoengine.disconnect_all()
+    init_connection()
+    shape_service.set_catalogs(shape_catalogs or {})
+    shape_price_service.set_price_tables(price_tables or {})
+    customer_preferences_service.set_allowed_shapes_cache(
+        allowed_shapes_cache or {})
+
+
+def load_metric_frame(metric_file_path, algorithm: Algorithm,
+                      to_relative_values: bool = True) -> MetricFrame:
+    _LOG.debug(f'Validating metric file: \'{metric_file_path}\'')
+    metric_frame = metrics_service.validate_metric_file(
+        algorithm=algorithm,
+        metric_file_path=metric_file_path)
+    if to_relative_values:
+        _LOG.debug(f'Reformatting metric file: \'{metric_file_path}\'')
+        reformat_service.to_relative_values(
+            metrics_file_path=metric_file_path,
+            algorithm=algorithm,
+            metric_frame=metric_frame)
+    return metric_frame
+
+
+def _process_instance(metric_file_path, algorithm: Algorithm, reports_dir,
+                      instance_meta_mapping: dict,
+                      parent_meta: LicensesParentMeta,
+                      to_relative_values: bool = True,
+                      feedback_mapping: dict = None):
+    try:
+        metric_frame = load_metric_frame(
+            metric_file_path=metric_file_path,
+            algorithm=algorithm,
+            to_relative_values=to_relative_values)
+    except Exception as e:
+        error_item = recommendation_service.format_error_report(
+            metric_file_path=metric_file_path,
+            exception=e)
+        return error_item, None, False
+    result, history_items = recommendation_service.process_instance(
+        metric_file_path=metric_file_path,
+        algorithm=algorithm,
+        reports_dir=reports_dir,
+        instance_meta_mapping=instance_meta_mapping,
+        parent_meta=parent_meta,
+        metric_frame=metric_frame,
+        feedback_mapping=feedback_mapping
+    )
+    return result, history_items, True
+
+
+def process_instances(metric_file_paths: Iterable[str], algorithm: Algorithm,
+                      reports_dir, instance_meta_mapping: dict,
+                      parent_meta: LicensesParentMeta,
+                      mocked_file_paths: Set[str] = None,
+                      feedback_mapping: dict = None,
+                      cloud: str = None):
+    """
+    Yields (metric_file_path, result, history_items, is_valid) for each of
+    the given metric files in the order they were passed. Each metric
+    file is parsed once and the parsed frame is used for validation,
+    reformatting and analysis. For invalid files the result is an error
+    report. Depending on the configured amount of workers, instances are
+    analysed either in the current process or in a pool of worker
+    processes. Metric files may be given as a lazy iterable, in that case
+    instances are submitted to the pool as they arrive. Reports and
+    history items are always persisted by the caller. Past
+    recommendations with feedback are taken from the feedback mapping
+    if it is given, otherwise they are queried per instance. In the pool
+    mode at most workers + metrics stream buffer instances are submitted
+    ahead of the yielded ones, so lazily given metric files are not
+    consumed faster than they are analysed. Shape catalog of the cloud
+    is preloaded once and restored in each worker.
+    """
+    mocked_file_paths = mocked_file_paths or set()
+    workers = environment_service.executor_workers()
+    if isinstance(metric_file_paths, Sized):
+        workers = min(workers, len(metric_file_paths))
+    if workers <= 1:
+        for metric_file_path in metric_file_paths:
+            _LOG.debug(f'Processing instance: \'{metric_file_path}\'')
+            result, history_items, is_valid = _process_instance(
+                metric_file_path=metric_file_path,
+                algorithm=algorithm,
+                reports_dir=reports_dir,
+                instance_meta_mapping=instance_meta_mapping,
+                parent_meta=parent_meta,
+                to_relative_values=metric_file_path not in mocked_file_paths,
+                feedback_mapping=feedback_mapping
+            )
+            yield metric_file_path, result, history_items, is_valid
+        return
+
+    _LOG.info(f'Processing instances with {workers} worker processes')
+    # workers are not forked: metric files may be streamed by download
+    # threads which must not be copied into a child mid-operation
+    max_pending = workers + environment_service.metrics_stream_buffer()
+    with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_instance_worker,
+            initargs=_get_worker_caches(cloud=cloud, algorithm=algorithm,
+                                        parent_meta=parent_meta),
+            mp_context=multiprocessing.get_context(
+                WORKER_START_METHOD)) as executor:
+        pending = deque()
+        for metric_file_path in metric_file_paths:
+            while len(pending) >= max_pending:
+                # wait for the head instance before taking the next one
+                pending_file_path, future = pending.popleft()
+                yield pending_file_path, *future.result()
+            instance_id = recommendation_service.get_instance_id(
+                metric_file_path=metric_file_path)
+            instance_meta = instance_meta_mapping
+            if instance_meta_mapping:
+                # send workers only the meta of their own instance
+                instance_meta = {
+                    instance_id: instance_meta_mapping.get(instance_id)}
+            instance_feedback = feedback_mapping
+            if feedback_mapping is not None:
+                instance_feedback = {
+                    instance_id: feedback_mapping.get(instance_id, [])}
+            pending.append((metric_file_path, executor.submit(
+                _process_instance,
+                metric_file_path=metric_file_path,
+                algorithm=algorithm,
+                reports_dir=reports_dir,
+                instance_meta_mapping=instance_meta,
+                parent_meta=parent_meta,
+                to_relative_values=metric_file_path not in mocked_file_paths,
+                feedback_mapping=instance_feedback
+            )))
+            while pending and pending[0][1].done():
+                pending_file_path, future = pending.popleft()
+                yield pending_file_path, *future.result()
+        while pending:
+            metric_file_path, future = pending.popleft()
+            yield metric_file_path, *future.result()
+
+
+def journal_instances(tenant: str, algorithm: Algorithm,
+                      instances: Iterable[Tuple[str, str, dict]]):
+    """
+    Marks the given (resource_id, region, report) instances as processed
+    in the job journal with a single write
+    """
+    job_journal_service.add_many(
+        job_id=JOB_ID,
+        tenant=tenant,
+        resource_type=algorithm.resource_type,
+        instances=instances
+    )
+
+
 def process_tenant_instances(metrics_dir, reports_dir,
                              input_storage, output_storage,
                              parent_meta: LicensesParentMeta,
@@ -147,21 +344,58 @@ def process_tenant_instances(metrics_dir, reports_dir,
                    'recommendations is omitted')
         recommendations_map = {}
 
+    completed_map = job_journal_service.get_completed(
+        job_id=JOB_ID,
+        tenant=tenant,
+        resource_type=algorithm.resource_type)
+    if completed_map:
+        _LOG.info(f'Resuming job {JOB_ID}: {len(completed_map)} instances '
+                  f'of tenant {tenant} are already processed and will be '
+                  f'skipped')
+
     cloud = licensed_application.meta.cloud.lower()
 
-    insufficient_map, unchanged_map = storage_service.download_metrics(
-        data_source=input_storage,
-        output_path=metrics_dir,
-        resource_type=algorithm.resource_type,
-        scan_customer=licensed_application.customer_id,
-        scan_clouds=[cloud],
-        scan_tenants=[tenant],
-        scan_from_date=SCAN_FROM_DATE,
-        scan_to_date=SCAN_TO_DATE,
-        max_days=algorithm.recommendation_settings.max_days,
-        min_days=algorithm.recommendation_settings.min_allowed_days,
-        recommendations_map=recommendations_map,
-        force_rescan=force_rescan)
+    # resource groups and mocked data require the whole set of tenant
+    # instances before the analysis, so streaming is not applicable
+    stream_metrics = (environment_service.stream_metrics()
+                      and not parent_meta.resource_groups
+                      and not environment_service.is_debug())
+    if stream_metrics:
+        _LOG.info('Streaming tenant metrics, instances will be analysed '
+                  'as soon as their metrics are downloaded')
+        insufficient_map, unchanged_map, instance_metric_files = (
+            storage_service.stream_metrics(
+                data_source=input_storage,
+                output_path=metrics_dir,
+                resource_type=algorithm.resource_type,
+                scan_customer=licensed_application.customer_id,
+                scan_clouds=[cloud],
+                scan_tenants=[tenant],
+                scan_from_date=SCAN_FROM_DATE,
+                scan_to_date=SCAN_TO_DATE,
+                max_days=algorithm.recommendation_settings.max_days,
+                min_days=algorithm.recommendation_settings.min_allowed_days,
+                recommendations_map=recommendations_map,
+                force_rescan=force_rescan,
+                buffer_size=environment_service.metrics_stream_buffer(),
+                exclude_instance_ids=set(completed_map),
+                memory_limit_mb=(environment_service.
+                                 metrics_memory_limit_mb())))
+    else:
+        insufficient_map, unchanged_map = storage_service.download_metrics(
+            data_source=input_storage,
+            output_path=metrics_dir,
+            resource_type=algorithm.resource_type,
+            scan_customer=licensed_application.customer_id,
+            scan_clouds=[cloud],
+            scan_tenants=[tenant],
+            scan_from_date=SCAN_FROM_DATE,
+            scan_to_date=SCAN_TO_DATE,
+            max_days=algorithm.recommendation_settings.max_days,
+            min_days=algorithm.recommendation_settings.min_allowed_days,
+            recommendations_map=recommendations_map,
+            force_rescan=force_rescan,
+            exclude_instance_ids=set(completed_map))
 
     tenant_folder_path = os.path.join(
         metrics_dir,
@@ -174,39 +408,29 @@ def process_tenant_instances(metrics_dir, reports_dir,
     instance_meta_mapping = metrics_service.read_meta(
         metrics_folder=tenant_folder_path)
 
-    _LOG.info('Merging metric files by date')
-    metrics_service.merge_metric_files(
-        metrics_folder_path=tenant_folder_path,
-        algorithm=algorithm)
+    if stream_metrics:
+        metric_file_paths = (
+            metrics_service.merge_instance_metric_files(
+                metric_files=metric_files, algorithm=algorithm)
+            for _, metric_files in instance_metric_files)
+    else:
+        _LOG.info('Merging metric files by date')
+        metrics_service.merge_metric_files(
+            metrics_folder_path=tenant_folder_path,
+            algorithm=algorithm)
 
-    _LOG.info('Extracting tenant metric files')
-    metric_file_paths = os_service.extract_metric_files(
-        algorithm=algorithm, metrics_folder_path=tenant_folder_path)
-
-    _LOG.debug('Reformatting metrics to relative metric values')
-    for metric_file_path in metric_file_paths.copy():
-        try:
-            _LOG.debug(f'Validating metric file: \'{metric_file_path}\'')
-            metrics_service.validate_metric_file(
-                algorithm=algorithm,
-                metric_file_path=metric_file_path)
-            _LOG.debug(f'Reformatting metric file: \'{metric_file_path}\'')
-            reformat_service.to_relative_values(
-                metrics_file_path=metric_file_path,
-                algorithm=algorithm)
-        except Exception as e:
-            metric_file_paths.remove(metric_file_path)
-            recommendation_service.dump_error_report(
-                reports_dir=reports_dir,
-                metric_file_path=metric_file_path,
-                exception=e)
+        _LOG.info('Extracting tenant metric files')
+        metric_file_paths = os_service.extract_metric_files(
+            algorithm=algorithm, metrics_folder_path=tenant_folder_path)
 
+    mocked_file_paths = set()
     if environment_service.is_debug():
         _LOG.info('Searching for instances to replace with mocked data')
-        mocked_data_service.process(
+        # mocked metrics are generated as relative values already
+        mocked_file_paths = set(mocked_data_service.process(
             instance_meta_mapping=instance_meta_mapping,
             metric_file_paths=metric_file_paths
-        )
+        ))
 
     if insufficient_map:
         _LOG.info(f'Dumping {len(insufficient_map.keys())} instances '
@@ -234,6 +458,24 @@ def process_tenant_instances(metrics_dir, reports_dir,
                 cloud=cloud.lower(),
                 recommendations=past_recommendations
             )
+    if completed_map:
+        _LOG.info(f'Restoring reports of {len(completed_map)} instances '
+                  f'processed before the job restart')
+        for journal_item in completed_map.values():
+            recommendation_service.save_report(
+                reports_dir=reports_dir,
+                customer=licensed_application.customer_id,
+                cloud=cloud,
+                tenant=tenant,
+                region=journal_item.region,
+                item=job_journal_service.get_report(item=journal_item)
+            )
+        if dojo_application and dojo_parent:
+            tenant_recommendations.extend(
+                recommendation_history_service.get_job_recommendations(
+                    job_id=JOB_ID,
+                    resource_ids=list(completed_map)
+                ))
 
     group_resources_mapping = {} # {$group_id: {"tag/arn": ['resource1']}}
     if parent_meta.resource_groups:
@@ -281,13 +523,29 @@ def process_tenant_instances(metrics_dir, reports_dir,
             _LOG.debug(f'Processing group {group_id} resources')
             for group_key, resources in group_resources.items():
                 _LOG.debug(f'Processing group {group_id}:{group_key}')
+                metric_frames = {}
+                for metric_file_path in resources:
+                    try:
+                        metric_frames[metric_file_path] = load_metric_frame(
+                            metric_file_path=metric_file_path,
+                            algorithm=algorithm,
+                            to_relative_values=
+                            metric_file_path not in mocked_file_paths)
+                    except Exception as e:
+                        recommendation_service.dump_error_report(
+                            reports_dir=reports_dir,
+                            metric_file_path=metric_file_path,
+                            exception=e)
+                if not metric_frames:
+                    continue
                 recommendation_service.process_group_resources(
                     group_id=f'{group_id}:{group_key}',
                     group_policy=group,
-                    metric_file_paths=resources,
+                    metric_file_paths=list(metric_frames),
                     algorithm=algorithm,
                     reports_dir=reports_dir,
-                    instance_meta_mapping=instance_meta_mapping
+                    instance_meta_mapping=instance_meta_mapping,
+                    metric_frames=metric_frames
                 )
 
     dojo_service = None
@@ -307,25 +565,52 @@ def process_tenant_instances(metrics_dir, reports_dir,
     group_results = {}
     group_history_items = []
     instance_region_mapping = {}
-    _LOG.info(f'Tenant {tenant} metric file paths to '
-              f'process: \'{metric_file_paths}\'')
-    for index, metric_file_path in enumerate(metric_file_paths, start=1):
-        _LOG.debug(
-            f'Processing {index}/{len(metric_file_paths)} instance: '
-            f'\'{metric_file_path}\'')
-        result, history_items = recommendation_service.process_instance(
-            metric_file_path=metric_file_path,
-            algorithm=algorithm,
-            reports_dir=reports_dir,
-            instance_meta_mapping=instance_meta_mapping,
-            parent_meta=parent_meta
-        )
+    if not stream_metrics:
+        _LOG.info(f'Tenant {tenant} metric file paths to '
+                  f'process: \'{metric_file_paths}\'')
+    _LOG.debug(f'Querying for tenant {tenant} recommendations with '
+               f'feedback')
+    feedback_mapping = recommendation_history_service. \
+        get_tenant_feedback_map(tenant=tenant)
+    unjournaled = []
+    instance_results = process_instances(
+        metric_file_paths=metric_file_paths,
+        algorithm=algorithm,
+        reports_dir=reports_dir,
+        instance_meta_mapping=instance_meta_mapping,
+        parent_meta=parent_meta,
+        mocked_file_paths=mocked_file_paths,
+        feedback_mapping=feedback_mapping,
+        cloud=cloud
+    )
+    for index, (metric_file_path, result, history_items, is_valid) in \
+            enumerate(instance_results, start=1):
+        _LOG.debug(f'Processed instance #{index}: \'{metric_file_path}\'')
         _LOG.debug(f'Result: {result}')
 
         _, _, _, region, _, resource_id = (
             recommendation_service.parse_folders(
                 metric_file_path=metric_file_path
             ))
+        if not is_valid:
+            _LOG.debug('Saving invalid metric file error report')
+            recommendation_service.save_report(
+                reports_dir=reports_dir,
+                customer=licensed_application.customer_id,
+                cloud=cloud,
+                tenant=tenant,
+                region=region,
+                item=result
+            )
+            job_journal_service.add(
+                job_id=JOB_ID,
+                tenant=tenant,
+                resource_type=algorithm.resource_type,
+                resource_id=resource_id,
+                region=region,
+                report=result
+            )
+            continue
         instance_region_mapping[resource_id] = region
 
         instance_meta = instance_meta_mapping.get(resource_id)
@@ -349,11 +634,21 @@ def process_tenant_instances(metrics_dir, reports_dir,
                 region=region,
                 item=result
             )
+            # instances are journaled once their history items are
+            # persisted, otherwise a restarted job would skip them
+            unjournaled.append((resource_id, region, result))
             if history_items:
                 tenant_recommendations.extend(history_items)
-                recommendation_service.save_history_items(
-                    history_items=history_items)
-
+                if recommendation_service.save_history_items(
+                        history_items=history_items):
+                    journal_instances(tenant=tenant, algorithm=algorithm,
+                                      instances=unjournaled)
+                    unjournaled = []
+
+    # history items are pushed to Dojo with their ids
+    recommendation_service.flush_history_items()
+    journal_instances(tenant=tenant, algorithm=algorithm,
+                      instances=unjournaled)
     tenant_recommendations = [i for i in tenant_recommendations if
                               i.recommendation_type !=
                               RecommendationTypeEnum.ACTION_EMPTY]
@@ -390,13 +685,16 @@ def process_tenant_instances(metrics_dir, reports_dir,
         _LOG.debug('Saving group result recommendation')
         recommendation_service.save_history_items(
             history_items=filtered_history)
+        recommendation_service.flush_history_items()
 
+    recommendation_service.close_reports()
     _LOG.debug(f'Uploading job results to storage \'{output_storage.name}\'')
     storage_service.upload_job_results(
         job_id=JOB_ID,
         results_folder_path=reports_dir,
         storage=output_storage,
-        tenant=tenant
+        tenant=tenant,
+        compress=environment_service.compress_results()
     )
 
 
@@ -461,6 +759,8 @@ def main():
     job = job_service.set_status(
         job=job,
         status=JobStatusEnum.JOB_RUNNING_STATUS.value)
+    # shapes are loaded once per job
+    shape_service.clear_catalogs()
 
     application = application_service.get_application_by_id(
         application_id=APPLICATION_ID
@@ -597,6 +897,7 @@ def main():
                 status=JobTenantStatusEnum.TENANT_SUCCEEDED_STATUS,
                 customer=licensed_application.customer_id
             )
+            job_journal_service.clear(job_id=JOB_ID, tenant=tenant)
         except LicenseForbiddenException as e:
             _LOG.error(e)
             job_service.set_licensed_job_status(
@@ -614,6 +915,13 @@ def main():
                 status=JobTenantStatusEnum.TENANT_FAILED_STATUS,
                 fail_reason=str(e)
             )
+        finally:
+            # report files are closed even if the tenant has failed
+            recommendation_service.close_reports()
+            # history items of a failed tenant are not flushed with the
+            # next one, its unjournaled instances are processed again
+            # on the job restart
+            recommendation_service.clear_history_items()
 
     _LOG.debug(f'Job {JOB_ID} has finished successfully')
     _LOG.debug('Setting job state to SUCCEEDED')
@@ -0,0 +1,35 @@
+import datetime
+
+from mongoengine import StringField, DateTimeField, ListField, IntField, \
+    FloatField
+
+from models.base_model import BaseModel
+
+
+class DayClustering(BaseModel):
+    """
+    Clustering output of a single day of instance metrics. Reused while
+    both the day data and the clustering settings stay unchanged.
+    """
+    instance_id = StringField(null=False)
+    date = StringField(null=False)
+    settings_hash = StringField(null=False)
+    data_hash = StringField(null=False)
+    labels = ListField(IntField())
+    centroids = ListField(ListField(FloatField()))
+    added_at = DateTimeField(null=False, default=datetime.datetime.utcnow)
+
+    meta = {
+        'indexes': [
+            {
+                'fields': ['instance_id', 'settings_hash', 'date'],
+                'unique': True
+            },
+            {
+                'fields': ['added_at'],
+                'expireAfterSeconds': 3600 * 24 * 120  # 4 months
+            },
+        ],
+        'auto_create_index': True,
+        'auto_create_index_on_save': False,
+    }
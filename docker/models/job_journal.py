@@ -0,0 +1,36 @@
+import datetime
+
+from mongoengine import StringField, DateTimeField
+
+from models.base_model import BaseModel
+
+
+class JobJournalItem(BaseModel):
+    """
+    Instance of a tenant that was completely processed by a job: its
+    report line is already written and its history is already saved.
+    """
+    job_id = StringField(null=False)
+    tenant = StringField(null=False)
+    resource_type = StringField(null=True)
+    resource_id = StringField(null=False)
+    region = StringField(null=True)
+    # json-serialized report line, as written to the tenant results
+    report = StringField(null=True)
+    added_at = DateTimeField(null=False, default=datetime.datetime.utcnow)
+
+    meta = {
+        'indexes': [
+            {
+                'fields': ['job_id', 'tenant', 'resource_type',
+                           'resource_id'],
+                'unique': True
+            },
+            {
+                'fields': ['added_at'],
+                'expireAfterSeconds': 3600 * 24 * 7  # 1 week
+            },
+        ],
+        'auto_create_index': True,
+        'auto_create_index_on_save': False,
+    }
@@ -0,0 +1,177 @@
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+INIT_KMEANS_PLUS_PLUS = 'k-means++'
+INIT_RANDOM = 'random'
+
+
+class BatchKMeans:
+    """
+    Lightweight NumPy k-means, fitted for a batch of datasets (instance
+    days) at once: Lloyd's iterations of all datasets and all
+    initializations run as a single vectorized computation.
+
+    Every number of clusters from 1 to max_clusters is fitted, which gives
+    WCSS values for the elbow method along with the labels and centers of
+    each fit, so the chosen number of clusters does not need another fit.
+    Results are reproducible: each dataset draws its initial centers from
+    its own seed, independently of the other datasets in the batch.
+    """
+
+    def __init__(self, max_clusters: int, n_init: int = 10,
+                 max_iter: int = 300, init: str = INIT_KMEANS_PLUS_PLUS,
+                 tol: float = 1e-4):
+        self.max_clusters = max_clusters
+        self.n_init = n_init
+        self.max_iter = max_iter
+        self.init = init
+        self.tol = tol
+
+    def fit(self, values: np.ndarray, mask: np.ndarray,
+            seeds: List[Union[int, Sequence[int]]]) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        :param values: (datasets x points x features) array, padded
+        :param mask: (datasets x points) array, False for padding
+        :param seeds: random seed of each dataset, an int or a sequence
+        of ints, e.g. [seed, date] pair
+        :return: inertia (datasets x max_clusters), labels
+        (datasets x max_clusters x points) and centers
+        (datasets x max_clusters x max_clusters x features) of the best
+        initialization of each number of clusters, centers beyond the
+        number of clusters are NaN
+        """
+        batch_size, points, features = values.shape
+        if np.isnan(values[mask]).any():
+            raise ValueError('Input contains NaN')
+        weights = mask.astype(np.float64)
+        values = np.where(mask[..., np.newaxis], values, 0.)
+
+        # same tolerance as sklearn: relative to the mean feature variance
+        counts = np.maximum(weights.sum(axis=1), 1)[:, np.newaxis]
+        mean = values.sum(axis=1) / counts
+        variance = (((values - mean[:, np.newaxis]) ** 2) *
+                    weights[..., np.newaxis]).sum(axis=1) / counts
+        tol = variance.mean(axis=1) * self.tol
+        # distances are calculated on centered data: large metric values
+        # (absolute network or iops) would lose precision otherwise
+        values = np.where(mask[..., np.newaxis],
+                          values - mean[:, np.newaxis], 0.)
+
+        # all initializations of a dataset are fitted side by side
+        values = np.repeat(values, self.n_init, axis=0)
+        weights = np.repeat(weights, self.n_init, axis=0)
+        tol = np.repeat(tol, self.n_init)
+        uniforms = np.stack([
+            np.random.default_rng(seed).random(
+                (self.max_clusters, self.n_init, self.max_clusters))
+            for seed in seeds
+        ])
+
+        inertia = np.empty((batch_size, self.max_clusters))
+        labels = np.empty((batch_size, self.max_clusters, points),
+                          dtype=np.int64)
+        centers = np.full((batch_size, self.max_clusters,
+                           self.max_clusters, features), np.nan)
+        datasets = np.arange(batch_size)
+        for n_clusters in range(1, self.max_clusters + 1):
+            draws = uniforms[:, n_clusters - 1].reshape(
+                batch_size * self.n_init, self.max_clusters)
+            init_centers = self._init_centers(
+                values=values, weights=weights, n_clusters=n_clusters,
+                draws=draws)
+            run_labels, run_centers, run_inertia = self._lloyd(
+                values=values, weights=weights, centers=init_centers,
+                tol=tol)
+
+            run_inertia = run_inertia.reshape(batch_size, self.n_init)
+            best = datasets * self.n_init + run_inertia.argmin(axis=1)
+            inertia[:, n_clusters - 1] = run_inertia.min(axis=1)
+            labels[:, n_clusters - 1] = run_labels[best]
+            centers[:, n_clusters - 1, :n_clusters] = \
+                run_centers[best] + mean[:, np.newaxis]
+        return inertia, labels, centers
+
+    def _init_centers(self, values: np.ndarray, weights: np.ndarray,
+                      n_clusters: int, draws: np.ndarray) -> np.ndarray:
+        runs, _, features = values.shape
+        run_indexes = np.arange(runs)
+        centers = np.empty((runs, n_clusters, features))
+        if self.init == INIT_RANDOM:
+            available = weights.copy()
+            for index in range(n_clusters):
+                chosen = self._sample(available, draws[:, index])
+                centers[:, index] = values[run_indexes, chosen]
+                available[run_indexes, chosen] = 0
+                # less distinct points than clusters
+                exhausted = available.sum(axis=1) == 0
+                available[exhausted] = weights[exhausted]
+            return centers
+
+        chosen = self._sample(weights, draws[:, 0])
+        centers[:, 0] = values[run_indexes, chosen]
+        closest = self._distances(values, centers[:, :1])[..., 0] * weights
+        for index in range(1, n_clusters):
+            # all points coincide with centers: pick any of them
+            probabilities = np.where(
+                closest.sum(axis=1, keepdims=True) > 0, closest, weights)
+            chosen = self._sample(probabilities, draws[:, index])
+            centers[:, index] = values[run_indexes, chosen]
+            distances = self._distances(values, centers[:, index:index + 1])
+            closest = np.minimum(closest, distances[..., 0] * weights)
+        return centers
+
+    def _lloyd(self, values: np.ndarray, weights: np.ndarray,
+               centers: np.ndarray, tol: np.ndarray):
+        cluster_indexes = np.arange(centers.shape[1])
+        # only runs which have not converged yet are iterated
+        active = np.arange(len(values))
+        previous_labels = np.full(values.shape[:2], -1)
+        for _ in range(self.max_iter):
+            run_values = values[active]
+            run_weights = weights[active]
+            run_centers = centers[active]
+            labels = self._distances(run_values, run_centers).argmin(axis=2)
+            # strict convergence: assignments did not change
+            is_changed = (labels != previous_labels[active]).any(axis=1)
+            previous_labels[active] = labels
+            membership = (labels[..., np.newaxis] == cluster_indexes) * \
+                run_weights[..., np.newaxis]
+            sizes = membership.sum(axis=1)[..., np.newaxis]
+            sums = np.matmul(membership.transpose(0, 2, 1), run_values)
+            # empty clusters keep their previous centers
+            new_centers = np.where(sizes > 0,
+                                   sums / np.maximum(sizes, 1), run_centers)
+            shift = ((new_centers - run_centers) ** 2).sum(axis=(1, 2))
+            centers[active] = new_centers
+            active = active[is_changed & (shift > tol[active])]
+            if not len(active):
+                break
+        distances = self._distances(values, centers)
+        labels = distances.argmin(axis=2)
+        inertia = (distances.min(axis=2) * weights).sum(axis=1)
+        return labels, centers, inertia
+
+    @staticmethod
+    def _distances(values: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        """
+        Squared euclidean distances (runs x points x clusters)
+        """
+        distances = (
+            (values ** 2).sum(axis=2)[..., np.newaxis]
+            - 2 * np.matmul(values, centers.transpose(0, 2, 1))
+            + (centers ** 2).sum(axis=2)[:, np.newaxis, :]
+        )
+        return np.maximum(distances, 0)
+
+    @staticmethod
+    def _sample(weights: np.ndarray, draws: np.ndarray) -> np.ndarray:
+        """
+        Index of a point of each run, chosen with probability
+        proportional to its weight
+        """
+        cumulative = np.cumsum(weights, axis=1)
+        targets = draws * cumulative[:, -1]
+        chosen = (cumulative <= targets[:, np.newaxis]).sum(axis=1)
+        return np.minimum(chosen, weights.shape[1] - 1)
@@ -1,8 +1,11 @@
 import json
 import os
+import shutil
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
+from botocore.exceptions import ClientError
 
 from commons.constants import ENV_SERVICE_MODE_S3, DOCKER_SERVICE_MODE, \
     ENV_MINIO_HOST, ENV_MINIO_PORT, ENV_MINIO_ACCESS_KEY, \
@@ -11,6 +14,8 @@ from commons.constants import ENV_SERVICE_MODE_S3, DOCKER_SERVICE_MODE, \
 from commons.log_helper import get_logger
 
 UTF_8_ENCODING = 'utf-8'
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+MULTIPART_CONCURRENCY = 4
 
 _LOG = get_logger('s3client')
 
@@ -98,6 +103,23 @@ class S3Client:
         s3_object = self.resource.Object(bucket_name, object_name)
         return s3_object.put(Body=body, ContentEncoding='utf-8')
 
+    def upload_file(self, bucket_name, object_name, file_path,
+                    content_encoding=UTF_8_ENCODING):
+        """
+        Uploads the file streaming it from disk, files larger than
+        the chunk size are uploaded in concurrent parts.
+        """
+        config = TransferConfig(multipart_threshold=MULTIPART_CHUNK_SIZE,
+                                multipart_chunksize=MULTIPART_CHUNK_SIZE,
+                                max_concurrency=MULTIPART_CONCURRENCY)
+        self.client.upload_file(
+            Filename=file_path,
+            Bucket=bucket_name,
+            Key=object_name,
+            ExtraArgs={'ContentEncoding': content_encoding},
+            Config=config
+        )
+
     def is_bucket_exists(self, bucket_name: str) -> bool:
         try:
             self.client.head_bucket(Bucket=bucket_name)
@@ -165,6 +187,46 @@ class S3Client:
             return streaming_body.read().decode(UTF_8_ENCODING)
         return streaming_body.read()
 
+    def get_changed_file_content(self, bucket_name, full_file_name,
+                                 etag=None):
+        """
+        Returns (content, etag) of the object. If the given etag
+        matches the object, its content is not downloaded and None
+        is returned as content.
+        """
+        params = dict(Bucket=bucket_name, Key=full_file_name)
+        if etag:
+            params['IfNoneMatch'] = etag
+        try:
+            response = self.client.get_object(**params)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in \
+                    ('304', 'NotModified'):
+                return None, etag
+            raise
+        return response['Body'].read(), response.get('ETag')
+
+    def download_changed_file(self, bucket_name, full_file_name, file_path,
+                              etag=None):
+        """
+        Streams the object into the file unless the given etag matches
+        the object. Returns (downloaded, etag), the file is not touched
+        if the object is not downloaded.
+        """
+        params = dict(Bucket=bucket_name, Key=full_file_name)
+        if etag:
+            params['IfNoneMatch'] = etag
+        try:
+            response = self.client.get_object(**params)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in \
+                    ('304', 'NotModified'):
+                return False, etag
+            raise
+        with open(file_path, 'wb') as f:
+            shutil.copyfileobj(response['Body'], f)
+        return True, response.get('ETag')
+
     def put_object_encrypted(self, bucket_name, object_name, body):
         return self.client.put_object(
             Body=body,
@@ -205,6 +267,26 @@ class S3Client:
             for item in response['Contents']:
                 yield item['Key'] if only_keys else item
 
+    def list_common_prefixes(self, bucket_name, prefix=None,
+                             delimiter='/'):
+        """
+        Lists "folders" right under the given prefix, without listing
+        the objects inside of them
+        """
+        result_prefixes = []
+        params = dict(Bucket=bucket_name, Delimiter=delimiter)
+        if prefix:
+            params['Prefix'] = prefix
+        response = self.client.list_objects_v2(**params)
+        result_prefixes.extend(item['Prefix'] for item in
+                               response.get('CommonPrefixes', []))
+        while response['IsTruncated'] is True:
+            params['ContinuationToken'] = response['NextContinuationToken']
+            response = self.client.list_objects_v2(**params)
+            result_prefixes.extend(item['Prefix'] for item in
+                                   response.get('CommonPrefixes', []))
+        return result_prefixes
+
     def delete_file(self, bucket_name, file_key):
         self.resource.Object(bucket_name, file_key).delete()
 
@@ -243,11 +325,11 @@ class S3Client:
         output_file_path = os.path.join(output_folder_path, file_name)
 
         with open(output_file_path, 'wb') as f:
-            content = self.get_file_content(
-                bucket_name=bucket_name,
-                full_file_name=full_file_name
+            self.client.download_fileobj(
+                Bucket=bucket_name,
+                Key=full_file_name,
+                Fileobj=f
             )
-            f.write(content)
         return output_file_path
 
     def create_bucket(self, bucket_name, region=None):
@@ -0,0 +1,81 @@
+import datetime
+import hashlib
+import json
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from pymongo import UpdateOne
+
+from commons.log_helper import get_logger
+from models.algorithm import Algorithm
+from models.clustering_cache import DayClustering
+
+_LOG = get_logger('r8s-clustering-cache-service')
+
+
+class ClusteringCacheService:
+    """
+    Persists per-day clustering output of instances, so only new or
+    changed days are clustered on the next scans.
+    """
+
+    @staticmethod
+    def get_settings_hash(algorithm: Algorithm, engine: str = None,
+                          seed: int = None) -> str:
+        """
+        Hash of everything clustering results depend on besides the day
+        data: algorithm clustering settings, metrics, k-means engine and
+        its seed
+        """
+        settings = algorithm.clustering_settings.to_mongo().to_dict()
+        settings['metric_attributes'] = list(algorithm.metric_attributes)
+        settings['engine'] = engine
+        settings['seed'] = seed
+        dump = json.dumps(settings, sort_keys=True, default=str)
+        return hashlib.sha1(dump.encode()).hexdigest()
+
+    @staticmethod
+    def get_data_hash(df: pd.DataFrame, column_names: List[str]) -> str:
+        hashes = pd.util.hash_pandas_object(df[column_names], index=True)
+        return hashlib.sha1(hashes.values.tobytes()).hexdigest()
+
+    @staticmethod
+    def get_instance_days(instance_id: str, settings_hash: str) \
+            -> Dict[str, DayClustering]:
+        items = DayClustering.objects(instance_id=instance_id,
+                                      settings_hash=settings_hash)
+        return {item.date: item for item in items}
+
+    @staticmethod
+    def get_day(instance_days: Dict[str, DayClustering], date: str,
+                data_hash: str) -> Optional[Tuple[List[int], List[list]]]:
+        item = instance_days.get(date)
+        if not item or item.data_hash != data_hash:
+            return
+        return list(item.labels), [list(c) for c in item.centroids]
+
+    @staticmethod
+    def save_days(instance_id: str, settings_hash: str,
+                  days: List[Tuple[str, str, List[int], List[list]]]):
+        """
+        Upserts (date, data_hash, labels, centroids) clusterings of the
+        given instance days with a single bulk write
+        """
+        if not days:
+            return
+        added_at = datetime.datetime.utcnow()
+        operations = [UpdateOne({
+            'instance_id': instance_id,
+            'settings_hash': settings_hash,
+            'date': date
+        }, {'$set': {
+            'data_hash': data_hash,
+            'labels': labels,
+            'centroids': centroids,
+            'added_at': added_at
+        }}, upsert=True) for date, data_hash, labels, centroids in days]
+        ClusteringCacheService._write_operations(operations=operations)
+
+    @staticmethod
+    def _write_operations(operations: list):
+        DayClustering._get_collection().bulk_write(operations, ordered=False)
@@ -1,29 +1,79 @@
+from typing import List, Tuple
+
 import numpy
 import pandas as pd
 from kneed import KneeLocator
 from sklearn.cluster import KMeans
 from tslearn.clustering import TimeSeriesKMeans
 
-from commons.constants import COLUMN_MEMORY_LOAD, COLUMN_CPU_LOAD
-from models.algorithm import Algorithm
+from models.algorithm import Algorithm, ClusteringSettings
+from services.batch_kmeans import BatchKMeans
+from services.day_matrix import DayMatrix
+
+CLUSTERING_ENGINE_NUMPY = 'numpy'
+CLUSTERING_ENGINE_SKLEARN = 'sklearn'
+CLUSTERING_ENGINES = (CLUSTERING_ENGINE_NUMPY, CLUSTERING_ENGINE_SKLEARN)
 
 
 class ClusteringService:
+    def __init__(self, engine: str = CLUSTERING_ENGINE_NUMPY, seed: int = 0):
+        if engine not in CLUSTERING_ENGINES:
+            engine = CLUSTERING_ENGINE_NUMPY
+        self.engine = engine
+        self.seed = seed
+
+    def cluster_days(self, day_matrix: DayMatrix, day_indexes: List[int],
+                     algorithm: Algorithm) \
+            -> List[Tuple[List[int], List[list]]]:
+        """
+        Clusters the given days of already preprocessed (smoothed) day
+        matrix. Returns (labels, centroids) of each day, labels are in
+        the order of day records.
+        """
+        if not day_indexes:
+            return []
+        if self.engine == CLUSTERING_ENGINE_SKLEARN:
+            result = []
+            for day_index in day_indexes:
+                df_ = pd.DataFrame(
+                    day_matrix.get_day_records(day_index=day_index),
+                    columns=day_matrix.columns)
+                labels, centroids = self._cluster_sklearn(
+                    df=df_, algorithm=algorithm)
+                result.append((labels.tolist(), centroids))
+            return result
 
-    def cluster(self, df: pd.DataFrame,
-                algorithm: Algorithm):
-        df_ = self._preprocess(df=df,
-                               column_names=algorithm.metric_attributes)
+        clustering_settings = algorithm.clustering_settings
+        values, mask = day_matrix.get_padded_records(day_indexes=day_indexes)
+        seeds = [[self.seed, int(day_matrix.dates[day_index].astype(
+            numpy.int64))] for day_index in day_indexes]
+        k_means = BatchKMeans(
+            max_clusters=clustering_settings.max_clusters,
+            n_init=clustering_settings.wcss_kmeans_n_init,
+            max_iter=clustering_settings.wcss_kmeans_max_iter,
+            init=clustering_settings.wcss_kmeans_init.value)
+        inertia, labels, centers = k_means.fit(values=values, mask=mask,
+                                               seeds=seeds)
+        result = []
+        for index in range(len(day_indexes)):
+            n_clusters = self.get_clusters_number(
+                wcss=inertia[index].tolist(),
+                clustering_settings=clustering_settings)
+            day_labels = labels[index, n_clusters - 1][mask[index]]
+            day_centers = centers[index, n_clusters - 1, :n_clusters]
+            centroids = [[round(item, 2) for item in centroid]
+                         for centroid in day_centers.tolist()]
+            result.append((day_labels.tolist(), centroids))
+        return result
+
+    def _cluster_sklearn(self, df: pd.DataFrame, algorithm: Algorithm):
         n_clusters = self.get_optimal_clusters_number(
-            df=df_,
+            df=df,
             algorithm=algorithm
         )
-        kmeans = TimeSeriesKMeans(n_clusters=n_clusters).fit(df_)
-        centroids = kmeans.cluster_centers_
-        df['cluster'] = kmeans.labels_
-
-        centroids = self._convert_centroids(centroids=centroids)
-        return df, centroids
+        kmeans = TimeSeriesKMeans(n_clusters=n_clusters).fit(df)
+        centroids = self._convert_centroids(centroids=kmeans.cluster_centers_)
+        return kmeans.labels_, centroids
 
     @staticmethod
     def get_optimal_clusters_number(df: pd.DataFrame,
@@ -38,7 +88,15 @@ class ClusteringService:
                              random_state=0)
             k_means.fit(df)
             wcss.append(k_means.inertia_)
+        return ClusteringService.get_clusters_number(
+            wcss=wcss, clustering_settings=clustering_settings)
 
+    @staticmethod
+    def get_clusters_number(wcss: List[float],
+                            clustering_settings: ClusteringSettings):
+        """
+        Elbow method: number of clusters at the knee of WCSS curve
+        """
         x = range(1, len(wcss) + 1)
         kn = KneeLocator(
             x, wcss, curve='convex', direction='decreasing',
@@ -52,16 +110,6 @@ class ClusteringService:
             clusters_n = kn.knee
         return clusters_n
 
-    @staticmethod
-    def _preprocess(df: pd.DataFrame,
-                    column_names=(COLUMN_CPU_LOAD, COLUMN_MEMORY_LOAD),
-                    rolling_avg=2):
-        df_ = df[list(column_names)].copy()
-        for column_name in column_names:
-            df_[column_name] = df_[column_name].rolling(
-                window=rolling_avg, min_periods=1).mean()
-        return df_
-
     @staticmethod
     def _convert_centroids(centroids: numpy.ndarray):
         centroids = centroids.tolist()
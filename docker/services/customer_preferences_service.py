@@ -1,35 +1,56 @@
-import re
 from typing import List
 
 from commons.log_helper import get_logger
 from models.parent_attributes import LicensesParentMeta
 from models.shape import Shape
+from services.shape_catalog import ShapeCatalog
+from services.shape_rule_engine import CompiledShapeRule, ACTION_ATTR
 
 _LOG = get_logger('r8s-customer-preferences-filter')
 
-FIELD_ATTR = 'field'
-VALUE_ATTR = 'value'
-ACTION_ATTR = 'action'
-CONDITION_ATTR = 'condition'
 ALLOW = 'allow'
 DENY = 'deny'
 PRIORITIZE = 'prioritize'
 
-CONDITION_MATCH = 'match'
-CONDITION_CONTAINS = 'contains'
-CONDITION_NOT_CONTAINS = 'not_contains'
-CONDITION_EQUAL = 'equal'
-
 
 class CustomerPreferencesService:
 
     def __init__(self):
-        self.condition_processor_mapping = {
-            CONDITION_MATCH: self._match_condition,
-            CONDITION_CONTAINS: self._contains_condition,
-            CONDITION_NOT_CONTAINS: self._not_contains_condition,
-            CONDITION_EQUAL: self._equal_condition,
-        }
+        self.__allowed_shapes_cache = {}
+
+    def get_allowed_catalog_shapes(self, catalog: ShapeCatalog,
+                                   parent_meta: LicensesParentMeta) \
+            -> List[Shape]:
+        """
+        Catalog shapes allowed by the parent shape rules. Shape rules of
+        a parent are fixed for the job: the result is cached per
+        (rules, catalog) and shared by all instances.
+        """
+        rules_key = tuple(CompiledShapeRule.get_rule_key(rule) +
+                          (rule.get(ACTION_ATTR),)
+                          for rule in parent_meta.shape_rules or [])
+        # catalogs are compared by identity, a reloaded catalog is
+        # filtered again
+        key = (rules_key, catalog)
+        if key not in self.__allowed_shapes_cache:
+            self.__allowed_shapes_cache[key] = \
+                self.get_allowed_instance_types(
+                    cloud=catalog.cloud,
+                    parent_meta=parent_meta,
+                    instances_data=catalog.shapes
+                )
+        return list(self.__allowed_shapes_cache[key])
+
+    def get_allowed_shapes_cache(self) -> dict:
+        return dict(self.__allowed_shapes_cache)
+
+    def set_allowed_shapes_cache(self, allowed_shapes_cache: dict):
+        """
+        Restores allowed catalog shapes filtered by another process.
+        Keys refer to the catalogs by identity, so the cache must be
+        restored along with the same catalog objects.
+        """
+        self.__allowed_shapes_cache.update(allowed_shapes_cache)
 
     def get_allowed_instance_types(self, cloud: str,
                                    parent_meta: LicensesParentMeta,
@@ -96,56 +117,13 @@ class CustomerPreferencesService:
             priority_instances.extend(matching_instances)
         return priority_instances
 
-    def _find_matching(self, instances_data, filter_):
-        matching_instances = []
-
-        for instance in instances_data:
-
-            matches = self._instance_match(
-                instance_data=instance,
-                filter_=filter_)
-            if matches:
-                matching_instances.append(instance)
-        return matching_instances
-
-    def _instance_match(self, instance_data, filter_):
-        filter_key = filter_.get(FIELD_ATTR)
-        filter_value = filter_.get(VALUE_ATTR)
-        instance_value = getattr(instance_data, filter_key, None)
-        condition = filter_.get(CONDITION_ATTR)
-
-        if not filter_value or not instance_value:
-            return False
-        processor = self.condition_processor_mapping.get(condition)
-        if not processor:
-            return False
-        return processor(instance_value=instance_value, value=filter_value)
+    @staticmethod
+    def _find_matching(instances_data, filter_):
+        return CompiledShapeRule.from_rule(rule=filter_).find_matching(
+            shapes=instances_data)
 
     @staticmethod
     def filter_by_action(shape_rules: list, action):
         if not shape_rules:
             return []
         return [f for f in shape_rules if f.get(ACTION_ATTR) == action]
-
-    @staticmethod
-    def _match_condition(instance_value: str, value: str):
-        value = value.replace('.', r'\.').replace('*', '.+')
-        return bool(re.match(value, instance_value))
-
-    @staticmethod
-    def _contains_condition(instance_value: str, value: str):
-        if not value or not isinstance(value, str):
-            return False
-        return value.lower() in instance_value.lower()
-
-    @staticmethod
-    def _not_contains_condition(instance_value: str, value: str):
-        if not value or not isinstance(value, str):
-            return False
-        return value.lower() not in instance_value.lower()
-
-    @staticmethod
-    def _equal_condition(instance_value: str, value: str):
-        if not value or not isinstance(value, str):
-            return False
-        return value.lower() == instance_value.lower()
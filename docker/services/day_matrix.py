@@ -0,0 +1,211 @@
+from functools import cached_property
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+MINUTES_IN_DAY = 24 * 60
+
+
+class DayMatrix:
+    """
+    Instance metrics split by calendar days, used as clustering input.
+    Records of each day are kept in their original order as a flat
+    (records x metrics) array, so per-day computations are done with
+    vectorized operations over all days at once instead of over a
+    separate DataFrame for every day.
+
+    If the step of records is given, each record is also placed into a
+    time slot of its day, and the dense (days x slots_per_day x metrics)
+    form with a (days x slots_per_day) validity mask is built on first
+    access. Slots are counted from the local time of the first record of
+    the day by the elapsed time, so days longer than 24 hours (DST) get
+    extra slots, and records which do not fit the step grid are moved to
+    the next free slot: no record is overwritten. Slots without a record
+    (incomplete days, days aggregated with a larger step) are NaN and
+    masked out.
+    """
+
+    def __init__(self, dates: np.ndarray, columns: List[str],
+                 records: np.ndarray, day_offsets: np.ndarray,
+                 slots: np.ndarray = None, step_minutes: int = None):
+        self.dates = dates
+        self.columns = list(columns)
+        self.records = records
+        self.day_offsets = day_offsets
+        self.slots = slots
+        self.step_minutes = step_minutes
+
+        self.slots_per_day = None
+        if slots is not None:
+            self.slots_per_day = max(MINUTES_IN_DAY // step_minutes,
+                                     int(slots.max()) + 1 if len(slots)
+                                     else 0)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __repr__(self):
+        return f'DayMatrix(days={len(self)}, records={len(self.records)}, ' \
+               f'slots={self.slots_per_day}, columns={self.columns})'
+
+    @classmethod
+    def from_days(cls, days: List[pd.DataFrame], columns: List[str],
+                  step_minutes: int = None) -> 'DayMatrix':
+        """
+        Builds the matrix from per-day frames as returned by
+        MetricsService.divide_by_days. Step minutes is the smallest step
+        of records, the dense form is available only if it is given.
+        """
+        columns = list(columns)
+        if not days:
+            return cls(dates=np.array([], dtype='datetime64[D]'),
+                       columns=columns, records=np.empty((0, len(columns))),
+                       day_offsets=np.zeros(1, dtype=np.int64),
+                       slots=(np.empty(0, dtype=np.int64)
+                              if step_minutes else None),
+                       step_minutes=step_minutes)
+        lengths = [len(day) for day in days]
+        day_offsets = np.concatenate(([0], np.cumsum(lengths)))
+        records = np.concatenate(
+            [day[columns].to_numpy(dtype=np.float64) for day in days])
+        first_local = np.concatenate([cls._to_local(day.index[:1])
+                                      for day in days])
+        dates = first_local.astype('datetime64[D]')
+        slots = None
+        if step_minutes:
+            slots = cls._get_slots(
+                days=days, day_offsets=day_offsets,
+                first_minutes=(first_local - dates).astype(
+                    'timedelta64[m]').astype(np.int64),
+                step_minutes=step_minutes)
+        return cls(dates=dates, columns=columns, records=records,
+                   day_offsets=day_offsets, slots=slots,
+                   step_minutes=step_minutes)
+
+    @staticmethod
+    def _get_slots(days: List[pd.DataFrame], day_offsets: np.ndarray,
+                   first_minutes: np.ndarray, step_minutes: int) \
+            -> np.ndarray:
+        lengths = np.diff(day_offsets)
+        day_indexes = np.repeat(np.arange(len(days)), lengths)
+        positions = np.arange(day_offsets[-1]) - day_offsets[day_indexes]
+        timestamps = np.concatenate([day.index.asi8 for day in days])
+        elapsed = timestamps - timestamps[day_offsets[:-1]][day_indexes]
+        step_ns = step_minutes * 60 * 10 ** 9
+        slots = (first_minutes // step_minutes)[day_indexes] + \
+            np.rint(elapsed / step_ns).astype(np.int64)
+        # records sharing a slot are moved forward: slots of a day are
+        # made strictly increasing, days are shifted apart so the
+        # running maximum does not leak into the next day
+        shift = int(slots.max()) + len(slots) + 1
+        increasing = slots - positions + day_indexes * shift
+        return np.maximum.accumulate(increasing) - \
+            day_indexes * shift + positions
+
+    @cached_property
+    def _dense(self) -> Tuple[np.ndarray, np.ndarray]:
+        return self.to_dense(values=self.records)
+
+    @property
+    def values(self) -> np.ndarray:
+        """
+        Records as (days x slots_per_day x metrics) array
+        """
+        return self._dense[0]
+
+    @property
+    def mask(self) -> np.ndarray:
+        """
+        (days x slots_per_day) mask of slots with a record
+        """
+        return self._dense[1]
+
+    def to_dense(self, values: np.ndarray, fill_value=np.nan) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Places per-record values, e.g. cluster labels, in the time slots
+        of their days. Returns (days x slots_per_day x ...) array filled
+        with the fill value where there are no records, and the mask of
+        slots with a record.
+        """
+        if self.slots is None:
+            raise ValueError('Dense form requires the step of records')
+        values = np.asarray(values)
+        shape = (len(self.dates), self.slots_per_day)
+        dense = np.full(shape + values.shape[1:], fill_value,
+                        dtype=np.result_type(
+                            values.dtype, np.min_scalar_type(fill_value)))
+        mask = np.zeros(shape, dtype=bool)
+        day_indexes = np.repeat(np.arange(len(self.dates)),
+                                np.diff(self.day_offsets))
+        dense[day_indexes, self.slots] = values
+        mask[day_indexes, self.slots] = True
+        return dense, mask
+
+    @staticmethod
+    def get_day_bounds(index: pd.DatetimeIndex) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns calendar dates (in the index timezone) of a sorted index
+        and positions where each date starts, the last position is the
+        index length.
+        """
+        dates = DayMatrix._to_local(index).astype('datetime64[D]')
+        starts = np.flatnonzero(np.diff(dates.astype(np.int64))) + 1
+        starts = np.concatenate(([0], starts, [len(dates)]))
+        return dates[starts[:-1]], starts
+
+    @staticmethod
+    def _to_local(index: pd.DatetimeIndex) -> np.ndarray:
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        return index.to_numpy(dtype='datetime64[ns]')
+
+    def get_day_records(self, day_index: int) -> np.ndarray:
+        """
+        Day records as (records x metrics) array, in the order of the
+        source day frame.
+        """
+        return self.records[self.day_offsets[day_index]:
+                            self.day_offsets[day_index + 1]]
+
+    def rolling_mean(self, window: int) -> 'DayMatrix':
+        """
+        Rolling mean of records within each day with min_periods=1, same
+        as DataFrame.rolling(window, min_periods=1).mean() of every day
+        frame, calculated for all days at once.
+        """
+        positions = np.arange(len(self.records))
+        day_starts = np.repeat(self.day_offsets[:-1],
+                               np.diff(self.day_offsets))
+        total = np.zeros_like(self.records)
+        count = np.zeros_like(self.records)
+        for shift in range(window):
+            source = positions - shift
+            in_day = source >= day_starts
+            shifted = self.records[source[in_day]]
+            is_valid = ~np.isnan(shifted)
+            total[in_day] += np.where(is_valid, shifted, 0)
+            count[in_day] += is_valid
+        with np.errstate(invalid='ignore'):
+            records = total / count
+        return DayMatrix(dates=self.dates, columns=self.columns,
+                         records=records, day_offsets=self.day_offsets,
+                         slots=self.slots, step_minutes=self.step_minutes)
+
+    def get_padded_records(self, day_indexes: List[int]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Records of the given days as (days x max_records x metrics) array
+        padded with NaN, and (days x max_records) mask of real records.
+        """
+        starts = self.day_offsets[day_indexes]
+        lengths = self.day_offsets[np.asarray(day_indexes) + 1] - starts
+        width = int(lengths.max()) if len(lengths) else 0
+        mask = np.arange(width) < lengths[:, np.newaxis]
+        values = np.full((len(day_indexes), width, len(self.columns)),
+                         np.nan)
+        positions = (starts[:, np.newaxis] + np.arange(width))[mask]
+        values[mask] = self.records[positions]
+        return values, mask
@@ -5,9 +5,20 @@ from commons.constants import INSTANCE_SPECS_STORAGE_TYPE, \
     DEFAULT_META_POSTPONED_FOR_ACTIONS_KEY, \
     ENV_SERVICE_MODE, DOCKER_SERVICE_MODE, ENV_FORCE_RESCAN, \
     ENV_LM_TOKEN_LIFETIME_MINUTES, PARENT_ID_ATTR, APPLICATION_ID_ATTR, \
-    LICENSED_APPLICATION_ID_ATTR, ENV_MODULAR_SECRETS_SERVICE_MODE
+    LICENSED_APPLICATION_ID_ATTR, ENV_MODULAR_SECRETS_SERVICE_MODE, \
+    ENV_EXECUTOR_WORKERS, ENV_STREAM_METRICS, ENV_METRICS_STREAM_BUFFER, \
+    ENV_METRICS_MEMORY_LIMIT_MB, ENV_CLUSTERING_CACHE, ENV_CLUSTERING_ENGINE, \
+    ENV_CLUSTERING_SEED, ENV_HISTORY_BATCH_SIZE, ENV_S3_CACHE_DIR, \
+    ENV_S3_CACHE_MAX_SIZE_MB, ENV_COMPRESS_RESULTS
 
 DEFAULT_LM_TOKEN_LIFETIME_MINUTES = 120
+DEFAULT_EXECUTOR_WORKERS = 1
+DEFAULT_METRICS_STREAM_BUFFER = 50
+DEFAULT_METRICS_MEMORY_LIMIT_MB = 0
+DEFAULT_S3_CACHE_MAX_SIZE_MB = 1024
+DEFAULT_CLUSTERING_ENGINE = 'numpy'
+DEFAULT_CLUSTERING_SEED = 0
+DEFAULT_HISTORY_BATCH_SIZE = 500
 
 
 class EnvironmentService:
@@ -88,6 +99,119 @@ class EnvironmentService:
         force_rescan = os.environ.get(ENV_FORCE_RESCAN, False)
         return force_rescan and force_rescan.lower() in ('y', 't', 'true')
 
+    @staticmethod
+    def executor_workers() -> int:
+        """
+        Number of worker processes used to analyse tenant instances.
+        1 (default) keeps the analysis in the main process, 0 or a
+        negative value means "one worker per available cpu".
+        """
+        try:
+            workers = int(os.environ.get(ENV_EXECUTOR_WORKERS,
+                                         DEFAULT_EXECUTOR_WORKERS))
+        except ValueError:
+            return DEFAULT_EXECUTOR_WORKERS
+        if workers <= 0:
+            return os.cpu_count() or DEFAULT_EXECUTOR_WORKERS
+        return workers
+
+    @staticmethod
+    def stream_metrics() -> bool:
+        stream_metrics = os.environ.get(ENV_STREAM_METRICS, False)
+        return stream_metrics and stream_metrics.lower() in ('y', 't', 'true')
+
+    @staticmethod
+    def metrics_stream_buffer() -> int:
+        """
+        Max amount of instances downloaded ahead of the analysis
+        in metrics streaming mode.
+        """
+        try:
+            return int(os.environ.get(ENV_METRICS_STREAM_BUFFER,
+                                      DEFAULT_METRICS_STREAM_BUFFER))
+        except ValueError:
+            return DEFAULT_METRICS_STREAM_BUFFER
+
+    @staticmethod
+    def metrics_memory_limit_mb() -> int:
+        """
+        Max amount of downloaded metrics kept in memory in metrics
+        streaming mode, files above the limit are downloaded to disk.
+        0 disables in-memory downloads.
+        """
+        try:
+            memory_limit = int(os.environ.get(
+                ENV_METRICS_MEMORY_LIMIT_MB, DEFAULT_METRICS_MEMORY_LIMIT_MB))
+        except ValueError:
+            return DEFAULT_METRICS_MEMORY_LIMIT_MB
+        return max(memory_limit, 0)
+
+    @staticmethod
+    def s3_cache_dir():
+        """
+        Directory of the local cache of downloaded metric objects, kept
+        between jobs. The cache is disabled if not set. The directory
+        must not be shared by jobs running at the same time.
+        """
+        return os.environ.get(ENV_S3_CACHE_DIR)
+
+    @staticmethod
+    def s3_cache_max_size_mb() -> int:
+        try:
+            return int(os.environ.get(ENV_S3_CACHE_MAX_SIZE_MB,
+                                      DEFAULT_S3_CACHE_MAX_SIZE_MB))
+        except ValueError:
+            return DEFAULT_S3_CACHE_MAX_SIZE_MB
+
+    @staticmethod
+    def compress_results() -> bool:
+        """
+        Job result files are uploaded gzip-compressed
+        (Content-Encoding: gzip) if enabled.
+        """
+        compress_results = os.environ.get(ENV_COMPRESS_RESULTS, False)
+        return compress_results and compress_results.lower() in (
+            'y', 't', 'true')
+
+    @staticmethod
+    def clustering_cache_enabled() -> bool:
+        """
+        Per-day clustering results are persisted and reused on the next
+        scans if enabled.
+        """
+        enabled = os.environ.get(ENV_CLUSTERING_CACHE, 'false')
+        return enabled.lower() in ('y', 't', 'true')
+
+    @staticmethod
+    def clustering_engine() -> str:
+        """
+        K-means implementation used to cluster instance days: 'numpy'
+        (batched, default) or 'sklearn' (per-day fits).
+        """
+        return os.environ.get(ENV_CLUSTERING_ENGINE,
+                              DEFAULT_CLUSTERING_ENGINE).lower()
+
+    @staticmethod
+    def clustering_seed() -> int:
+        try:
+            return int(os.environ.get(ENV_CLUSTERING_SEED,
+                                      DEFAULT_CLUSTERING_SEED))
+        except ValueError:
+            return DEFAULT_CLUSTERING_SEED
+
+    @staticmethod
+    def history_batch_size() -> int:
+        """
+        Amount of buffered recommendation history items written to
+        the database in a single bulk operation.
+        """
+        try:
+            batch_size = int(os.environ.get(ENV_HISTORY_BATCH_SIZE,
+                                            DEFAULT_HISTORY_BATCH_SIZE))
+        except ValueError:
+            return DEFAULT_HISTORY_BATCH_SIZE
+        return max(batch_size, 1)
+
     @staticmethod
     def lm_token_lifetime_minutes():
         try:
@@ -0,0 +1,74 @@
+import datetime
+import json
+from typing import Dict, Iterable, Tuple
+
+from pymongo import UpdateOne
+
+from commons.log_helper import get_logger
+from models.job_journal import JobJournalItem
+
+_LOG = get_logger('r8s-job-journal-service')
+
+
+class JobJournalService:
+    """
+    Keeps track of tenant instances completed by a job, so a retried job
+    with the same id is able to skip them and finish only the remainder.
+    """
+
+    @staticmethod
+    def get_completed(job_id: str, tenant: str, resource_type: str) \
+            -> Dict[str, JobJournalItem]:
+        items = JobJournalItem.objects(job_id=job_id, tenant=tenant,
+                                       resource_type=resource_type)
+        return {item.resource_id: item for item in items}
+
+    @staticmethod
+    def add(job_id: str, tenant: str, resource_type: str, resource_id: str,
+            region: str, report: dict):
+        JobJournalItem.objects(
+            job_id=job_id,
+            tenant=tenant,
+            resource_type=resource_type,
+            resource_id=resource_id
+        ).update_one(
+            set__region=region,
+            set__report=json.dumps(report),
+            set_on_insert__added_at=datetime.datetime.utcnow(),
+            upsert=True
+        )
+
+    @staticmethod
+    def add_many(job_id: str, tenant: str, resource_type: str,
+                 instances: Iterable[Tuple[str, str, dict]]):
+        """
+        Upserts the given (resource_id, region, report) instances with a
+        single bulk write
+        """
+        added_at = datetime.datetime.utcnow()
+        operations = [UpdateOne({
+            'job_id': job_id,
+            'tenant': tenant,
+            'resource_type': resource_type,
+            'resource_id': resource_id
+        }, {
+            '$set': {'region': region, 'report': json.dumps(report)},
+            '$setOnInsert': {'added_at': added_at}
+        }, upsert=True) for resource_id, region, report in instances]
+        if not operations:
+            return
+        JobJournalService._write_operations(operations=operations)
+
+    @staticmethod
+    def _write_operations(operations: list):
+        JobJournalItem._get_collection().bulk_write(operations,
+                                                    ordered=False)
+
+    @staticmethod
+    def get_report(item: JobJournalItem) -> dict:
+        return json.loads(item.report)
+
+    @staticmethod
+    def clear(job_id: str, tenant: str):
+        _LOG.debug(f'Clearing job {job_id} journal for tenant {tenant}')
+        JobJournalItem.objects(job_id=job_id, tenant=tenant).delete()
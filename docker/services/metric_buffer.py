@@ -0,0 +1,50 @@
+import io
+import threading
+
+
+class MetricBuffer:
+    """
+    Content of a metric file downloaded into memory instead of the
+    local file system. The path is where the file would have been
+    downloaded to, it keeps the layout used to parse instance details.
+    """
+
+    def __init__(self, path: str, content: bytes):
+        self.path = path
+        self.content = content
+
+    @property
+    def size(self) -> int:
+        return len(self.content)
+
+    def open(self) -> io.BytesIO:
+        return io.BytesIO(self.content)
+
+    def __repr__(self):
+        return f'MetricBuffer({self.path}, size={self.size})'
+
+
+class MemoryCeiling:
+    """
+    Thread-safe accounting of the memory held by metric buffers.
+    Content which does not fit under the ceiling is expected to be
+    spilled to disk by the caller.
+    """
+
+    def __init__(self, limit_bytes: int):
+        self.limit_bytes = limit_bytes
+        self.used_bytes = 0
+        self.__lock = threading.Lock()
+
+    def acquire(self, size: int) -> bool:
+        if self.limit_bytes <= 0:
+            return False
+        with self.__lock:
+            if self.used_bytes + size > self.limit_bytes:
+                return False
+            self.used_bytes += size
+            return True
+
+    def release(self, size: int):
+        with self.__lock:
+            self.used_bytes = max(self.used_bytes - size, 0)
@@ -0,0 +1,17 @@
+import pandas as pd
+
+
+class MetricFrame:
+    """
+    Parsed content of a single instance metric file. The file is read
+    once and the same frame is passed through validation, conversion to
+    relative values and analysis, so no intermediate copies of the file
+    are written to disk.
+    """
+
+    def __init__(self, metric_file_path: str, df: pd.DataFrame):
+        self.metric_file_path = metric_file_path
+        self.df = df
+
+    def __repr__(self):
+        return f'MetricFrame({self.metric_file_path}, rows={len(self.df)})'
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import shutil
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from commons.log_helper import get_logger
+
+_LOG = get_logger('r8s-metric-store')
+
+STORE_EXTENSION = '.columns'
+SCHEMA_FILE_NAME = 'schema.json'
+NPY_EXTENSION = '.npy'
+# bytes of the file head and tail hashed into the source signature
+SIGNATURE_CHUNK_SIZE = 64 * 1024
+
+
+class MetricStore:
+    """
+    Columnar on-disk copy of instance metrics, built once when daily
+    metric files are merged. Each column is kept as a separate typed
+    .npy file with timestamps already parsed, so readers memory-map the
+    columns instead of tokenizing and parsing csv text again.
+
+    The store is tied to the metric file it was built for: once the
+    file is rewritten (mocked data, reformatting), the store is
+    considered stale and the file itself is read. The file is compared
+    by its size, mtime and a hash of its head and tail, so a same-size
+    rewrite within the timestamp resolution of the filesystem is also
+    detected unless it changes only the middle of the file.
+    """
+
+    @staticmethod
+    def get_store_path(metric_file_path: str) -> str:
+        return os.path.splitext(metric_file_path)[0] + STORE_EXTENSION
+
+    @staticmethod
+    def _get_source_signature(metric_file_path: str) -> Optional[dict]:
+        try:
+            stat = os.stat(metric_file_path)
+            content_hash = hashlib.sha1()
+            with open(metric_file_path, 'rb') as f:
+                content_hash.update(f.read(SIGNATURE_CHUNK_SIZE))
+                if stat.st_size > SIGNATURE_CHUNK_SIZE:
+                    f.seek(max(SIGNATURE_CHUNK_SIZE,
+                               stat.st_size - SIGNATURE_CHUNK_SIZE))
+                    content_hash.update(f.read())
+        except OSError:
+            return
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                'hash': content_hash.hexdigest()}
+
+    @classmethod
+    def write(cls, metric_file_path: str, df: pd.DataFrame,
+              timestamp_attr: str):
+        """
+        Saves the given frame as a store of the metric file. Timestamp
+        column is expected to contain datetime values.
+        """
+        store_path = cls.get_store_path(metric_file_path)
+        cls.remove(metric_file_path=metric_file_path)
+        os.makedirs(store_path)
+
+        columns = {}
+        for index, column in enumerate(df.columns):
+            series = df[column]
+            if column == timestamp_attr:
+                values = pd.DatetimeIndex(series).tz_convert(
+                    'UTC').tz_localize(None).to_numpy()
+            else:
+                values = series.to_numpy()
+            categorical = isinstance(series.dtype, pd.CategoricalDtype)
+            pickled = values.dtype == object
+            if pickled and not series.isna().any():
+                values = values.astype(str)
+                pickled = False
+            file_name = f'{index}{NPY_EXTENSION}'
+            np.save(os.path.join(store_path, file_name), values,
+                    allow_pickle=pickled)
+            columns[column] = {'file': file_name, 'pickled': pickled,
+                               'categorical': categorical}
+
+        schema = {
+            'columns': columns,
+            'timestamp': timestamp_attr,
+            'source': cls._get_source_signature(metric_file_path)
+        }
+        # schema is written last: store without it is incomplete
+        with open(os.path.join(store_path, SCHEMA_FILE_NAME), 'w') as f:
+            json.dump(schema, f)
+        _LOG.debug(f'Metric store built for \'{metric_file_path}\': '
+                   f'{len(df)} rows')
+
+    @classmethod
+    def read(cls, metric_file_path: str) -> Optional[pd.DataFrame]:
+        """
+        Returns metric file content from its store, timestamp column
+        contains tz-aware UTC datetimes. None if the store does not
+        exist or is stale.
+        """
+        store_path = cls.get_store_path(metric_file_path)
+        schema_path = os.path.join(store_path, SCHEMA_FILE_NAME)
+        if not os.path.isfile(schema_path):
+            return
+        with open(schema_path, 'r') as f:
+            schema = json.load(f)
+        source = cls._get_source_signature(metric_file_path)
+        if source != schema.get('source'):
+            _LOG.debug(f'Metric store of \'{metric_file_path}\' is stale')
+            return
+
+        timestamp_attr = schema.get('timestamp')
+        data = {}
+        for column, column_meta in schema['columns'].items():
+            file_path = os.path.join(store_path, column_meta['file'])
+            if column_meta['pickled']:
+                values = np.load(file_path, allow_pickle=True)
+            else:
+                # copy-on-write: frame may be modified in place
+                values = np.load(file_path, mmap_mode='c')
+            if column == timestamp_attr:
+                values = pd.DatetimeIndex(values).tz_localize('UTC')
+            elif column_meta.get('categorical'):
+                values = pd.Categorical(values)
+            data[column] = values
+        return pd.DataFrame(data, copy=False)
+
+    @classmethod
+    def remove(cls, metric_file_path: str):
+        store_path = cls.get_store_path(metric_file_path)
+        if os.path.isdir(store_path):
+            shutil.rmtree(store_path)
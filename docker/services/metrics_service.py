@@ -2,7 +2,7 @@ import datetime
 import glob
 import json
 import os
-from typing import List
+from typing import List, Union, Tuple
 
 import numpy as np
 import pandas
@@ -19,13 +19,21 @@ from commons.log_helper import get_logger
 from commons.profiler import profiler
 from models.algorithm import Algorithm
 from models.recommendation_history import RecommendationHistory
+from services.clustering_cache_service import ClusteringCacheService
 from services.clustering_service import ClusteringService
+from services.day_matrix import DayMatrix
+from services.metric_buffer import MetricBuffer
+from services.metric_frame import MetricFrame
+from services.metric_store import MetricStore
 from services.resize.resize_trend import ResizeTrend
 
 _LOG = get_logger('r8s-metrics-service')
 
 TIMESTAMP_FREQUENCY = '5Min'
 DAY_RECORDS = 144
+ROLLING_AVERAGE_WINDOW = 2
+EPOCH_MILLISECONDS_THRESHOLD = 10 ** 10
+EPOCH = pd.Timestamp(0, tz='UTC')
 
 META_KEY_RESOURCE_ID = 'resourceId'
 META_KEY_CREATE_DATE_TIMESTAMP = 'createDateTimestamp'
@@ -38,8 +46,10 @@ of records."""
 
 class MetricsService:
 
-    def __init__(self, clustering_service: ClusteringService):
+    def __init__(self, clustering_service: ClusteringService,
+                 clustering_cache_service: ClusteringCacheService = None):
         self.clustering_service = clustering_service
+        self.clustering_cache_service = clustering_cache_service
 
     def calculate_instance_trend(self, df, algorithm: Algorithm) \
             -> ResizeTrend:
@@ -123,16 +133,26 @@ class MetricsService:
         df = df.resample(diff).ffill()
         return df
 
-    def validate_metric_file(self, algorithm: Algorithm, metric_file_path):
-        try:
-            df = self.read_metrics(metric_file_path=metric_file_path,
-                                   algorithm=algorithm, parse_index=False)
-        except Exception as e:
-            _LOG.warning(f'Metric file can not be read: Exception: {e}')
-            raise ExecutorException(
-                step_name=JOB_STEP_VALIDATE_METRICS,
-                reason=f'Metric file can not be read: Exception: {e}'
-            )
+    def read_metric_frame(self, metric_file_path,
+                          algorithm: Algorithm) -> MetricFrame:
+        df = self.read_metrics(metric_file_path=metric_file_path,
+                               algorithm=algorithm, parse_index=False)
+        return MetricFrame(metric_file_path=metric_file_path, df=df)
+
+    def validate_metric_file(self, algorithm: Algorithm, metric_file_path,
+                             metric_frame: MetricFrame = None) \
+            -> MetricFrame:
+        if metric_frame is None:
+            try:
+                metric_frame = self.read_metric_frame(
+                    metric_file_path=metric_file_path, algorithm=algorithm)
+            except Exception as e:
+                _LOG.warning(f'Metric file can not be read: Exception: {e}')
+                raise ExecutorException(
+                    step_name=JOB_STEP_VALIDATE_METRICS,
+                    reason=f'Metric file can not be read: Exception: {e}'
+                )
+        df = metric_frame.df
         column_names = list(df.columns)
 
         required_columns_set = set(list(algorithm.required_data_attributes))
@@ -168,16 +188,23 @@ class MetricsService:
                 reason=f'Metric file must contain data for at '
                        f'least one metric: {", ".join(metric_attrs)}'
             )
+        return metric_frame
 
     def load_df(self, path, algorithm: Algorithm,
                 applied_recommendations: List[RecommendationHistory] = None,
-                instance_meta: dict = None, max_days: int = None):
+                instance_meta: dict = None, max_days: int = None,
+                metric_frame: MetricFrame = None):
         all_attrs = set(list(algorithm.required_data_attributes))
         metric_attrs = set(list(algorithm.metric_attributes))
         non_metric = all_attrs - metric_attrs
         non_metric.remove(algorithm.timestamp_attribute)
         try:
-            df = self.read_metrics(metric_file_path=path, algorithm=algorithm)
+            if metric_frame is not None:
+                df = self.index_by_timestamp(df=metric_frame.df,
+                                             algorithm=algorithm)
+            else:
+                df = self.read_metrics(metric_file_path=path,
+                                       algorithm=algorithm)
             df = self.trim_from_appliance_date(
                 df=df, applied_recommendations=applied_recommendations)
             recommendation_settings = algorithm.recommendation_settings
@@ -277,27 +304,79 @@ class MetricsService:
                 instance_id_date_mapping[instance_id] = [file]
         resulted_files = []
         for instance_id, files in instance_id_date_mapping.items():
-            if len(files) == 1:
-                resulted_files.append(files[0])
-                continue
-            most_recent = max(files)
-            files = sorted(files)
-
-            csv_to_combine = [self.read_metrics(f, algorithm=algorithm,
-                                                parse_index=False)
-                              for f in files]
-            combined_csv = pd.concat(csv_to_combine)
-            combined_csv.sort_values(algorithm.timestamp_attribute)
-            combined_csv.to_csv(most_recent, index=False)
-            resulted_files.append(most_recent)
+            resulted_files.append(self.merge_instance_metric_files(
+                metric_files=files, algorithm=algorithm))
+        return resulted_files
 
-        for file in metric_files:
-            if file not in resulted_files:
+    def merge_instance_metric_files(
+            self, metric_files: List[Union[str, MetricBuffer]],
+            algorithm: Algorithm):
+        """
+        Merges daily metric files of a single instance into the most
+        recent one, other files are removed. The merged file is always
+        written, so readers which bypass the store see all days. A
+        columnar store is built next to it and is read instead of the
+        file through read_metrics while the file is unchanged. Files
+        downloaded into memory are parsed from their buffers and are
+        never written to disk themselves.
+        """
+        buffers = {item.path: item for item in metric_files
+                   if isinstance(item, MetricBuffer)}
+        metric_files = [getattr(item, 'path', item) for item in metric_files]
+        most_recent = max(metric_files)
+        files = sorted(metric_files)
+
+        csv_to_combine = [self.read_metrics(buffers.get(f, f),
+                                            algorithm=algorithm,
+                                            parse_index=False)
+                          for f in files]
+        # daily files are concatenated in date order
+        combined_csv = pd.concat(csv_to_combine)
+        if len(files) > 1 or buffers:
+            os.makedirs(os.path.dirname(most_recent), exist_ok=True)
+            self.write_metric_file(df=combined_csv,
+                                   metric_file_path=most_recent,
+                                   algorithm=algorithm)
+        for file in files:
+            if file != most_recent and file not in buffers:
                 os.remove(file)
-        return resulted_files
+
+        timestamp_attr = algorithm.timestamp_attribute
+        try:
+            # the store is tied to the current state of the merged file,
+            # it becomes stale once the file is rewritten
+            MetricStore.write(
+                metric_file_path=most_recent,
+                df=combined_csv.assign(**{
+                    timestamp_attr: self.parse_timestamps(
+                        combined_csv[timestamp_attr])}),
+                timestamp_attr=timestamp_attr)
+        except Exception as e:
+            _LOG.warning(f'Failed to build metric store for '
+                         f'\'{most_recent}\', the file will be read: {e}')
+            MetricStore.remove(metric_file_path=most_recent)
+        return most_recent
+
+    @staticmethod
+    def write_metric_file(df: pd.DataFrame, metric_file_path,
+                          algorithm: Algorithm):
+        """
+        Writes metrics as a csv file. Parsed timestamps, e.g. read from
+        the metric store, are written back as epoch seconds so the file
+        can be parsed again.
+        """
+        timestamp_attr = algorithm.timestamp_attribute
+        timestamps = df[timestamp_attr]
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            index = pd.DatetimeIndex(timestamps)
+            if index.tz is None:
+                index = index.tz_localize('UTC')
+            df = df.assign(**{timestamp_attr: (
+                (index - EPOCH) // pd.Timedelta(seconds=1)).to_numpy()})
+        df.to_csv(metric_file_path, index=False)
 
     @profiler(execution_step=f'instance_clustering')
-    def divide_on_periods(self, df, algorithm: Algorithm):
+    def divide_on_periods(self, df, algorithm: Algorithm, instance_id=None):
         r_settings = algorithm.recommendation_settings
         df = self.divide_by_days(
             df, skip_incomplete_corner_days=True,
@@ -306,14 +385,63 @@ class MetricsService:
             r_settings.optimized_aggregation_threshold_days,
             optimized_step_minutes=
             r_settings.optimized_aggregation_step_minutes)
+        # smoothed metrics of all days, clustering input
+        day_matrix = DayMatrix.from_days(
+            days=df, columns=algorithm.metric_attributes,
+            step_minutes=r_settings.record_step_minutes
+        ).rolling_mean(window=ROLLING_AVERAGE_WINDOW)
+        cache_service = self.clustering_cache_service
+        clusterings = [None] * len(df)
+        instance_days = None
+        if cache_service and instance_id:
+            settings_hash = cache_service.get_settings_hash(
+                algorithm=algorithm,
+                engine=self.clustering_service.engine,
+                seed=self.clustering_service.seed)
+            instance_days = cache_service.get_instance_days(
+                instance_id=instance_id, settings_hash=settings_hash)
+            _LOG.debug(f'{len(instance_days)} cached clustering days found '
+                       f'for instance {instance_id}')
+            dates = [df_day.index[0].date().isoformat() for df_day in df]
+            data_hashes = [cache_service.get_data_hash(
+                df=df_day, column_names=algorithm.metric_attributes)
+                for df_day in df]
+            clusterings = [cache_service.get_day(
+                instance_days=instance_days, date=date, data_hash=data_hash)
+                for date, data_hash in zip(dates, data_hashes)]
+
+        # days without cached clustering are clustered in one batch
+        day_indexes = [index for index, clustering in enumerate(clusterings)
+                       if clustering is None]
+        day_clusterings = self.clustering_service.cluster_days(
+            day_matrix=day_matrix, day_indexes=day_indexes,
+            algorithm=algorithm)
+        for index, clustering in zip(day_indexes, day_clusterings):
+            clusterings[index] = clustering
+        if instance_days is not None:
+            cache_service.save_days(
+                instance_id=instance_id,
+                settings_hash=settings_hash,
+                days=[(dates[index], data_hashes[index], *clustering)
+                      for index, clustering in zip(day_indexes,
+                                                   day_clusterings)])
+
+        # load levels of all days are classified at once in the dense
+        # form, each day takes its row of real records
+        levels, mask = self.get_load_levels(
+            day_matrix=day_matrix, clusterings=clusterings,
+            thresholds=r_settings.thresholds)
+
         shutdown_periods = []
         low_util_periods = []
         good_util_periods = []
         over_util_periods = []
         centroids = []
-        for index, df_day in enumerate(df):
+        for day_index, (df_day, clustering) in enumerate(zip(df,
+                                                             clusterings)):
             shutdown, low, medium, high, day_centroids = self.process_day(
-                df=df_day, algorithm=algorithm)
+                df=df_day, algorithm=algorithm, clustering=clustering,
+                levels=levels[day_index][mask[day_index]])
             shutdown_periods.extend(shutdown)
             low_util_periods.extend(low)
             good_util_periods.extend(medium)
@@ -349,7 +477,9 @@ class MetricsService:
                        step_minutes: int,
                        optimized_aggregation_threshold_days: int = None,
                        optimized_step_minutes: int = None):
-        df_list = [group[1] for group in df.groupby(df.index.date)]
+        _, day_starts = DayMatrix.get_day_bounds(df.index)
+        df_list = [df.iloc[start:end].copy()
+                   for start, end in zip(day_starts[:-1], day_starts[1:])]
         if not df_list:
             return df_list
         if len(df_list) < MINIMUM_DAYS_TO_CUT_INCOMPLETE_EDGE_DAYS \
@@ -370,40 +500,60 @@ class MetricsService:
             df_list = df_list[1:]
         return df_list
 
-    def process_day(self, df: pandas.DataFrame, algorithm: Algorithm):
-        shutdown = []
-        low_util = []
-        good_util = []
-        over_util = []
-
-        df_, centroids = self.clustering_service.cluster(
-            df=df,
-            algorithm=algorithm)
-
+    @staticmethod
+    def get_load_levels(day_matrix: DayMatrix, clusterings: List[tuple],
+                        thresholds: List[float]) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Load levels of the records of all days as (days x slots_per_day)
+        array along with the mask of slots with a record. Each record is
+        classified by the cpu centroid of its cluster: 0 - shutdown,
+        1 - low, 2 - good, 3 - over utilization. Records of clusters
+        without a centroid and empty slots are -1.
+        """
+        max_clusters = max((len(centroids) for _, centroids in clusterings),
+                           default=0)
+        centroid_cpu = np.full((len(clusterings), max(max_clusters, 1)),
+                               np.nan)
+        for day_index, (_, centroids) in enumerate(clusterings):
+            for cluster_index, centroid in enumerate(centroids):
+                if centroid:
+                    centroid_cpu[day_index, cluster_index] = centroid[0]
+        labels = np.concatenate(
+            [np.asarray(labels, dtype=np.int64)
+             for labels, _ in clusterings] or [np.empty(0, dtype=np.int64)])
+        dense_labels, mask = day_matrix.to_dense(values=labels, fill_value=0)
+        cpu = np.take_along_axis(centroid_cpu, dense_labels, axis=1)
+        levels = np.searchsorted(np.asarray(thresholds[:3], dtype=float),
+                                 cpu, side='right')
+        levels = np.where(mask & ~np.isnan(cpu), levels, -1)
+        return levels, mask
+
+    def process_day(self, df: pandas.DataFrame, algorithm: Algorithm,
+                    clustering: tuple, levels: np.ndarray = None):
+        """
+        Divides day metrics by load levels of the given (labels,
+        centroids) day clustering, calculated by
+        ClusteringService.cluster_days. Load levels of the day records
+        can be given as calculated by get_load_levels for all days.
+        """
+        _, centroids = clustering
         _LOG.debug(f'Clusters centroids: {centroids}')
         r_settings = algorithm.recommendation_settings
-        thresholds = r_settings.thresholds
-
-        for index, centroid in enumerate(centroids):
-            if not centroid:
-                continue
-            cluster: pd.DataFrame = df.loc[df['cluster'] == index]
-            cluster.drop('cluster', axis=1, inplace=True)
-            if centroid[0] < thresholds[0]:
-                shutdown.append(cluster)
-            elif thresholds[0] <= centroid[0] < \
-                    thresholds[1]:
-                low_util.append(cluster)
-            elif thresholds[1] <= centroid[0] < \
-                    thresholds[2]:
-                good_util.append(cluster)
-            else:
-                over_util.append(cluster)
-
-        shutdown = pd.concat(shutdown) if shutdown else None
-        low_util = pd.concat(low_util) if low_util else None
-        good_util = pd.concat(good_util) if good_util else None
-        over_util = pd.concat(over_util) if over_util else None
+        if levels is None:
+            day_matrix = DayMatrix.from_days(
+                days=[df], columns=algorithm.metric_attributes,
+                step_minutes=r_settings.record_step_minutes)
+            levels, mask = self.get_load_levels(
+                day_matrix=day_matrix, clusterings=[clustering],
+                thresholds=r_settings.thresholds)
+            levels = levels[0][mask[0]]
+
+        # records of each level in their time order
+        shutdown, low_util, good_util, over_util = (
+            df.iloc[positions] if len(positions) else None
+            for positions in (np.flatnonzero(levels == level)
+                              for level in range(4)))
 
         step_minutes_options = [r_settings.record_step_minutes]
         if (r_settings.optimized_aggregation_threshold_days
@@ -443,31 +593,24 @@ class MetricsService:
         if not isinstance(df, pd.DataFrame) or len(df) == 0:
             return []
 
-        period_start_row_index = None
-        period_end_row_index = None
-        dfs_ = []
-        last_row = None
-
         if not df.index.is_monotonic_increasing:
             df.sort_index(inplace=True)
-        for row in df.itertuples():
-            if not period_start_row_index:
-                period_start_row_index = row.Index
-            else:
-                diff_minutes = self.get_diff_minutes(
-                    row.Index, last_row.Index
-                )
-                if diff_minutes in step_minutes_options:
-                    period_end_row_index = row.Index
-                elif period_end_row_index:
-                    dfs_.append(df[(df.index >= period_start_row_index) &
-                                   (df.index <= period_end_row_index)])
-                    period_start_row_index = row.Index
-                    period_end_row_index = None
-            last_row = row
-        if period_start_row_index and period_end_row_index:
-            dfs_.append(df[(df.index >= period_start_row_index) & (
-                    df.index <= period_end_row_index)])
+
+        # rows which continue a period: step from the previous row is
+        # one of the allowed ones
+        diff_minutes = np.diff(df.index.asi8) // (60 * 10 ** 9)
+        is_continued = np.isin(diff_minutes, step_minutes_options)
+        # runs of continued rows, row positions are shifted by one
+        # because of diff
+        bounds = np.diff(np.concatenate(([0], is_continued.view(np.int8),
+                                         [0])))
+        run_ends = np.flatnonzero(bounds == -1)
+        # a period starts right after the end of the previous one: rows
+        # between periods which do not continue any of them are kept in
+        # the next period
+        period_starts = np.concatenate(([0], run_ends[:-1] + 1))
+        dfs_ = [df.iloc[period_start:period_end + 1]
+                for period_start, period_end in zip(period_starts, run_ends)]
 
         for index, df_ in enumerate(dfs_):
             step_minutes = (df_.index[1] - df_.index[0]).seconds // 60
@@ -490,10 +633,15 @@ class MetricsService:
         return periods
 
     def get_instance_type(self, metric_file_path, algorithm: Algorithm,
-                          instance_type_attr='instance_type'):
+                          instance_type_attr='instance_type',
+                          metric_frame: MetricFrame = None):
         try:
-            df = self.read_metrics(metric_file_path=metric_file_path,
-                                   algorithm=algorithm, parse_index=False)
+            if metric_frame is not None:
+                df = metric_frame.df
+            else:
+                df = self.read_metrics(metric_file_path=metric_file_path,
+                                       algorithm=algorithm,
+                                       parse_index=False)
             return df[instance_type_attr][0]
         except Exception as e:
             _LOG.error(f'Failed to extract instance type from metric file. '
@@ -505,17 +653,28 @@ class MetricsService:
             )
 
     @staticmethod
-    def read_metrics(metric_file_path, algorithm: Algorithm = None,
-                     parse_index=True):
+    def read_metrics(metric_file_path: Union[str, MetricBuffer],
+                     algorithm: Algorithm = None, parse_index=True):
         try:
+            timestamp_attr = algorithm.timestamp_attribute
+            if isinstance(metric_file_path, MetricBuffer):
+                df = None
+                source = metric_file_path.open()
+            else:
+                df = MetricStore.read(metric_file_path=metric_file_path)
+                source = metric_file_path
+            if df is None:
+                df = pd.read_csv(
+                    source,
+                    dtype=MetricsService.get_read_dtypes(algorithm),
+                    **algorithm.get_read_configuration())
+                if not parse_index:
+                    return df
+                df[timestamp_attr] = MetricsService.parse_timestamps(
+                    df[timestamp_attr])
             if not parse_index:
-                return pd.read_csv(metric_file_path,
-                                   **algorithm.get_read_configuration())
-            return pd.read_csv(
-                metric_file_path, parse_dates=True,
-                date_parser=dateparse,
-                index_col=algorithm.timestamp_attribute,
-                **algorithm.get_read_configuration())
+                return df
+            return df.set_index(timestamp_attr)
         except Exception as e:
             _LOG.error(f'Error occurred while reading metrics file: {str(e)}')
             raise ExecutorException(
@@ -523,6 +682,49 @@ class MetricsService:
                 reason=f'Unable to read metrics file'
             )
 
+    @staticmethod
+    def index_by_timestamp(df: pd.DataFrame, algorithm: Algorithm):
+        """
+        Builds the same timestamp-indexed frame as read_metrics does, from
+        an already parsed metric frame. The source frame is left intact.
+        """
+        timestamp_attr = algorithm.timestamp_attribute
+        index = MetricsService.parse_timestamps(df[timestamp_attr])
+        return df.drop(columns=timestamp_attr).set_index(index)
+
+    @staticmethod
+    def parse_timestamps(timestamps: pd.Series) -> pd.DatetimeIndex:
+        """
+        Converts epoch timestamps (seconds or milliseconds) of a metric
+        file to UTC datetimes in one vectorized call. Already parsed
+        timestamps are returned as is.
+        """
+        if pd.api.types.is_datetime64_any_dtype(timestamps):
+            return pd.DatetimeIndex(timestamps, name=timestamps.name)
+        if not pd.api.types.is_integer_dtype(timestamps):
+            return pd.DatetimeIndex(timestamps.astype(str).map(dateparse),
+                                    name=timestamps.name)
+        values = timestamps.to_numpy(dtype=np.int64)
+        # same as dateparse: values longer than 10 digits are milliseconds,
+        # truncated to the whole second
+        values = np.where(values >= EPOCH_MILLISECONDS_THRESHOLD,
+                          values // 1000, values)
+        return pd.DatetimeIndex(pd.to_datetime(values, unit='s', utc=True),
+                                name=timestamps.name)
+
+    @staticmethod
+    def get_read_dtypes(algorithm: Algorithm) -> dict:
+        """
+        Column types of a metric file: attributes which are neither
+        metrics nor timestamp (instance id and type) repeat the same
+        value in each row and are read as categories.
+        """
+        metric_attrs = set(algorithm.metric_attributes)
+        return {attr: 'category'
+                for attr in algorithm.required_data_attributes
+                if attr not in metric_attrs
+                and attr != algorithm.timestamp_attribute}
+
     def read_meta(self, metrics_folder):
         instance_meta_mapping = {}
 
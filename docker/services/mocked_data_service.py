@@ -123,6 +123,9 @@ class MockedDataService:
         }
 
     def process(self, instance_meta_mapping, metric_file_paths):
+        """
+        Returns the list of metric files replaced with mocked data.
+        """
         instance_tags_mapping = self.parse_tags(
             instance_meta_mapping=instance_meta_mapping)
 
@@ -137,13 +140,16 @@ class MockedDataService:
 
         if not file_to_meta_mapping:
             _LOG.warning(f'No instances with tag \'{TAG_TEST_CASE}\' found.')
-            return
+            return []
 
+        mocked_file_paths = []
         for file_path, instance_meta in file_to_meta_mapping.items():
             _LOG.debug(f'Going to replace metrics by path \'{file_path}\' '
                        f'with mocked metrics by tags: {instance_meta}')
-            self.process_instance(instance_meta=instance_meta,
-                                  metric_file_path=file_path)
+            if self.process_instance(instance_meta=instance_meta,
+                                     metric_file_path=file_path):
+                mocked_file_paths.append(file_path)
+        return mocked_file_paths
 
     def process_instance(self, instance_meta, metric_file_path):
         _LOG.debug(f'Filtering instance meta')
@@ -156,7 +162,7 @@ class MockedDataService:
         if test_case not in ALLOWED_ACTIONS:
             _LOG.error(f'Invalid test case specified: \'{test_case}\'. '
                        f'Allowed test cases: {ALLOWED_ACTIONS}')
-            return
+            return False
 
         test_config = DEFAULT_CONFIG.get(test_case).copy()
 
@@ -176,6 +182,7 @@ class MockedDataService:
             test_config[key] = value
         generator = self.action_generator_mapping.get(test_case)
         generator(test_config, metric_file_path)
+        return True
 
     @staticmethod
     def values_to_number(instance_meta):
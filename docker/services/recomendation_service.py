@@ -1,5 +1,4 @@
 import itertools
-import json
 import os
 from datetime import datetime, timedelta
 from typing import Union, List, Dict
@@ -27,9 +26,11 @@ from models.shape import Shape
 from models.shape_price import OSEnum
 from services.environment_service import EnvironmentService
 from services.meta_service import MetaService
+from services.metric_frame import MetricFrame
 from services.metrics_service import MetricsService
 from services.recommendation_history_service import \
     RecommendationHistoryService
+from services.report_writer import ReportWriter
 from services.resize.resize_service import ResizeService
 from services.resize.resize_trend import ResizeTrend
 from services.saving.saving_service import SavingService
@@ -62,6 +63,7 @@ class RecommendationService:
         self.meta_service = meta_service
         self.recommendation_history_service = recommendation_history_service
         self.shape_service = shape_service
+        self.report_writer = ReportWriter()
 
         self.policy_type_processor = {
             GROUP_POLICY_AUTO_SCALING: self.process_autoscaling_group
@@ -70,7 +72,9 @@ class RecommendationService:
     @profiler(execution_step=f'instance_recommendation_generation')
     def process_instance(self, metric_file_path, algorithm: Algorithm,
                          reports_dir, instance_meta_mapping=None,
-                         parent_meta: Union[None, LicensesParentMeta] = None):
+                         parent_meta: Union[None, LicensesParentMeta] = None,
+                         metric_frame: MetricFrame = None,
+                         feedback_mapping: dict = None):
         _LOG.debug(f'Parsing entity names from metrics file path '
                    f'\'{metric_file_path}\'')
         df = None
@@ -98,9 +102,14 @@ class RecommendationService:
 
         _LOG.debug(f'Instance meta: {instance_meta}')
 
-        _LOG.debug('Loading past recommendation with feedback')
-        past_recommendations_feedback = self.recommendation_history_service. \
-            get_recommendation_with_feedback(instance_id=instance_id)
+        if feedback_mapping is not None:
+            past_recommendations_feedback = list(
+                feedback_mapping.get(instance_id, []))
+        else:
+            _LOG.debug('Loading past recommendation with feedback')
+            past_recommendations_feedback = self. \
+                recommendation_history_service. \
+                get_recommendation_with_feedback(instance_id=instance_id)
 
         applied_recommendations = self.recommendation_history_service. \
             filter_applied(recommendations=past_recommendations_feedback)
@@ -115,20 +124,23 @@ class RecommendationService:
                 path=metric_file_path,
                 algorithm=algorithm,
                 applied_recommendations=applied_recommendations,
-                instance_meta=instance_meta
+                instance_meta=instance_meta,
+                metric_frame=metric_frame
             )
 
             _LOG.debug('Extracting instance type name')
             instance_type = self.metrics_service.get_instance_type(
                 metric_file_path=metric_file_path,
-                algorithm=algorithm
+                algorithm=algorithm,
+                metric_frame=metric_frame
             )
             _LOG.debug('Dividing into periods with different load')
             shutdown_periods, low_periods, medium_periods, \
                 high_periods, centroids = \
                 self.metrics_service.divide_on_periods(
                     df=df,
-                    algorithm=algorithm)
+                    algorithm=algorithm,
+                    instance_id=instance_id)
 
             _LOG.debug(f'Got {len(high_periods)} high-load, '
                        f'{len(low_periods)} low-load periods')
@@ -309,7 +321,8 @@ class RecommendationService:
                                 group_policy: dict,
                                 metric_file_paths: List[str],
                                 algorithm: Algorithm, reports_dir,
-                                instance_meta_mapping):
+                                instance_meta_mapping,
+                                metric_frames: Dict[str, MetricFrame] = None):
         group_policy_type = group_policy.get(TYPE_ATTR)
 
         processor = self.policy_type_processor.get(group_policy_type)
@@ -331,14 +344,16 @@ class RecommendationService:
             metric_file_paths=metric_file_paths,
             algorithm=algorithm,
             reports_dir=reports_dir,
-            instance_meta_mapping=instance_meta_mapping
+            instance_meta_mapping=instance_meta_mapping,
+            metric_frames=metric_frames
         )
 
     def process_autoscaling_group(self, group_id: str,
                                   group_policy: dict,
                                   metric_file_paths: List[str],
                                   algorithm: Algorithm, reports_dir,
-                                  instance_meta_mapping: dict):
+                                  instance_meta_mapping: dict,
+                                  metric_frames: Dict[str, MetricFrame] = None):
         _LOG.debug(f'Loading group resources: {metric_file_paths}')
 
         customer, cloud, tenant, region, _, instance_id = self.parse_folders(
@@ -374,17 +389,20 @@ class RecommendationService:
         instance_type_mapping = {}  # instance_type: List[instance_id]
         id_file_mapping = {}
         failed_resources = {}
+        metric_frames = metric_frames or {}
         for metric_file_path in metric_file_paths:
             instance_id = self.get_instance_id(
                 metric_file_path=metric_file_path)
             id_file_mapping[instance_id] = metric_file_path
+            metric_frame = metric_frames.get(metric_file_path)
             _LOG.debug(f'Loading df: {metric_file_path}')
             try:
                 df = self.metrics_service.load_df(
                     path=metric_file_path,
                     algorithm=algorithm,
                     instance_meta=instance_meta_mapping.get(instance_id, {}),
-                    max_days=group_policy.get(COOLDOWN_DAYS_ATTR)
+                    max_days=group_policy.get(COOLDOWN_DAYS_ATTR),
+                    metric_frame=metric_frame
                 )
                 dfs[instance_id] = df
             except ExecutorException as e:
@@ -396,7 +414,8 @@ class RecommendationService:
             _LOG.debug('Extracting instance type name')
             instance_type = self.metrics_service.get_instance_type(
                 metric_file_path=metric_file_path,
-                algorithm=algorithm
+                algorithm=algorithm,
+                metric_frame=metric_frame
             )
             if instance_type not in instance_type_mapping:
                 instance_type_mapping[instance_type] = [instance_id]
@@ -521,7 +540,8 @@ class RecommendationService:
             action=scale_action,
             recommendation=item.get('recommendation')
         )
-        self.recommendation_history_service.save(recommendation=history_item)
+        if history_item:
+            self.save_history_items(history_items=[history_item])
 
     def divide_by_group_policies(self, metric_file_paths: List[str],
                                  instance_meta_mapping: dict,
@@ -626,13 +646,10 @@ class RecommendationService:
                    f'Individual resources: {individual_resources}')
         return group_resources_mapping, individual_resources
 
-    def dump_error_report(self, reports_dir, metric_file_path,
-                          exception):
-        customer, cloud, tenant, region, _, instance_id = self.parse_folders(
-            metric_file_path=metric_file_path
-        )
+    def format_error_report(self, metric_file_path, exception):
+        instance_id = self.get_instance_id(metric_file_path=metric_file_path)
         stats = self.calculate_instance_stats(exception=exception)
-        item = self.format_recommendation(
+        return self.format_recommendation(
             instance_id=instance_id,
             schedule=[],
             recommended_sizes=[],
@@ -640,6 +657,14 @@ class RecommendationService:
             meta={},
             general_action=STATUS_ERROR
         )
+
+    def dump_error_report(self, reports_dir, metric_file_path,
+                          exception):
+        customer, cloud, tenant, region, _, instance_id = self.parse_folders(
+            metric_file_path=metric_file_path
+        )
+        item = self.format_error_report(metric_file_path=metric_file_path,
+                                        exception=exception)
         return self.save_report(
             reports_dir=reports_dir,
             customer=customer,
@@ -713,23 +738,37 @@ class RecommendationService:
         self.prettify_recommendation(recommendation_item=item)
         return item
 
-    @staticmethod
-    def save_report(reports_dir, customer, cloud, tenant, region, item):
-        dir_path = os.path.join(reports_dir, customer, cloud, tenant)
-        os.makedirs(dir_path, exist_ok=True)
-        file_path = os.path.join(dir_path, f'{region}.jsonl')
-        with open(file_path, 'a') as f:
-            f.write(json.dumps(item))
-            f.write('\n')
-
-    def save_history_items(self, history_items: List[RecommendationHistory]):
+    def save_report(self, reports_dir, customer, cloud, tenant, region,
+                    item):
+        self.report_writer.write(
+            reports_dir=reports_dir,
+            customer=customer,
+            cloud=cloud,
+            tenant=tenant,
+            region=region,
+            item=item
+        )
+
+    def close_reports(self):
+        _LOG.debug('Closing report files')
+        self.report_writer.close()
+
+    def save_history_items(self, history_items: List[RecommendationHistory]) \
+            -> bool:
+        """
+        Buffers history items, returns True if the buffer was flushed.
+        Flush errors are raised, buffered items are not persisted then.
+        """
         _LOG.debug(f'Saving \'{len(history_items)}\' history items')
-        try:
-            self.recommendation_history_service.batch_save(
-                recommendations=history_items)
-        except Exception as e:
-            _LOG.error(f'Exception occurred while saving recommendation '
-                       f'to history: {str(e)}')
+        return self.recommendation_history_service.save_buffered(
+            recommendations=history_items)
+
+    def flush_history_items(self):
+        _LOG.debug('Flushing buffered history items')
+        self.recommendation_history_service.flush()
+
+    def clear_history_items(self):
+        self.recommendation_history_service.clear_buffer()
 
     def dump_reports_from_recommendations(
             self, reports_dir, cloud,
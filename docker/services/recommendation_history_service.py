@@ -1,6 +1,9 @@
 from typing import List, Dict, Optional
 import datetime
 
+from bson import ObjectId
+from pymongo import UpdateOne, DeleteMany
+
 from commons.constants import ACTION_EMPTY, ACTION_ERROR, ACTION_SCHEDULE, \
     ACTION_SCALE_UP, ACTION_SCALE_DOWN, ACTION_CHANGE_SHAPE, ACTION_SPLIT, \
     ACTION_SHUTDOWN, SAVING_OPTIONS_ATTR
@@ -14,8 +17,33 @@ _LOG = get_logger('r8s-recommendation-history-service')
 RESIZE_ACTIONS = [ACTION_SCALE_UP, ACTION_SCALE_DOWN,
                   ACTION_CHANGE_SHAPE, ACTION_SPLIT]
 
+# fields of a recent recommendation overwritten by a new one
+UPDATE_FIELDS = ('job_id', 'customer', 'tenant', 'region', 'added_at',
+                 'current_instance_type', 'current_month_price_usd',
+                 'recommendation', 'recommendation_type', 'savings',
+                 'instance_meta', 'last_metric_capture_date')
+DEFAULT_BATCH_SIZE = 500
+# fields set only when a feedback is given
+FEEDBACK_STATE_FIELDS = ('feedback_dt', 'feedback_status')
+# max amount of ids in a single query of recommendations by id
+LOAD_BATCH_SIZE = 1000
+# fields of a recommendation with feedback used to adjust a new one
+FEEDBACK_FIELDS = ('resource_id', 'recommendation_type', 'recommendation',
+                   'feedback_dt', 'feedback_status')
+
 
 class RecommendationHistoryService:
+    """
+    Recommendation history is written behind: items are buffered and
+    upserted with a single bulk write once the buffer reaches the batch
+    size, and on explicit flush (tenant end). Each item replaces the
+    recent (current week) recommendation of the same resource and
+    type without feedback.
+    """
+
+    def __init__(self, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.__buffer: List[RecommendationHistory] = []
 
     def create(self, resource_id: str,
                job_id: str, customer: str, tenant: str,
@@ -46,7 +74,7 @@ class RecommendationHistoryService:
                 _LOG.warning(f'Unknown recommendation type detected: '
                              f'{action}')
                 continue
-            recommendation_item = self._create_or_update_recent(
+            recommendation_item = self._build(
                 resource_id=resource_id,
                 resource_type=resource_type,
                 job_id=job_id,
@@ -75,7 +103,7 @@ class RecommendationHistoryService:
             _LOG.debug(f'Skipping saving result to history collection. '
                        f'Action: \'{action}\'')
             return
-        return self._create_or_update_recent(
+        return self._build(
             resource_id=resource_id,
             resource_type=RESOURCE_TYPE_GROUP,
             job_id=job_id,
@@ -91,64 +119,28 @@ class RecommendationHistoryService:
             last_metric_capture_date=last_metric_capture_date
         )
 
-    def _create_or_update_recent(self, resource_id, resource_type,
-                                 job_id, customer, tenant,
-                                 region, current_instance_type,
-                                 current_month_price_usd, recommendation_type,
-                                 recommendation, savings, instance_meta,
-                                 last_metric_capture_date):
-        recent_recommendations = self.get_recent_recommendation(
-            resource_id=resource_id,
-            resource_type=resource_type,
-            recommendation_type=recommendation_type,
-            without_feedback=True
-        )
+    @staticmethod
+    def _build(resource_id, resource_type, job_id, customer, tenant,
+               region, current_instance_type, current_month_price_usd,
+               recommendation_type, recommendation, savings, instance_meta,
+               last_metric_capture_date) -> RecommendationHistory:
         if recommendation is not None and not isinstance(recommendation, list):
             recommendation = [recommendation]
-
-        if not recent_recommendations:
-            _LOG.debug(f'No recent \'{recommendation_type}\' recommendation '
-                       f'found for resource \'{resource_id}\'. Creating new '
-                       f'record.')
-            return RecommendationHistory(
-                resource_id=resource_id,
-                resource_type=resource_type,
-                job_id=job_id,
-                customer=customer,
-                tenant=tenant,
-                region=region,
-                current_instance_type=current_instance_type,
-                current_month_price_usd=current_month_price_usd,
-                recommendation_type=recommendation_type,
-                recommendation=recommendation,
-                savings=savings,
-                instance_meta=instance_meta,
-                last_metric_capture_date=last_metric_capture_date
-            )
-        recent_recommendations = list(recent_recommendations)
-        if len(recent_recommendations) > 1:
-            _LOG.error('More than one recent recommendation found. '
-                       'Deleting all except the most recent')
-            for recommendation in recent_recommendations[1:]:
-                self.delete(recommendation=recommendation)
-
-        recent_recommendation: RecommendationHistory = recent_recommendations[0]
-        _LOG.debug('Recent recommendation found, updating.')
-        recent_recommendation.update(
+        return RecommendationHistory(
+            resource_id=resource_id,
+            resource_type=resource_type,
             job_id=job_id,
             customer=customer,
             tenant=tenant,
             region=region,
-            added_at=datetime.datetime.utcnow(),
             current_instance_type=current_instance_type,
             current_month_price_usd=current_month_price_usd,
-            recommendation=recommendation,
             recommendation_type=recommendation_type,
+            recommendation=recommendation,
             savings=savings,
             instance_meta=instance_meta,
             last_metric_capture_date=last_metric_capture_date
         )
-        return recent_recommendation
 
     def get_recent_recommendation(self, resource_id,
                                   resource_type=RESOURCE_TYPE_INSTANCE,
@@ -177,23 +169,40 @@ class RecommendationHistoryService:
             filter_only_last_job=True,
             resource_type: str = RESOURCE_TYPE_INSTANCE) -> \
             Dict[str, List[RecommendationHistory]]:
+        """
+        Past recommendations of the tenant resources mapped by resource
+        id, the most recent first. Keys of the history are scanned as
+        raw documents first, only the kept recommendations are loaded
+        in full.
+        """
         threshold_date = self._get_past_date(n_days=last_days)
         query = {
             'added_at__gt': threshold_date,
             'tenant': tenant,
             'resource_type': resource_type
         }
-        items = RecommendationHistory.objects(**query).order_by('-added_at')
-        result = {}
-
-        for item in items:
-            instance_id = item.resource_id
-            if instance_id not in result:
-                result[instance_id] = [item]
+        keys = RecommendationHistory.objects(**query).order_by(
+            '-added_at').only('id', 'resource_id', 'job_id').as_pymongo()
+        kept = {}
+        for key in keys:
+            instance_id = key.get('resource_id')
+            if instance_id not in kept:
+                kept[instance_id] = [key]
             elif (not filter_only_last_job or
-                  result[instance_id][0].job_id == item.job_id):
-                result[instance_id].append(item)
-
+                  kept[instance_id][0].get('job_id') == key.get('job_id')):
+                kept[instance_id].append(key)
+
+        ids = [key['_id'] for instance_keys in kept.values()
+               for key in instance_keys]
+        items = {}
+        for index in range(0, len(ids), LOAD_BATCH_SIZE):
+            items.update((item.id, item) for item in RecommendationHistory.
+                         objects(id__in=ids[index:index + LOAD_BATCH_SIZE]))
+        result = {}
+        for instance_id, instance_keys in kept.items():
+            result[instance_id] = [items[key['_id']]
+                                   for key in instance_keys
+                                   if key['_id'] in items]
         return result
 
     def get_instance_last_captured_date_map(
@@ -204,7 +213,8 @@ class RecommendationHistoryService:
             'tenant': tenant,
             'resource_type': resource_type
         }
-        items = RecommendationHistory.objects(**query).order_by('-added_at')
+        items = RecommendationHistory.objects(**query).order_by(
+            '-added_at').only('resource_id', 'last_metric_capture_date')
 
         result = {}
         for item in items:
@@ -228,6 +238,14 @@ class RecommendationHistoryService:
             result = result.limit(limit)
         return result
 
+    @staticmethod
+    def get_job_recommendations(job_id: str, resource_ids: List[str]) \
+            -> List[RecommendationHistory]:
+        return list(RecommendationHistory.objects(
+            job_id=job_id,
+            resource_id__in=resource_ids
+        ))
+
     @staticmethod
     def get_recommendation_with_feedback(instance_id):
         return list(RecommendationHistory.objects(
@@ -237,6 +255,26 @@ class RecommendationHistoryService:
             feedback_status__ne=None
         ))
 
+    @staticmethod
+    def get_tenant_feedback_map(tenant: str,
+                                resource_type=RESOURCE_TYPE_INSTANCE) -> \
+            Dict[str, List[RecommendationHistory]]:
+        """
+        Recommendations with feedback of all the tenant resources in a
+        single query, mapped by resource id. Only the fields used for
+        feedback-based adjustments are loaded.
+        """
+        items = RecommendationHistory.objects(
+            tenant=tenant,
+            resource_type=resource_type,
+            feedback_dt__ne=None,
+            feedback_status__ne=None
+        ).only(*FEEDBACK_FIELDS)
+        result = {}
+        for item in items:
+            result.setdefault(item.resource_id, []).append(item)
+        return result
+
     @staticmethod
     def filter_applied(recommendations: List[RecommendationHistory]):
         return [item for item in recommendations if
@@ -261,20 +299,129 @@ class RecommendationHistoryService:
             return True
         return False
 
-    @staticmethod
-    def batch_save(recommendations: List[RecommendationHistory]):
-        to_update = []
-        to_create = []
+    def save_buffered(self, recommendations: List[RecommendationHistory]) \
+            -> bool:
+        """
+        Adds items to the write buffer, flushes it once the batch size
+        is reached. Returns True if the buffer was flushed
+        """
+        self.__buffer.extend(recommendations)
+        if len(self.__buffer) < self.batch_size:
+            return False
+        self.flush()
+        return True
+
+    def clear_buffer(self):
+        """
+        Drops buffered items without writing them, e.g. items of a
+        failed tenant
+        """
+        if self.__buffer:
+            _LOG.warning(f'Dropping \'{len(self.__buffer)}\' buffered '
+                         f'history items')
+        self.__buffer = []
+
+    def flush(self):
+        """
+        Upserts buffered items keyed on (resource_id, resource_type,
+        recommendation_type, current week) with a single bulk write.
+        Duplicated recent recommendations are removed in the same write,
+        only the most recent one of each key is updated. Flushed items
+        get ids of their documents.
+        """
+        if not self.__buffer:
+            return
+        recommendations, self.__buffer = self.__buffer, []
+        _LOG.debug(f'Flushing \'{len(recommendations)}\' history items')
+        week_start = self._get_week_start_dt()
+        recent_ids, duplicate_ids = self._get_recent_ids(
+            recommendations=recommendations, week_start=week_start)
+
+        operations = []
+        if duplicate_ids:
+            _LOG.error(f'{len(duplicate_ids)} duplicated recent '
+                       f'recommendations found, deleting them')
+            operations.append(DeleteMany({'_id': {'$in': duplicate_ids}}))
         for recommendation in recommendations:
-            if recommendation.get_json().get('_id'):
-                to_update.append(recommendation)
+            document = recommendation.to_mongo().to_dict()
+            document.pop('_id', None)
+            update = {'$set': {field: document.pop(field)
+                               for field in UPDATE_FIELDS
+                               if field in document}}
+            to_unset = {field: '' for field in UPDATE_FIELDS
+                        if field not in update['$set']}
+            if to_unset:
+                update['$unset'] = to_unset
+
+            key = self._get_key(recommendation)
+            recent_id = recent_ids.get(key)
+            if recent_id:
+                operations.append(UpdateOne({'_id': recent_id}, update))
             else:
-                to_create.append(recommendation)
+                recent_id = recent_ids[key] = ObjectId()
+                document['_id'] = recent_id
+                update['$setOnInsert'] = {
+                    field: value for field, value in document.items()
+                    if field not in ('resource_id', 'resource_type',
+                                     *FEEDBACK_STATE_FIELDS)
+                }
+                # equality fields of the filter are copied into an
+                # inserted document, feedback fields must stay absent
+                # until a feedback is given
+                update.setdefault('$unset', {}).update(
+                    {field: '' for field in FEEDBACK_STATE_FIELDS})
+                operations.append(UpdateOne({
+                    'resource_id': recommendation.resource_id,
+                    'resource_type': recommendation.resource_type,
+                    'recommendation_type': update['$set'].get(
+                        'recommendation_type'),
+                    'added_at': {'$gt': week_start},
+                    **{field: None for field in FEEDBACK_STATE_FIELDS}
+                }, update, upsert=True))
+            recommendation.id = recent_id
+        self._write_operations(operations=operations)
 
-        if to_create:
-            RecommendationHistory.objects.insert(to_create)
-        for recommendation in to_update:
-            recommendation.save()
+    @staticmethod
+    def _write_operations(operations: list):
+        RecommendationHistory._get_collection().bulk_write(operations,
+                                                           ordered=True)
+
+    @staticmethod
+    def _get_recent_ids(recommendations: List[RecommendationHistory],
+                        week_start: datetime.datetime):
+        """
+        Ids of the most recent recommendation without feedback of each
+        key and ids of other (duplicated) ones, in a single query
+        """
+        recent = RecommendationHistory.objects(
+            resource_id__in=list({item.resource_id
+                                  for item in recommendations}),
+            added_at__gt=week_start,
+            feedback_dt=None,
+            feedback_status=None
+        ).order_by('-added_at').only(
+            'id', 'resource_id', 'resource_type', 'recommendation_type')
+        keys = {RecommendationHistoryService._get_key(item)
+                for item in recommendations}
+        recent_ids = {}
+        duplicate_ids = []
+        for item in recent:
+            key = RecommendationHistoryService._get_key(item)
+            if key not in keys:
+                continue
+            if key in recent_ids:
+                duplicate_ids.append(item.id)
+            else:
+                recent_ids[key] = item.id
+        return recent_ids, duplicate_ids
+
+    @staticmethod
+    def _get_key(recommendation: RecommendationHistory):
+        recommendation_type = recommendation.recommendation_type
+        if isinstance(recommendation_type, RecommendationTypeEnum):
+            recommendation_type = recommendation_type.value
+        return (recommendation.resource_id, recommendation.resource_type,
+                recommendation_type)
 
     @staticmethod
     def save(recommendation: RecommendationHistory):
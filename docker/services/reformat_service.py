@@ -3,6 +3,7 @@ from commons.exception import ExecutorException
 from commons.log_helper import get_logger
 from models.algorithm import Algorithm
 from models.shape import Shape
+from services.metric_frame import MetricFrame
 from services.metrics_service import MetricsService
 from services.shape_service import ShapeService
 
@@ -15,12 +16,21 @@ class ReformatService:
         self.shape_service = shape_service
         self.metrics_service = metrics_service
 
-    def to_relative_values(self, metrics_file_path, algorithm: Algorithm):
+    def to_relative_values(self, metrics_file_path, algorithm: Algorithm,
+                           metric_frame: MetricFrame = None):
+        """
+        Converts absolute network and iops values to the percentage of the
+        instance shape limits. If metric frame is given, it's converted in
+        place and returned, otherwise the metric file is rewritten.
+        """
         _LOG.debug(f'Reformatting metrics file \'{metrics_file_path}\'')
-        df = self.metrics_service.read_metrics(
-            metric_file_path=metrics_file_path,
-            algorithm=algorithm,
-            parse_index=False)
+        if metric_frame is not None:
+            df = metric_frame.df
+        else:
+            df = self.metrics_service.read_metrics(
+                metric_file_path=metrics_file_path,
+                algorithm=algorithm,
+                parse_index=False)
 
         native_shape_name = df['instance_type'][0]
         shape_data = self.shape_service.get(name=native_shape_name)
@@ -44,7 +54,10 @@ class ReformatService:
             func=self.convert_iops,
             args=(shape_data,)
         )
-        df.to_csv(metrics_file_path, index=False)
+        if metric_frame is not None:
+            return metric_frame
+        self.metrics_service.write_metric_file(
+            df=df, metric_file_path=metrics_file_path, algorithm=algorithm)
         return metrics_file_path
 
     @staticmethod
@@ -0,0 +1,59 @@
+import os
+import threading
+from typing import BinaryIO, Dict
+
+import msgspec
+
+from commons.log_helper import get_logger
+
+_LOG = get_logger('r8s-report-writer')
+
+REPORT_BUFFER_SIZE = 1024 * 1024
+
+
+class ReportWriter:
+    """
+    Writes report items as json lines into per-region report files.
+    Items are encoded with a shared msgspec encoder. A buffered binary
+    handle of each report file is kept open until the writer is closed,
+    so reports of a tenant are written without reopening the files for
+    each item. Files are opened in append mode, reports written after
+    the writer is closed are added to the existing ones.
+    """
+
+    def __init__(self, buffer_size: int = REPORT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self.__handles: Dict[str, BinaryIO] = {}
+        self.__lock = threading.Lock()
+        self.__encoder = msgspec.json.Encoder()
+
+    def write(self, reports_dir, customer, cloud, tenant, region, item):
+        line = self.__encoder.encode(item) + b'\n'
+        dir_path = os.path.join(reports_dir, customer, cloud, tenant)
+        file_path = os.path.join(dir_path, f'{region}.jsonl')
+        with self.__lock:
+            handle = self.__handles.get(file_path)
+            if not handle:
+                os.makedirs(dir_path, exist_ok=True)
+                handle = open(file_path, 'ab', buffering=self.buffer_size)
+                self.__handles[file_path] = handle
+            handle.write(line)
+
+    def close(self):
+        """
+        Flushes and closes all the open report files. All of them are
+        closed even if some of them fail, the first error is raised.
+        """
+        with self.__lock:
+            handles, self.__handles = self.__handles, {}
+        _LOG.debug(f'Closing {len(handles)} report files')
+        error = None
+        for file_path, handle in handles.items():
+            try:
+                handle.close()
+            except OSError as e:
+                _LOG.error(f'Failed to close report file '
+                           f'\'{file_path}\': {e}')
+                error = error or e
+        if error:
+            raise error
@@ -1,6 +1,9 @@
+from functools import lru_cache
 from math import inf
 from typing import List
 
+import numpy as np
+
 from commons.constants import JOB_STEP_GENERATE_REPORTS, ACTION_SPLIT, \
     CLOUD_ATTR, PROBABILITY
 from commons.exception import ExecutorException
@@ -14,6 +17,7 @@ from models.shape import Shape
 from services.customer_preferences_service import CustomerPreferencesService
 from services.resize.resize_trend import MIN_LIMIT_PERC, MAX_LIMIT_PERC
 from services.resize.shape_compatibility_filter import ShapeCompatibilityFilter
+from services.shape_catalog import ShapeCatalog
 from services.shape_price_service import ShapePriceService
 from services.shape_service import ShapeService
 
@@ -31,6 +35,7 @@ class ResizeService:
 
         self.shape_service = shape_service
         self.shape_price_service = shape_price_service
+        self.shape_compatibility_filter = ShapeCompatibilityFilter()
 
     def recommend_size(self, trend, instance_type, resize_action,
                        cloud, algorithm, instance_meta=None,
@@ -80,10 +85,11 @@ class ResizeService:
         _LOG.debug(f'Searching for available shapes for cloud: '
                    f'{current_shape.cloud.value}, '
                    f'for resource type {algorithm.resource_type}')
-        all_shapes = self.shape_service.list(
+        catalog = self.shape_service.get_catalog(
             cloud=current_shape.cloud.value,
             resource_type=algorithm.resource_type
         )
+        all_shapes = catalog.shapes
         _LOG.debug(f'{len(all_shapes)} shapes available '
                    f'for cloud {current_shape.cloud.value}, '
                    f'resource type {algorithm.resource_type}')
@@ -92,9 +98,8 @@ class ResizeService:
             _LOG.debug(f'Applying parent meta: '
                        f'{parent_meta.as_dict()}')
             all_shapes = self.customer_preferences_service. \
-                get_allowed_instance_types(
-                cloud=current_shape.cloud.value,
-                instances_data=all_shapes,
+                get_allowed_catalog_shapes(
+                catalog=catalog,
                 parent_meta=parent_meta
             )
             _LOG.debug(f'Shapes available after shape '
@@ -102,11 +107,13 @@ class ResizeService:
 
         _LOG.debug(f'Applying algorithm shape compatibility rule: '
                    f'{shape_compatibility_rule}')
-        all_shapes = ShapeCompatibilityFilter().apply_compatibility_filter(
-            current_shape=current_shape,
-            shapes=all_shapes,
-            compatibility_rule=shape_compatibility_rule
-        )
+        all_shapes = self.shape_compatibility_filter. \
+            apply_compatibility_filter(
+                current_shape=current_shape,
+                shapes=all_shapes,
+                compatibility_rule=shape_compatibility_rule,
+                catalog=catalog
+            )
         _LOG.debug(f'Shapes available after algorithm compatibility rule: '
                    f'{len(all_shapes)}')
 
@@ -129,7 +136,8 @@ class ResizeService:
             resize_action=resize_action,
             parent_meta=parent_meta,
             forbid_change_series=forbid_change_series,
-            forbid_change_family=forbid_change_family
+            forbid_change_family=forbid_change_family,
+            catalog=catalog
         )
 
         suitable_shapes = self.find_suitable_shapes(
@@ -139,7 +147,8 @@ class ResizeService:
             memory_max=memory_max,
             net_output_min=net_output_min,
             disk_iops_min=disk_iops_min,
-            prioritized_shapes=prioritized_shapes
+            prioritized_shapes=prioritized_shapes,
+            catalog=catalog
         )
         suitable_shapes = self._remove_shape_duplicates(
             shapes=suitable_shapes)
@@ -250,14 +259,14 @@ class ResizeService:
 
     def add_price(self, instances: list, customer, region,
                   price_type='on_demand', os=None):
+        price_table = self.shape_price_service.get_price_table(
+            customer=customer,
+            region=region,
+            os=os
+        )
         for instance in instances:
             shape_name = instance.get('name')
-            shape_price = self.shape_price_service.get(
-                customer=customer,
-                name=shape_name,
-                region=region,
-                os=os
-            )
+            shape_price = price_table.get(shape_name)
             if not shape_price:
                 _LOG.warning(f'Missing price for shape \'{shape_name}\' '
                              f'in region \'{region}\'')
@@ -379,41 +388,36 @@ class ResizeService:
     def find_suitable_shapes(cpu_min, cpu_max, memory_min, memory_max,
                              net_output_min,
                              disk_iops_min,
-                             prioritized_shapes):
+                             prioritized_shapes,
+                             catalog: ShapeCatalog):
         suitable_shapes = []
 
         for shapes in prioritized_shapes:
-            for shape in shapes:
-                shape_cpu = getattr(shape, 'cpu', -1)
-                shape_memory = getattr(shape, 'memory', -1)
-
-                cpu_suits = True
-                memory_suits = True
-                net_output_suits = True
-                iops_suits = True
-
-                if cpu_min and cpu_max:
-                    cpu_suits = cpu_min <= shape_cpu <= cpu_max
-                if memory_min and memory_max:
-                    memory_suits = memory_min <= shape_memory <= memory_max
-
-                if net_output_min:
-                    shape_net_output = shape.network_throughput
-                    net_output_suits = shape_net_output \
-                                       and net_output_min <= shape_net_output
-                if disk_iops_min:
-                    shape_iops = shape.iops
-                    iops_suits = shape_iops and disk_iops_min <= shape_iops
-
-                if cpu_suits and memory_suits and iops_suits \
-                        and net_output_suits:
-                    suitable_shapes.append(shape)
+            if not shapes:
+                continue
+            shapes_catalog = ShapeCatalog.for_shapes(shapes=shapes,
+                                                     catalog=catalog)
+            is_suitable = shapes_catalog.get_suitable_mask(
+                positions=shapes_catalog.get_positions(shapes=shapes),
+                cpu_min=cpu_min,
+                cpu_max=cpu_max,
+                memory_min=memory_min,
+                memory_max=memory_max,
+                net_output_min=net_output_min,
+                disk_iops_min=disk_iops_min
+            )
+            suitable_shapes.extend(shape for shape, suits
+                                   in zip(shapes, is_suitable) if suits)
         return [shape.get_dto() for shape in suitable_shapes]
 
     def divide_by_priority(self, sizes, cloud, current_shape: Shape, resize_action,
                            parent_meta: LicensesParentMeta = None,
                            forbid_change_series=True,
-                           forbid_change_family=True):
+                           forbid_change_family=True,
+                           catalog: ShapeCatalog = None):
+        sizes = list(sizes)
+        catalog = ShapeCatalog.for_shapes(shapes=sizes, catalog=catalog)
+        positions = catalog.get_positions(shapes=sizes)
         current_size_name = current_shape.name
         current_series_prefix = self._get_series_prefix(
             shape_name=current_size_name, cloud=cloud)
@@ -431,38 +435,41 @@ class ResizeService:
                         instances_data=sizes,
                         shape_rules=shape_rules
                     )
-        if resize_action == ACTION_SPLIT:  # if its split action,
+        is_same_series = catalog.get_prefix_mask(
+            positions=positions, prefix=current_series_prefix)
+        if resize_action != ACTION_SPLIT:  # if its split action,
             # allow to use same shape
-            same_series = self._get_same_series(
-                sizes=sizes,
-                series_prefix=current_series_prefix)
-        else:
-            same_series = self._get_same_series(
-                sizes=sizes,
-                series_prefix=current_series_prefix,
-                exclude_shape_names=(current_size_name,))
-
-        same_series_shape_names = [i['name'] for i in same_series]
+            is_same_series &= positions != catalog.positions.get(
+                current_size_name, -1)
+        same_series = self._select_shapes(
+            shapes=sizes, positions=positions, mask=is_same_series,
+            catalog=catalog)
 
-        same_family = []
+        is_same_family = np.zeros(len(sizes), dtype=bool)
         if not forbid_change_series:
-            same_family = self._get_same_family(
-                sizes=sizes,
-                cloud=cloud,
-                current_shape=current_shape,
-                exclude_shapes=same_series_shape_names
-            )
-        same_family_shape_names = [i['name'] for i in same_family]
+            if cloud == CloudEnum.CLOUD_AZURE.value:
+                is_same_family = catalog.get_prefix_mask(
+                    positions=positions,
+                    prefix=current_size_name.split('_')[0])
+            else:
+                is_same_family = catalog.get_family_mask(
+                    positions=positions,
+                    family_type=current_shape.family_type)
+            is_same_family &= ~is_same_series
+        same_family = self._select_shapes(
+            shapes=sizes, positions=positions, mask=is_same_family,
+            catalog=catalog)
 
         other_shapes = []
         if not forbid_change_series and not forbid_change_family:
-            other_shapes = self._get_other_shapes(
-                sizes=sizes,
-                exclude_shapes=same_series_shape_names + same_family_shape_names)
+            other_shapes = self._select_shapes(
+                shapes=sizes, positions=positions,
+                mask=~(is_same_series | is_same_family), catalog=catalog)
 
         return prioritised, same_series, same_family, other_shapes
 
     @staticmethod
+    @lru_cache(maxsize=256)
     def _get_series_prefix(shape_name, cloud):
         if cloud == CloudEnum.CLOUD_AWS.value:
             return shape_name.split('.')[0] + '.'
@@ -476,35 +483,16 @@ class ResizeService:
         if cloud == CloudEnum.CLOUD_GOOGLE.value:
             return shape_name.split('-')[0]
 
-    def _get_same_series(self, sizes, series_prefix,
-                         exclude_shape_names=()):
-        shapes = [shape for shape in sizes
-                  if shape.name.startswith(series_prefix)
-                  and shape.name not in exclude_shape_names]
-        return self._sort_shapes(shapes=shapes)
-
-    def _get_same_family(self, sizes: List[Shape], current_shape, cloud,
-                         exclude_shapes: List[Shape]):
-        if cloud == CloudEnum.CLOUD_AZURE.value:
-            family_prefix = current_shape.name.split('_')[0]
-            same_family = [shape for shape in sizes
-                           if shape.name.startswith(family_prefix) and
-                           shape.name not in exclude_shapes]
-        else:
-            same_family = [shape for shape in sizes
-                           if shape.family_type == current_shape.family_type and
-                           shape.name not in exclude_shapes]
-        return self._sort_shapes(shapes=same_family)
-
-    def _get_other_shapes(self, sizes: List[Shape],
-                          exclude_shapes: List[Shape]):
-        shapes = [shape for shape in sizes if shape.name
-                  not in exclude_shapes]
-        return self._sort_shapes(shapes=shapes)
-
     @staticmethod
-    def _sort_shapes(shapes: List[Shape]):
-        return sorted(shapes, key=lambda x: (x.cpu, x.memory))
+    def _select_shapes(shapes: List[Shape], positions: np.ndarray,
+                       mask: np.ndarray, catalog: ShapeCatalog) -> List[Shape]:
+        """
+        Shapes matching the mask, sorted by (cpu, memory)
+        """
+        indexes = np.flatnonzero(mask)
+        return catalog.sort_by_size(
+            shapes=[shapes[index] for index in indexes],
+            positions=positions[indexes])
 
     @staticmethod
     def _get_recommended_shapes(recommendation: RecommendationHistory,
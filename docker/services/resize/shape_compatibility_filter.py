@@ -1,10 +1,24 @@
 from typing import List
 
+import numpy as np
+
 from models.algorithm import ShapeCompatibilityRule
 from models.shape import Shape
+from services.shape_catalog import ShapeCatalog
+
+MANUFACTURER_CODES_KEY = 'manufacturer'
+ARCHITECTURE_CODES_KEY = 'architecture'
 
 
 class ShapeCompatibilityFilter:
+    """
+    Keeps shapes with processor manufacturer and architecture
+    compatible with the current shape. Manufacturer and architecture of
+    catalog shapes are derived once per catalog as integer codes, rules
+    are applied as code comparisons. The filter is reusable across
+    instances.
+    """
+
     def __init__(self):
         self.rule_handler_mapping = {
             ShapeCompatibilityRule.RULE_ONLY_COMPATIBLE: self.__rule_compatible,
@@ -15,13 +29,31 @@ class ShapeCompatibilityFilter:
 
     def apply_compatibility_filter(self, current_shape: Shape,
                                    shapes: List[Shape],
-                                   compatibility_rule: ShapeCompatibilityRule):
+                                   compatibility_rule: ShapeCompatibilityRule,
+                                   catalog: ShapeCatalog = None):
         handler = self.rule_handler_mapping.get(compatibility_rule)
         if not handler:
             return shapes
-        return handler(current_shape=current_shape, shapes=shapes)
+        shapes = list(shapes)
+        catalog = ShapeCatalog.for_shapes(shapes=shapes, catalog=catalog)
+        positions = catalog.get_positions(shapes=shapes)
+        manufacturer_codes, manufacturers = catalog.get_attribute_codes(
+            attribute=MANUFACTURER_CODES_KEY,
+            derive=self._get_shape_manufacturer)
+        architecture_codes, architectures = catalog.get_attribute_codes(
+            attribute=ARCHITECTURE_CODES_KEY,
+            derive=self._get_shape_architecture)
+        is_compatible = handler(
+            current_shape=current_shape,
+            manufacturer_codes=manufacturer_codes[positions],
+            manufacturers=manufacturers,
+            architecture_codes=architecture_codes[positions],
+            architectures=architectures)
+        return [shapes[index] for index in np.flatnonzero(is_compatible)]
 
-    def __rule_same(self, current_shape: Shape, shapes: List[Shape]):
+    def __rule_same(self, current_shape: Shape,
+                    manufacturer_codes: np.ndarray, manufacturers: dict,
+                    architecture_codes: np.ndarray, architectures: dict):
         filter_manufacturer = self._get_shape_manufacturer(
             shape=current_shape
         )
@@ -29,19 +61,18 @@ class ShapeCompatibilityFilter:
             shape=current_shape
         )
 
-        filtered_shapes = []
+        is_compatible = np.ones(len(manufacturer_codes), dtype=bool)
+        if filter_manufacturer:
+            is_compatible &= manufacturer_codes == self._get_code(
+                mapping=manufacturers, value=filter_manufacturer)
+        if filter_architecture:
+            is_compatible &= architecture_codes == self._get_code(
+                mapping=architectures, value=filter_architecture)
+        return is_compatible
 
-        for shape in shapes:
-            if filter_manufacturer and \
-                    self._get_shape_manufacturer(shape) != filter_manufacturer:
-                continue
-            if filter_architecture and \
-                    self._get_shape_architecture(shape) != filter_architecture:
-                continue
-            filtered_shapes.append(shape)
-        return filtered_shapes
-
-    def __rule_compatible(self, current_shape: Shape, shapes: List[Shape]):
+    def __rule_compatible(self, current_shape: Shape,
+                          manufacturer_codes: np.ndarray, manufacturers: dict,
+                          architecture_codes: np.ndarray, architectures: dict):
         manufacturer = self._get_shape_manufacturer(
             shape=current_shape
         )
@@ -52,18 +83,20 @@ class ShapeCompatibilityFilter:
             shape=current_shape
         )
 
-        filtered_shapes = []
+        is_compatible = np.ones(len(manufacturer_codes), dtype=bool)
+        if compatible_manufacturers:
+            is_compatible &= np.isin(manufacturer_codes, [
+                self._get_code(mapping=manufacturers, value=value)
+                for value in compatible_manufacturers])
+        if architecture:
+            is_compatible &= architecture_codes == self._get_code(
+                mapping=architectures, value=architecture)
+        return is_compatible
 
-        for shape in shapes:
-            shape_manufacturer = self._get_shape_manufacturer(shape)
-            if compatible_manufacturers and shape_manufacturer \
-                    not in compatible_manufacturers:
-                continue
-            shape_arch = self._get_shape_architecture(shape)
-            if architecture and shape_arch != architecture:
-                continue
-            filtered_shapes.append(shape)
-        return filtered_shapes
+    @staticmethod
+    def _get_code(mapping: dict, value: str) -> int:
+        # values missing in the catalog match no shape
+        return mapping.get(value, -2)
 
     def _get_shape_manufacturer(self, shape: Shape):
         processor = shape.physical_processor
@@ -88,4 +121,3 @@ class ShapeCompatibilityFilter:
         if manufacturer == 'AWS':
             return ['AWS']
         return ['Intel', 'AMD']
-
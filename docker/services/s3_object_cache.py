@@ -0,0 +1,162 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Callable, BinaryIO
+
+from commons.log_helper import get_logger
+
+_LOG = get_logger('r8s-s3-object-cache')
+
+DATA_EXTENSION = '.data'
+ETAG_EXTENSION = '.etag'
+TMP_EXTENSION = '.tmp'
+
+
+class S3ObjectCache:
+    """
+    On-disk cache of S3 object contents kept between jobs. Entries are
+    keyed by bucket and key and store the ETag of the cached content,
+    so the content is reused only while the object is unchanged.
+
+    The cache is bounded by the total size of cached contents, least
+    recently used entries are evicted first. The order of use is kept
+    in memory, modification time of an entry is its last use and
+    restores the order when the cache is reopened.
+
+    The cache directory must have a single owning process: sizes and the
+    order of use are kept per instance, so evictions are not seen by
+    other processes, and leftover temporary files are removed when the
+    cache is opened. Threads of the owning process may share an instance.
+    """
+
+    def __init__(self, cache_dir: str, max_size_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_size_bytes = max_size_bytes
+        self.__lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for file_name in os.listdir(cache_dir):
+            entry, extension = os.path.splitext(file_name)
+            path = os.path.join(cache_dir, file_name)
+            if extension == TMP_EXTENSION:
+                os.remove(path)
+            elif extension == DATA_EXTENSION:
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, entry, stat.st_size))
+        # entry sizes in the order of their use, least recent first
+        self.__sizes = OrderedDict(
+            (entry, size) for _, entry, size in sorted(entries))
+        self.size_bytes = sum(self.__sizes.values())
+
+    @staticmethod
+    def get_entry(bucket_name: str, key: str) -> str:
+        return hashlib.sha256(f'{bucket_name}/{key}'.encode()).hexdigest()
+
+    def get_etag(self, bucket_name: str, key: str) -> Optional[str]:
+        """
+        ETag of the cached content of the object, None if the object
+        is not cached
+        """
+        entry = self.get_entry(bucket_name=bucket_name, key=key)
+        if entry not in self.__sizes:
+            return
+        try:
+            with open(self._get_path(entry, ETAG_EXTENSION), 'r') as f:
+                return f.read()
+        except OSError:
+            return
+
+    def read(self, bucket_name: str, key: str) -> Optional[bytes]:
+        entry = self.get_entry(bucket_name=bucket_name, key=key)
+        try:
+            with open(self._get_path(entry, DATA_EXTENSION), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return
+        self._touch(entry)
+        return content
+
+    def copy_to(self, bucket_name: str, key: str, file_path: str) -> bool:
+        """
+        Copies cached content of the object to the file in chunks,
+        returns False if the object is not cached
+        """
+        entry = self.get_entry(bucket_name=bucket_name, key=key)
+        try:
+            shutil.copyfile(self._get_path(entry, DATA_EXTENSION), file_path)
+        except OSError:
+            return False
+        self._touch(entry)
+        return True
+
+    def put(self, bucket_name: str, key: str, etag: str, content: bytes):
+        self._put(bucket_name=bucket_name, key=key, etag=etag,
+                  size=len(content), write=lambda f: f.write(content))
+
+    def put_file(self, bucket_name: str, key: str, etag: str,
+                 file_path: str):
+        """
+        Caches content of the downloaded file, copied in chunks
+        """
+        def write(f):
+            with open(file_path, 'rb') as source:
+                shutil.copyfileobj(source, f)
+
+        self._put(bucket_name=bucket_name, key=key, etag=etag,
+                  size=os.path.getsize(file_path), write=write)
+
+    def _put(self, bucket_name: str, key: str, etag: str, size: int,
+             write: Callable[[BinaryIO], None]):
+        if not etag or size > self.max_size_bytes:
+            return
+        entry = self.get_entry(bucket_name=bucket_name, key=key)
+        for extension, write_value in (
+                (DATA_EXTENSION, write),
+                (ETAG_EXTENSION, lambda f: f.write(etag.encode()))):
+            path = self._get_path(entry, extension)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.cache_dir, prefix=f'{entry}{extension}.',
+                suffix=TMP_EXTENSION)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    write_value(f)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        with self.__lock:
+            self.size_bytes += size - self.__sizes.get(entry, 0)
+            self.__sizes[entry] = size
+            self.__sizes.move_to_end(entry)
+            if self.size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _touch(self, entry: str):
+        try:
+            os.utime(self._get_path(entry, DATA_EXTENSION))
+        except OSError:
+            return
+        with self.__lock:
+            if entry in self.__sizes:
+                self.__sizes.move_to_end(entry)
+
+    def _evict(self):
+        """
+        Removes least recently used entries until the cache fits
+        into its size limit
+        """
+        while self.__sizes and self.size_bytes > self.max_size_bytes:
+            entry, size = self.__sizes.popitem(last=False)
+            for extension in (DATA_EXTENSION, ETAG_EXTENSION):
+                try:
+                    os.remove(self._get_path(entry, extension))
+                except OSError:
+                    pass
+            self.size_bytes -= size
+        _LOG.debug(f'S3 object cache evicted to {self.size_bytes} bytes')
+
+    def _get_path(self, entry: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, f'{entry}{extension}')
@@ -1,26 +1,46 @@
-import statistics
-from dataclasses import dataclass, field
-from datetime import datetime
 from typing import Union, List
 
+import numpy as np
+
 from commons.constants import WEEK_DAYS
 from services.schedule.schedule_item import ScheduleItem
 
-
-@dataclass
-class FrequencyMapItem:
-    action: str
-    probabilities: list = field(default_factory=list)
-    count: int = 0
+MINUTES_IN_DAY = 24 * 60
 
 
 class FrequencyMap:
+    """
+    Per-weekday frequency of an action at each time point of a day:
+    a (weekdays x time points) array of action counts and a parallel
+    array with the sum of action probabilities.
+    """
+
     def __init__(self, action, time_points, step_minutes):
+        self.action = action
+        self.time_points = time_points
+        self.step_minutes = step_minutes
+        self.counts = np.zeros((len(WEEK_DAYS), len(time_points)),
+                               dtype=np.int64)
+        self.probabilities = np.zeros((len(WEEK_DAYS), len(time_points)))
         self.__frequency_map = {}
-        for week_day in WEEK_DAYS:
+        for index, week_day in enumerate(WEEK_DAYS):
             self.__frequency_map[week_day] = FrequencyMapDay(
                 action=action, time_points=time_points, weekday=week_day,
-                step_minutes=step_minutes)
+                step_minutes=step_minutes, counts=self.counts[index],
+                probabilities=self.probabilities[index])
+
+    def add_period(self, weekday: str, start_index: int, end_index: int,
+                   probability: float):
+        """
+        Counts the action at time points from start to end index
+        (inclusive) of the weekday
+        """
+        if weekday not in self.__frequency_map:
+            return
+        week_day_index = WEEK_DAYS.index(weekday)
+        self.counts[week_day_index, start_index:end_index + 1] += 1
+        self.probabilities[week_day_index,
+                           start_index:end_index + 1] += probability
 
     def __getitem__(self, item):
         return self.__frequency_map.get(item)
@@ -28,100 +48,83 @@ class FrequencyMap:
 
 class FrequencyMapDay:
     def __init__(self, action: str, time_points: list,
-                 weekday: Union[List, str], step_minutes: int):
-        self.__frequency_map = {}
+                 weekday: Union[List, str], step_minutes: int,
+                 counts: np.ndarray = None,
+                 probabilities: np.ndarray = None):
+        self.action = action
         self.time_points = time_points
         self.step_minutes = step_minutes
+        if counts is None:
+            counts = np.zeros(len(time_points), dtype=np.int64)
+        if probabilities is None:
+            probabilities = np.zeros(len(time_points))
+        self.counts = counts
+        self.probabilities = probabilities
 
         if not isinstance(weekday, list):
             weekday = [weekday]
         self.weekday = weekday
 
-        for point in time_points:
-            self.__frequency_map[point] = FrequencyMapItem(action=action)
-
     def get_day_schedule(self, processed_days, minimum_duration_minutes=30):
-        action_period = self.__get_action_period(
-            processed_days=processed_days)
+        is_action = self.__get_action_period(processed_days=processed_days)
         periods = self.__to_day_schedule(
-            action_period=action_period)
-        periods = [period for period in periods
-                   if period.duration_minutes >= minimum_duration_minutes]
-        self.__add_probability(periods=periods)
-        return periods
-
-    def __add_probability(self, periods: List[ScheduleItem]):
-        for day_schedule in periods:
-            start = day_schedule.start
-            stop = day_schedule.stop
-
-            start_index = self.time_points.index(start)
-            stop_index = self.time_points.index(stop)
-
-            schedule_item_time_points = self.time_points[
-                                        start_index:stop_index + 1]
-            period_probability = self.__get_period_probability(
-                schedule_time_points=schedule_item_time_points
-            )
-            day_schedule.probability = period_probability
-        return periods
-
-    def __get_action_period(self, processed_days):
-        action_values = self.__get_action_values()
-        threshold_percent = statistics.quantiles(action_values, n=4)[1]
-
-        shutdown_period = [key for key in self.__frequency_map if
-                           self.__frequency_map[
-                               key].count >= threshold_percent and
-                           self.__frequency_map[
-                               key].count >= 0.75 * processed_days / 7]
-
-        action_period = [point for point in self.time_points if point
-                         not in shutdown_period]
-        return action_period
-
-    def __to_day_schedule(self, action_period):
-        periods = []
-        period = None
-        prev_dt = None
-        for index, time_point in enumerate(action_period):
-            dt = datetime.strptime(time_point, '%H:%M')
-            if not period:
-                period = ScheduleItem(start=time_point,
-                                      weekdays=self.weekday)
-            elif period and (dt - prev_dt).seconds == self.step_minutes * 60:
-                period.stop = time_point
-            else:
-                if period.is_filled:
-                    periods.append(period)
-                period = ScheduleItem(start=time_point,
-                                      weekdays=self.weekday)
-            prev_dt = dt
-
-        if period and period.is_filled:
-            if period.stop == self.time_points[-1]:
-                period.stop = '00:00'
-            periods.append(period)
-
-        return periods
-
-    def __get_action_values(self):
-        items = list(self.__frequency_map.values())
-        return [item.count for item in items]
-
-    def __get_period_probability(self, schedule_time_points: List[str]):
-        probability_list = []
-        shutdown_period_time_points = [point for point in self.time_points
-                                       if point not in schedule_time_points]
-        for time_point in shutdown_period_time_points:
-            frequency_map_item = self.__frequency_map.get(time_point)
-            if not frequency_map_item:
-                continue
-            probability_list.extend(frequency_map_item.probabilities)
-
-        if not probability_list:
+            is_action=is_action,
+            minimum_duration_minutes=minimum_duration_minutes)
+        return [self.__to_schedule_item(start_index, stop_index)
+                for start_index, stop_index in periods]
+
+    def __get_action_period(self, processed_days) -> np.ndarray:
+        """
+        Mask of time points the action is not taken at: the ones which
+        are not frequent enough
+        """
+        threshold_percent = np.median(self.counts)
+        is_shutdown = (self.counts >= threshold_percent) & \
+                      (self.counts >= 0.75 * processed_days / 7)
+        return ~is_shutdown
+
+    def __to_day_schedule(self, is_action: np.ndarray,
+                          minimum_duration_minutes: int):
+        """
+        Runs of consecutive action time points as (start, stop) indexes,
+        stop index of a run which lasts till the end of the day is 0
+        (00:00). Runs of a single time point or shorter than the minimum
+        duration are skipped.
+        """
+        bounds = np.diff(np.concatenate(([0], is_action.view(np.int8),
+                                         [0])))
+        starts = np.flatnonzero(bounds == 1)
+        stops = np.flatnonzero(bounds == -1) - 1
+
+        durations = (stops - starts) * self.step_minutes
+        last_index = len(self.time_points) - 1
+        is_day_end = stops == last_index
+        durations[is_day_end] = MINUTES_IN_DAY - \
+            starts[is_day_end] * self.step_minutes
+        durations *= len(self.weekday)
+
+        is_kept = (stops > starts) & (durations >= minimum_duration_minutes)
+        stops = np.where(is_day_end, 0, stops)
+        return list(zip(starts[is_kept].tolist(), stops[is_kept].tolist()))
+
+    def __to_schedule_item(self, start_index: int, stop_index: int):
+        return ScheduleItem(
+            start=self.time_points[start_index],
+            stop=self.time_points[stop_index],
+            weekdays=self.weekday,
+            probability=self.__get_period_probability(
+                start_index=start_index, stop_index=stop_index)
+        )
+
+    def __get_period_probability(self, start_index: int, stop_index: int):
+        """
+        Average probability of the action at the time points outside of
+        the schedule period
+        """
+        is_outside = np.ones(len(self.time_points), dtype=bool)
+        is_outside[start_index:stop_index + 1] = False
+        count = int(self.counts[is_outside].sum())
+        if not count:
             return 0
-        return round(sum(probability_list) / len(probability_list), 2)
-
-    def __getitem__(self, item):
-        return self.__frequency_map.get(item)
+        probability = float(self.probabilities[is_outside].sum())
+        return round(probability / count, 2)
@@ -38,21 +38,28 @@ class ScheduleItem:
         return dt
 
     @property
-    def is_filled(self):
-        return self.start and self.stop
+    def start_minutes(self) -> int:
+        return self.to_minutes(self.start)
 
-    def is_similar(self, other, max_diff_second):
-        if not isinstance(other, ScheduleItem):
-            return False
+    @property
+    def stop_minutes(self) -> int:
+        return self.to_minutes(self.stop)
 
-        delta_start = self.start_datetime - other.start_datetime
-        delta_start = abs(delta_start.total_seconds())
+    @staticmethod
+    def to_minutes(time_point: str) -> int:
+        """
+        Minute offset of the 'HH:MM' time point from the start of the day
+        """
+        hours, minutes = time_point.split(':')
+        return int(hours) * 60 + int(minutes)
 
-        delta_stop = self.stop_datetime - other.stop_datetime
-        delta_stop = abs(delta_stop.total_seconds())
+    @staticmethod
+    def from_minutes(minutes: int) -> str:
+        return f'{minutes // 60:02d}:{minutes % 60:02d}'
 
-        return delta_start <= max_diff_second and \
-            delta_stop <= max_diff_second
+    @property
+    def is_filled(self):
+        return self.start and self.stop
 
     def as_dict(self):
         item = {
@@ -68,18 +75,7 @@ class ScheduleItem:
 
     @staticmethod
     def get_common_start_stop(day_schedules):
-        min_start_dt = None
-        max_stop_dt = None
-
-        for day_schedule in day_schedules:
-            start_dt = day_schedule.start_datetime
-            stop_dt = day_schedule.stop_datetime
-
-            if not min_start_dt or start_dt < min_start_dt:
-                min_start_dt = start_dt
-
-            if not max_stop_dt or stop_dt > max_stop_dt:
-                max_stop_dt = stop_dt
-        min_start = min_start_dt.strftime('%H:%M')
-        max_stop = max_stop_dt.strftime('%H:%M')
-        return min_start, max_stop
+        min_start = min(item.start_minutes for item in day_schedules)
+        max_stop = max(item.stop_minutes for item in day_schedules)
+        return (ScheduleItem.from_minutes(min_start),
+                ScheduleItem.from_minutes(max_stop))
@@ -1,3 +1,4 @@
+from bisect import bisect_left, bisect_right
 import statistics
 from datetime import datetime, timedelta
 from typing import List
@@ -122,23 +123,20 @@ class ScheduleService:
                                      time_points=day_time_points,
                                      step_minutes=record_step_minutes)
 
+        time_point_indexes = {time_point: index for index, time_point
+                              in enumerate(day_time_points)}
         for period in active_schedule_periods:
             if not period.action:
                 continue
-            start_index = day_time_points.index(period.time_from)
-            end_index = day_time_points.index(period.time_to)
+            start_index = time_point_indexes[period.time_from]
+            end_index = time_point_indexes[period.time_to]
             if end_index == 0:
                 end_index = len(day_time_points) - 1
 
-            period_time_points = day_time_points[start_index: end_index + 1]
-            weekday = period.weekday
-
-            for period_time_point in period_time_points:
-                frequency_map_item = frequency_map[weekday][period_time_point]
-                if not frequency_map_item:
-                    continue
-                frequency_map_item.count += 1
-                frequency_map_item.probabilities.append(period.probability)
+            frequency_map.add_period(weekday=period.weekday,
+                                     start_index=start_index,
+                                     end_index=end_index,
+                                     probability=period.probability)
 
         return frequency_map
 
@@ -181,39 +179,44 @@ class ScheduleService:
 
     @staticmethod
     def _group_by_days(day_schedules: List[ScheduleItem]) -> List[ScheduleItem]:
-        day_schedules = sorted(day_schedules, key=lambda d: d.start)
+        """
+        Groups day schedules which start and stop within
+        MAX_GROUPING_DIFFERENCE_SECONDS of each other. Schedules are
+        swept in the order of their start, similar ones are looked up
+        in the window of close starts only.
+        """
+        day_schedules = sorted(day_schedules, key=lambda d: d.start_minutes)
+        starts = [item.start_minutes for item in day_schedules]
+        stops = [item.stop_minutes for item in day_schedules]
+        max_diff_minutes = MAX_GROUPING_DIFFERENCE_SECONDS / 60
 
         grouped = []
-        processed_periods = []
-        processed = []
-        for day_schedule in day_schedules:
-            if day_schedule in processed:
-                continue
-            period_key = (day_schedule.start, day_schedule.stop)
-            if period_key in processed_periods:
+        processed = set()
+        for index, day_schedule in enumerate(day_schedules):
+            if index in processed:
                 continue
-            same = [i for i in day_schedules if day_schedule.is_similar(
-                other=i, max_diff_second=MAX_GROUPING_DIFFERENCE_SECONDS)]
-            grouped_weekdays = []
+            window_start = bisect_left(starts,
+                                       starts[index] - max_diff_minutes)
+            window_end = bisect_right(starts, starts[index] + max_diff_minutes)
+            same = [other for other in range(window_start, window_end)
+                    if abs(stops[other] - stops[index]) <= max_diff_minutes]
+
+            same_schedules = [day_schedules[other] for other in same]
+            grouped_weekdays = set()
             grouped_prob = []
-            for i in same:
-                grouped_weekdays.extend(i.weekdays)
-                grouped_prob.append(i.probability)
-            start, stop = ScheduleItem.get_common_start_stop(
-                day_schedules=same)
-
-            grouped_weekdays = list(set(grouped_weekdays))
-            grouped_weekdays.sort(key=lambda k: WEEK_DAYS.index(k))
+            for other in same_schedules:
+                grouped_weekdays.update(other.weekdays)
+                grouped_prob.append(other.probability)
+            start, stop = ScheduleItem.get_common_start_stop(same_schedules)
 
             schedule_item = ScheduleItem(
                 start=start,
                 stop=stop,
-                weekdays=grouped_weekdays,
+                weekdays=[day for day in WEEK_DAYS if day in grouped_weekdays],
                 probability=round(sum(grouped_prob) / len(grouped_prob), 2)
             )
-            processed.extend(same)
+            processed.update(same)
             grouped.append(schedule_item)
-            processed_periods.append(period_key)
 
         return sorted(grouped, key=lambda x: x.duration_minutes, reverse=True)
 
@@ -2,6 +2,7 @@ import os
 
 from modular_sdk.services.customer_service import CustomerService
 from modular_sdk.services.tenant_service import TenantService
+from services.clustering_cache_service import ClusteringCacheService
 from services.clustering_service import ClusteringService
 from services.meta_service import MetaService
 from services.metrics_service import MetricsService
@@ -19,6 +20,7 @@ from services.algorithm_service import AlgorithmService
 from services.clients.s3 import S3Client
 from services.customer_preferences_service import CustomerPreferencesService
 from services.environment_service import EnvironmentService
+from services.job_journal_service import JobJournalService
 from services.job_service import JobService
 from services.recommendation_history_service import \
     RecommendationHistoryService
@@ -29,6 +31,7 @@ from services.setting_service import SettingsService
 from services.shape_price_service import ShapePriceService
 from services.shape_service import ShapeService
 from services.ssm_service import SSMService
+from services.s3_object_cache import S3ObjectCache
 from services.storage_service import StorageService
 
 SERVICE_MODE = os.getenv(ENV_SERVICE_MODE)
@@ -60,12 +63,14 @@ class ServiceProvider:
         __customer_preferences_service = None
         __mocked_data_service = None
         __clustering_service = None
+        __clustering_cache_service = None
         __saving_service = None
         __shape_service = None
         __shape_price_service = None
         __meta_service = None
         __recommendation_history_service = None
         __resource_group_service = None
+        __job_journal_service = None
 
         # modular services
         __customer_service = None
@@ -143,8 +148,17 @@ class ServiceProvider:
 
         def storage_service(self):
             if not self.__storage_service:
+                environment_service = self.environment_service()
+                object_cache = None
+                cache_dir = environment_service.s3_cache_dir()
+                if cache_dir:
+                    max_size_mb = environment_service.s3_cache_max_size_mb()
+                    object_cache = S3ObjectCache(
+                        cache_dir=cache_dir,
+                        max_size_bytes=max_size_mb * 1024 * 1024)
                 self.__storage_service = StorageService(
-                    s3_client=self.s3()
+                    s3_client=self.s3(),
+                    object_cache=object_cache
                 )
             return self.__storage_service
 
@@ -168,8 +182,13 @@ class ServiceProvider:
 
         def metrics_service(self):
             if not self.__metrics_service:
+                clustering_cache_service = None
+                if self.environment_service().clustering_cache_enabled():
+                    clustering_cache_service = \
+                        self.clustering_cache_service()
                 self.__metrics_service = MetricsService(
-                    clustering_service=self.clustering_service()
+                    clustering_service=self.clustering_service(),
+                    clustering_cache_service=clustering_cache_service
                 )
             return self.__metrics_service
 
@@ -262,9 +281,18 @@ class ServiceProvider:
 
         def clustering_service(self):
             if not self.__clustering_service:
-                self.__clustering_service = ClusteringService()
+                environment_service = self.environment_service()
+                self.__clustering_service = ClusteringService(
+                    engine=environment_service.clustering_engine(),
+                    seed=environment_service.clustering_seed()
+                )
             return self.__clustering_service
 
+        def clustering_cache_service(self):
+            if not self.__clustering_cache_service:
+                self.__clustering_cache_service = ClusteringCacheService()
+            return self.__clustering_cache_service
+
         def shape_service(self):
             if not self.__shape_service:
                 self.__shape_service = ShapeService()
@@ -285,7 +313,10 @@ class ServiceProvider:
         def recommendation_history_service(self):
             if not self.__recommendation_history_service:
                 self.__recommendation_history_service = \
-                    RecommendationHistoryService()
+                    RecommendationHistoryService(
+                        batch_size=self.environment_service().
+                        history_batch_size()
+                    )
             return self.__recommendation_history_service
 
         def resource_group_service(self):
@@ -295,6 +326,11 @@ class ServiceProvider:
                 )
             return self.__resource_group_service
 
+        def job_journal_service(self):
+            if not self.__job_journal_service:
+                self.__job_journal_service = JobJournalService()
+            return self.__job_journal_service
+
         def token_service(self):
             if not self.__token_service:
                 from services.token_service import TokenService
@@ -0,0 +1,159 @@
+from bisect import bisect_left
+from typing import List, Iterable, Callable, Optional, Tuple
+
+import numpy as np
+
+from models.shape import Shape
+
+
+class ShapeCatalog:
+    """
+    In-memory index of the shapes of a cloud and resource type, loaded
+    once and reused by every resize recommendation of the job.
+
+    Shapes are kept in their catalog order along with NumPy columns of
+    their cpu, memory, network throughput and iops (NaN for missing
+    values), so range queries over any subset of shapes are vectorized
+    masks. Name lookup table maps shapes to their positions.
+
+    Resize priority buckets are lookups as well: names are indexed in
+    sorted order, so shapes of a series prefix are a contiguous range
+    of name ranks, families are integer codes and shapes are ranked by
+    (cpu, memory) once for all bucket sorts.
+    """
+    COLUMNS = ('cpu', 'memory', 'network_throughput', 'iops')
+
+    def __init__(self, shapes: Iterable[Shape], cloud: str = None,
+                 resource_type: str = None):
+        self.cloud = cloud
+        self.resource_type = resource_type
+        self.shapes: List[Shape] = list(shapes)
+        self.positions = {shape.name: position
+                          for position, shape in enumerate(self.shapes)}
+
+        self.columns = {}
+        for column in self.COLUMNS:
+            values = [getattr(shape, column, None) for shape in self.shapes]
+            self.columns[column] = np.array(
+                [np.nan if value is None else value for value in values],
+                dtype=np.float64)
+
+        names = list(self.positions)
+        self.sorted_names = sorted(names)
+        self.name_ranks = np.empty(len(self.shapes), dtype=np.int64)
+        for rank, name in enumerate(self.sorted_names):
+            self.name_ranks[self.positions[name]] = rank
+
+        self.family_codes_mapping = {}
+        self.family_codes = np.array([
+            self.family_codes_mapping.setdefault(
+                shape.family_type, len(self.family_codes_mapping))
+            for shape in self.shapes
+        ], dtype=np.int64)
+
+        # dense rank: shapes with the same (cpu, memory) share the rank
+        _, size_ranks = np.unique(
+            np.column_stack((self.columns['cpu'], self.columns['memory'])),
+            axis=0, return_inverse=True)
+        self.size_ranks = size_ranks.reshape(-1)
+        self.__attribute_codes = {}
+
+    def __len__(self):
+        return len(self.shapes)
+
+    def __iter__(self):
+        return iter(self.shapes)
+
+    def __repr__(self):
+        return f'ShapeCatalog(shapes={len(self)})'
+
+    def get(self, name: str):
+        position = self.positions.get(name)
+        if position is None:
+            return
+        return self.shapes[position]
+
+    @classmethod
+    def for_shapes(cls, shapes: List[Shape],
+                   catalog: 'ShapeCatalog' = None) -> 'ShapeCatalog':
+        """
+        The given catalog if all the shapes are indexed by it, otherwise
+        a catalog of the shapes themselves
+        """
+        if catalog is not None and all(shape.name in catalog.positions
+                                       for shape in shapes):
+            return catalog
+        return cls(shapes=shapes)
+
+    def get_positions(self, shapes: Iterable[Shape]) -> np.ndarray:
+        return np.array([self.positions[shape.name] for shape in shapes],
+                        dtype=np.int64)
+
+    def get_prefix_mask(self, positions: np.ndarray,
+                        prefix: str) -> np.ndarray:
+        """
+        Mask of shapes at the given positions which names start with
+        the prefix
+        """
+        start = bisect_left(self.sorted_names, prefix)
+        stop = bisect_left(self.sorted_names, prefix + chr(0x10ffff))
+        ranks = self.name_ranks[positions]
+        return (ranks >= start) & (ranks < stop)
+
+    def get_family_mask(self, positions: np.ndarray,
+                        family_type: str) -> np.ndarray:
+        family_code = self.family_codes_mapping.get(family_type, -1)
+        return self.family_codes[positions] == family_code
+
+    def sort_by_size(self, shapes: List[Shape],
+                     positions: np.ndarray) -> List[Shape]:
+        """
+        Shapes sorted by (cpu, memory), shapes of the same size keep
+        their order
+        """
+        order = np.argsort(self.size_ranks[positions], kind='stable')
+        return [shapes[index] for index in order]
+
+    def get_attribute_codes(self, attribute: str,
+                            derive: Callable[[Shape], Optional[str]]) \
+            -> Tuple[np.ndarray, dict]:
+        """
+        Integer codes of a value derived from each shape and the mapping
+        of values to codes, derived once per catalog. Shapes without
+        the value get -1 code.
+        """
+        if attribute not in self.__attribute_codes:
+            mapping = {}
+            codes = np.full(len(self.shapes), -1, dtype=np.int64)
+            for position, shape in enumerate(self.shapes):
+                value = derive(shape)
+                if value is not None:
+                    codes[position] = mapping.setdefault(value, len(mapping))
+            self.__attribute_codes[attribute] = (codes, mapping)
+        return self.__attribute_codes[attribute]
+
+    def get_suitable_mask(self, positions: np.ndarray,
+                          cpu_min=None, cpu_max=None,
+                          memory_min=None, memory_max=None,
+                          net_output_min=None,
+                          disk_iops_min=None) -> np.ndarray:
+        """
+        Mask of shapes at the given positions which match the ranges.
+        Cpu and memory ranges are applied only if both of their bounds
+        are set, shapes without network throughput or iops do not match
+        the corresponding lower bound.
+        """
+        is_suitable = np.ones(len(positions), dtype=bool)
+        if cpu_min and cpu_max:
+            cpu = self.columns['cpu'][positions]
+            is_suitable &= (cpu >= cpu_min) & (cpu <= cpu_max)
+        if memory_min and memory_max:
+            memory = self.columns['memory'][positions]
+            is_suitable &= (memory >= memory_min) & (memory <= memory_max)
+        if net_output_min:
+            net_output = self.columns['network_throughput'][positions]
+            is_suitable &= (net_output != 0) & (net_output >= net_output_min)
+        if disk_iops_min:
+            iops = self.columns['iops'][positions]
+            is_suitable &= (iops != 0) & (iops >= disk_iops_min)
+        return is_suitable
@@ -1,10 +1,18 @@
-from mongoengine import DoesNotExist, ValidationError
+from typing import Dict
 
-from models.shape_price import ShapePrice, DEFAULT_CUSTOMER, OSEnum
+from mongoengine import ValidationError
+
+from commons.log_helper import get_logger
+from models.shape_price import ShapePrice, DEFAULT_CUSTOMER
+
+_LOG = get_logger('r8s-shape-price-service')
 
 
 class ShapePriceService:
 
+    def __init__(self):
+        self.__price_tables = {}
+
     @staticmethod
     def list(cloud=None):
         if cloud:
@@ -12,17 +20,47 @@ class ShapePriceService:
         return ShapePrice.objects.all()
 
     def get(self, customer, name, region, os=None):
-        shape_price = self._get(customer=customer, name=name,
-                                region=region, os=os)
-        if shape_price:
-            return shape_price
-        return self._get(customer=DEFAULT_CUSTOMER, name=name,
-                         region=region, os=os)
+        price_table = self.get_price_table(customer=customer, region=region,
+                                           os=os)
+        return price_table.get(name)
+
+    def get_price_table(self, customer, region, os=None) \
+            -> Dict[str, ShapePrice]:
+        """
+        Shape prices of the region and os by shape name, customer prices
+        are merged over the DEFAULT ones. Loaded with a single query
+        once per job for each (customer, region, os).
+        """
+        key = (customer, region, os)
+        if key not in self.__price_tables:
+            self.__price_tables[key] = self._load_price_table(
+                customer=customer, region=region, os=os)
+        return self.__price_tables[key]
+
+    def get_price_tables(self) -> dict:
+        return dict(self.__price_tables)
+
+    def set_price_tables(self, price_tables: dict):
+        """
+        Restores price tables loaded by another process, used by worker
+        processes which do not inherit the price tables of the job
+        """
+        self.__price_tables.update(price_tables)
 
     @staticmethod
-    def _get(customer, name, region, os):
+    def _load_price_table(customer, region, os) -> Dict[str, ShapePrice]:
+        customers = list({customer, DEFAULT_CUSTOMER})
         try:
-            return ShapePrice.objects.get(customer=customer, name=name,
-                                          region=region, os=os)
-        except (DoesNotExist, ValidationError):
-            return None
+            shape_prices = list(ShapePrice.objects(
+                customer__in=customers, region=region, os=os))
+        except ValidationError:
+            return {}
+        price_table = {}
+        for shape_price in shape_prices:
+            if shape_price.customer == DEFAULT_CUSTOMER and \
+                    shape_price.name in price_table:
+                continue
+            price_table[shape_price.name] = shape_price
+        _LOG.debug(f'{len(price_table)} shape prices loaded for customer '
+                   f'\'{customer}\', region \'{region}\', os \'{os}\'')
+        return price_table
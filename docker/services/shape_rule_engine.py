@@ -0,0 +1,86 @@
+import re
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+FIELD_ATTR = 'field'
+VALUE_ATTR = 'value'
+ACTION_ATTR = 'action'
+CONDITION_ATTR = 'condition'
+
+CONDITION_MATCH = 'match'
+CONDITION_CONTAINS = 'contains'
+CONDITION_NOT_CONTAINS = 'not_contains'
+CONDITION_EQUAL = 'equal'
+
+MAX_COMPILED_RULES = 256
+
+
+class CompiledShapeRule:
+    """
+    Shape rule compiled into a predicate once: 'match' patterns are
+    translated and compiled, compared values are lowered beforehand.
+    Results are memoized by the value of the shape field, so shapes
+    which share a value (family, processor, architecture) or are
+    checked again for another instance are not evaluated twice.
+
+    Compiled rules are cached by rule content and shared by all the
+    parents (and requests) which have the same rule.
+    """
+    __cache = OrderedDict()
+
+    def __init__(self, rule):
+        self.rule = rule
+        self.field = rule.get(FIELD_ATTR)
+        self.predicate = self._compile(condition=rule.get(CONDITION_ATTR),
+                                       value=rule.get(VALUE_ATTR))
+        self.__matches = {}
+
+    @classmethod
+    def from_rule(cls, rule) -> 'CompiledShapeRule':
+        key = cls.get_rule_key(rule=rule)
+        compiled = cls.__cache.get(key)
+        if compiled:
+            cls.__cache.move_to_end(key)
+            return compiled
+        compiled = cls(rule=rule)
+        cls.__cache[key] = compiled
+        if len(cls.__cache) > MAX_COMPILED_RULES:
+            cls.__cache.popitem(last=False)
+        return compiled
+
+    @staticmethod
+    def get_rule_key(rule) -> Tuple:
+        return tuple(rule.get(attr) for attr in (
+            FIELD_ATTR, VALUE_ATTR, CONDITION_ATTR))
+
+    def matches(self, shape) -> bool:
+        if not self.predicate or not self.field:
+            return False
+        value = getattr(shape, self.field, None)
+        if not value:
+            return False
+        matches = self.__matches.get(value)
+        if matches is None:
+            matches = self.predicate(value)
+            self.__matches[value] = matches
+        return matches
+
+    def find_matching(self, shapes) -> list:
+        return [shape for shape in shapes if self.matches(shape)]
+
+    @staticmethod
+    def _compile(condition, value) -> Optional[Callable[[str], bool]]:
+        if not value:
+            return
+        if condition == CONDITION_MATCH:
+            pattern = re.compile(value.replace('.', r'\.').replace('*', '.+'))
+            return lambda shape_value: bool(pattern.match(shape_value))
+        if not isinstance(value, str):
+            return
+        value = value.lower()
+        if condition == CONDITION_CONTAINS:
+            return lambda shape_value: value in shape_value.lower()
+        if condition == CONDITION_NOT_CONTAINS:
+            return lambda shape_value: value not in shape_value.lower()
+        if condition == CONDITION_EQUAL:
+            return lambda shape_value: value == shape_value.lower()
@@ -1,10 +1,16 @@
+from typing import Dict, Tuple
+
 from mongoengine import DoesNotExist, ValidationError
 
 from models.shape import Shape
 from functools import lru_cache
 
+from services.shape_catalog import ShapeCatalog
+
 
 class ShapeService:
+    def __init__(self):
+        self.__catalogs: Dict[Tuple[str, str], ShapeCatalog] = {}
 
     @staticmethod
     def list(cloud=None, resource_type=None):
@@ -17,6 +23,33 @@ class ShapeService:
             return Shape.objects(**query)
         return Shape.objects.all()
 
+    def get_catalog(self, cloud=None, resource_type=None) -> ShapeCatalog:
+        """
+        Shapes of the cloud and resource type, loaded once and kept
+        until the catalogs are cleared
+        """
+        key = (cloud, resource_type)
+        catalog = self.__catalogs.get(key)
+        if catalog is None:
+            catalog = ShapeCatalog(
+                shapes=self.list(cloud=cloud, resource_type=resource_type),
+                cloud=cloud, resource_type=resource_type)
+            self.__catalogs[key] = catalog
+        return catalog
+
+    def clear_catalogs(self):
+        self.__catalogs.clear()
+
+    def get_catalogs(self) -> Dict[Tuple[str, str], ShapeCatalog]:
+        return dict(self.__catalogs)
+
+    def set_catalogs(self, catalogs: Dict[Tuple[str, str], ShapeCatalog]):
+        """
+        Restores catalogs loaded by another process, used by worker
+        processes which do not inherit the catalogs of the job
+        """
+        self.__catalogs.update(catalogs)
+
     @staticmethod
     @lru_cache(maxsize=256)
     def get(name):
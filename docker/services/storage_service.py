@@ -1,10 +1,13 @@
+import gzip
 import os
+import shutil
+from collections import deque
 from datetime import datetime, timedelta, date
 from glob import glob
 import concurrent
 import itertools
 
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterator, Union
 
 from bson import ObjectId
 from bson.errors import InvalidId
@@ -18,15 +21,28 @@ from commons.profiler import profiler
 from models.recommendation_history import RecommendationHistory
 from models.storage import Storage, StorageServiceEnum, S3Storage
 from services.clients.s3 import S3Client
+from services.metric_buffer import MetricBuffer, MemoryCeiling
+from services.s3_object_cache import S3ObjectCache
 
 _LOG = get_logger('r8s-storage-service')
 
 DATE_FORMAT = '%Y-%m-%d'
+# max amount of concurrent s3 listing requests
+LIST_WORKERS = 10
+# max amount of concurrently uploaded result files
+UPLOAD_WORKERS = 10
+GZIP_ENCODING = 'gzip'
+GZIP_EXTENSION = '.gz'
+# metrics layout below the prefix: resource_type/customer/cloud/tenant/
+# region/date, depth of date folders
+DATE_FOLDER_DEPTH = 6
 
 
 class StorageService:
-    def __init__(self, s3_client: S3Client):
+    def __init__(self, s3_client: S3Client,
+                 object_cache: S3ObjectCache = None):
         self.s3_client = s3_client
+        self.object_cache = object_cache
 
         self.storage_service_class_mapping = {
             StorageServiceEnum.S3_BUCKET: S3Storage
@@ -80,7 +96,7 @@ class StorageService:
                          resource_type, scan_customer, scan_clouds,
                          scan_tenants, scan_from_date, scan_to_date,
                          max_days, min_days, recommendations_map: dict,
-                         force_rescan: bool):
+                         force_rescan: bool, exclude_instance_ids=None):
         type_downloader_mapping = {
             S3Storage: self._download_metrics_s3
         }
@@ -95,14 +111,335 @@ class StorageService:
         return downloader(data_source, output_path, resource_type,
                           scan_customer, scan_clouds, scan_tenants,
                           scan_from_date, scan_to_date, max_days, min_days,
-                          recommendations_map, force_rescan)
+                          recommendations_map, force_rescan,
+                          exclude_instance_ids)
 
     def _download_metrics_s3(self, data_source: S3Storage, output_path,
                              resource_type, scan_customer, scan_clouds,
                              scan_tenants, scan_from_date=None,
                              scan_to_date=None, max_days=None, min_days=None,
                              recommendations_map: dict = None,
-                             force_rescan=False):
+                             force_rescan=False, exclude_instance_ids=None):
+        access = data_source.access
+        prefix = access.prefix
+        bucket_name = access.bucket_name
+
+        s3_keys, meta_keys, insufficient_map, unchanged_map = (
+            self._list_metric_keys_s3(
+                data_source=data_source,
+                resource_type=resource_type,
+                scan_customer=scan_customer,
+                scan_clouds=scan_clouds,
+                scan_tenants=scan_tenants,
+                scan_from_date=scan_from_date,
+                scan_to_date=scan_to_date,
+                max_days=max_days,
+                min_days=min_days,
+                recommendations_map=recommendations_map,
+                force_rescan=force_rescan,
+                exclude_instance_ids=exclude_instance_ids
+            ))
+
+        _LOG.debug(f'{len(s3_keys)} metric, {len(meta_keys)} meta '
+                   f'files found, downloading')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+            futures = []
+            for s3_key in itertools.chain(meta_keys, s3_keys):
+                futures.append(executor.submit(
+                    self._download_file,
+                    bucket_name=bucket_name,
+                    s3_key=s3_key,
+                    output_folder_path=self._get_output_folder_path(
+                        output_path=output_path,
+                        prefix=prefix,
+                        s3_key=s3_key)
+                ))
+        return insufficient_map, unchanged_map
+
+    @profiler(execution_step=f's3_stream_tenant_metrics')
+    def stream_metrics(self, data_source: Storage, output_path: str,
+                       resource_type, scan_customer, scan_clouds,
+                       scan_tenants, scan_from_date, scan_to_date,
+                       max_days, min_days, recommendations_map: dict,
+                       force_rescan: bool, buffer_size: int,
+                       exclude_instance_ids=None, memory_limit_mb: int = 0):
+        """
+        Streaming alternative to download_metrics. Meta files are
+        downloaded before return, metric files are returned as an iterator
+        of (instance_id, local_file_paths) that yields instances in the
+        listing order, each one as soon as all of its daily files are
+        downloaded. Downloads of the following instances continue in the
+        background, at most buffer_size instances are downloaded ahead
+        of the consumer.
+
+        If memory limit is set, metric files are kept in memory as
+        MetricBuffer items instead of local files while their total size
+        fits under the limit, the rest are downloaded to disk. Buffers of
+        an instance are released once the consumer asks for the next one.
+        Instances with any of the daily files failed to download are
+        skipped.
+        """
+        type_streamer_mapping = {
+            S3Storage: self._stream_metrics_s3
+        }
+        streamer = type_streamer_mapping.get(data_source.__class__)
+
+        if not streamer:
+            raise ExecutorException(
+                step_name=JOB_STEP_DOWNLOAD_METRICS,
+                reason=f'No downloader available for storage class '
+                       f'\'{data_source.__class__}\''
+            )
+        return streamer(data_source, output_path, resource_type,
+                        scan_customer, scan_clouds, scan_tenants,
+                        scan_from_date, scan_to_date, max_days, min_days,
+                        recommendations_map, force_rescan, buffer_size,
+                        exclude_instance_ids, memory_limit_mb)
+
+    def _stream_metrics_s3(self, data_source: S3Storage, output_path,
+                           resource_type, scan_customer, scan_clouds,
+                           scan_tenants, scan_from_date=None,
+                           scan_to_date=None, max_days=None, min_days=None,
+                           recommendations_map: dict = None,
+                           force_rescan=False, buffer_size: int = 1,
+                           exclude_instance_ids=None,
+                           memory_limit_mb: int = 0):
+        access = data_source.access
+        prefix = access.prefix
+        bucket_name = access.bucket_name
+
+        key_sizes = {}
+        s3_keys, meta_keys, insufficient_map, unchanged_map = (
+            self._list_metric_keys_s3(
+                data_source=data_source,
+                resource_type=resource_type,
+                scan_customer=scan_customer,
+                scan_clouds=scan_clouds,
+                scan_tenants=scan_tenants,
+                scan_from_date=scan_from_date,
+                scan_to_date=scan_to_date,
+                max_days=max_days,
+                min_days=min_days,
+                recommendations_map=recommendations_map,
+                force_rescan=force_rescan,
+                exclude_instance_ids=exclude_instance_ids,
+                key_sizes=key_sizes
+            ))
+
+        # meta files are shared by all instances of the region,
+        # so they are required before any instance can be analysed
+        _LOG.debug(f'{len(meta_keys)} meta files found, downloading')
+        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+            for s3_key in meta_keys:
+                executor.submit(
+                    self._download_file,
+                    bucket_name=bucket_name,
+                    s3_key=s3_key,
+                    output_folder_path=self._get_output_folder_path(
+                        output_path=output_path,
+                        prefix=prefix,
+                        s3_key=s3_key)
+                )
+
+        instance_keys_map = {}
+        for s3_key in s3_keys:
+            instance_id = s3_key.split('/')[-1].replace(CSV_EXTENSION, '')
+            instance_keys_map.setdefault(instance_id, []).append(s3_key)
+        _LOG.debug(f'{len(s3_keys)} metric files of '
+                   f'{len(instance_keys_map)} instances found, '
+                   f'streaming')
+        instance_files = self._iter_instance_downloads_s3(
+            bucket_name=bucket_name,
+            prefix=prefix,
+            output_path=output_path,
+            instance_keys_map=instance_keys_map,
+            buffer_size=max(buffer_size, 1),
+            memory_ceiling=MemoryCeiling(
+                limit_bytes=memory_limit_mb * 1024 * 1024),
+            key_sizes=key_sizes
+        )
+        return insufficient_map, unchanged_map, instance_files
+
+    def _iter_instance_downloads_s3(
+            self, bucket_name, prefix, output_path,
+            instance_keys_map: Dict[str, List[str]],
+            buffer_size: int, memory_ceiling: MemoryCeiling = None,
+            key_sizes: Dict[str, int] = None) \
+            -> Iterator[Tuple[str, List[Union[str, MetricBuffer]]]]:
+        memory_ceiling = memory_ceiling or MemoryCeiling(limit_bytes=0)
+        key_sizes = key_sizes or {}
+        pending = deque()
+        instances = iter(instance_keys_map.items())
+        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
+            try:
+                while True:
+                    while len(pending) < buffer_size:
+                        instance_id, s3_keys = next(instances, (None, None))
+                        if instance_id is None:
+                            break
+                        futures = [executor.submit(
+                            self._download_metric_file,
+                            bucket_name=bucket_name,
+                            s3_key=s3_key,
+                            output_folder_path=self._get_output_folder_path(
+                                output_path=output_path,
+                                prefix=prefix,
+                                s3_key=s3_key),
+                            memory_ceiling=memory_ceiling,
+                            size=key_sizes.get(s3_key)
+                        ) for s3_key in s3_keys]
+                        pending.append((instance_id, futures))
+                    if not pending:
+                        return
+                    # instances are yielded in the listing order, so the
+                    # results do not depend on the download timings; the
+                    # following ones keep downloading meanwhile
+                    instance_id, futures = pending.popleft()
+                    file_paths = []
+                    failed = False
+                    for future in futures:
+                        try:
+                            file_paths.append(future.result())
+                        except Exception as e:
+                            _LOG.error(f'Failed to download instance '
+                                       f'{instance_id} metric file: {e}')
+                            failed = True
+                    if failed:
+                        # partial history would give wrong recommendations
+                        _LOG.error(f'Skipping instance {instance_id}: not '
+                                   f'all of its metric files downloaded')
+                        self._release_buffers(memory_ceiling=memory_ceiling,
+                                              items=file_paths)
+                        for item in file_paths:
+                            if not isinstance(item, MetricBuffer):
+                                os.remove(item)
+                        continue
+                    try:
+                        if file_paths:
+                            yield instance_id, file_paths
+                    finally:
+                        self._release_buffers(memory_ceiling=memory_ceiling,
+                                              items=file_paths)
+            finally:
+                # downloads not consumed, e.g. if the consumer has
+                # stopped iterating
+                for _, futures in pending:
+                    concurrent.futures.wait(futures)
+                    self._release_buffers(
+                        memory_ceiling=memory_ceiling,
+                        items=[future.result() for future in futures
+                               if not future.exception()])
+
+    @staticmethod
+    def _release_buffers(memory_ceiling: MemoryCeiling,
+                         items: List[Union[str, MetricBuffer]]):
+        memory_ceiling.release(size=sum(
+            item.size for item in items if isinstance(item, MetricBuffer)))
+
+    def _download_metric_file(self, bucket_name, s3_key,
+                              output_folder_path,
+                              memory_ceiling: MemoryCeiling,
+                              size: int = None) \
+            -> Union[str, MetricBuffer]:
+        """
+        Keeps the object content in memory if its listed size fits
+        under the memory ceiling, the memory is reserved before the
+        object is downloaded. Otherwise, or if the size is unknown, the
+        object is streamed into the output folder.
+        """
+        if size is None or not memory_ceiling.acquire(size=size):
+            return self._download_file(bucket_name=bucket_name,
+                                       s3_key=s3_key,
+                                       output_folder_path=output_folder_path)
+        file_path = os.path.join(output_folder_path, s3_key.split('/')[-1])
+        try:
+            content = self._get_object_content(bucket_name=bucket_name,
+                                               s3_key=s3_key)
+        except Exception:
+            memory_ceiling.release(size=size)
+            raise
+        if len(content) != size:
+            # the object has changed since it was listed
+            memory_ceiling.release(size=size)
+            if not memory_ceiling.acquire(size=len(content)):
+                with open(file_path, 'wb') as f:
+                    f.write(content)
+                return file_path
+        return MetricBuffer(path=file_path, content=content)
+
+    def _download_file(self, bucket_name, s3_key, output_folder_path) -> str:
+        """
+        Streams the object into the output folder. If the object cache
+        is enabled, cached content is validated with a conditional
+        request and the object is downloaded only if it has changed.
+        Contents are copied between files in chunks.
+        """
+        if not self.object_cache:
+            return self.s3_client.download_file(
+                bucket_name=bucket_name,
+                full_file_name=s3_key,
+                output_folder_path=output_folder_path)
+        file_path = os.path.join(output_folder_path, s3_key.split('/')[-1])
+        etag = self.object_cache.get_etag(bucket_name=bucket_name,
+                                          key=s3_key)
+        downloaded, etag = self.s3_client.download_changed_file(
+            bucket_name=bucket_name,
+            full_file_name=s3_key,
+            file_path=file_path,
+            etag=etag)
+        if not downloaded:
+            if self.object_cache.copy_to(bucket_name=bucket_name,
+                                         key=s3_key, file_path=file_path):
+                return file_path
+            # evicted since its etag was checked
+            _, etag = self.s3_client.download_changed_file(
+                bucket_name=bucket_name,
+                full_file_name=s3_key,
+                file_path=file_path)
+        self.object_cache.put_file(bucket_name=bucket_name, key=s3_key,
+                                   etag=etag, file_path=file_path)
+        return file_path
+
+    def _get_object_content(self, bucket_name, s3_key) -> bytes:
+        """
+        Content of the object. If the object cache is enabled, cached
+        content is validated with a conditional request and downloaded
+        only if the object has changed.
+        """
+        if not self.object_cache:
+            return self.s3_client.get_file_content(
+                bucket_name=bucket_name,
+                full_file_name=s3_key)
+        etag = self.object_cache.get_etag(bucket_name=bucket_name,
+                                          key=s3_key)
+        content, etag = self.s3_client.get_changed_file_content(
+            bucket_name=bucket_name,
+            full_file_name=s3_key,
+            etag=etag)
+        if content is None:
+            content = self.object_cache.read(bucket_name=bucket_name,
+                                             key=s3_key)
+            if content is not None:
+                return content
+            # evicted since its etag was checked
+            content, etag = self.s3_client.get_changed_file_content(
+                bucket_name=bucket_name,
+                full_file_name=s3_key)
+        self.object_cache.put(bucket_name=bucket_name, key=s3_key,
+                              etag=etag, content=content)
+        return content
+
+    def _list_metric_keys_s3(self, data_source: S3Storage, resource_type,
+                             scan_customer, scan_clouds, scan_tenants,
+                             scan_from_date=None, scan_to_date=None,
+                             max_days=None, min_days=None,
+                             recommendations_map: dict = None,
+                             force_rescan=False, exclude_instance_ids=None,
+                             key_sizes: Dict[str, int] = None):
+        """
+        Lists metric and meta file keys of the scan. If key_sizes is
+        given, it is filled with sizes of the listed objects.
+        """
         access = data_source.access
         prefix = access.prefix
         bucket_name = access.bucket_name
@@ -113,10 +450,30 @@ class StorageService:
                                      scan_clouds=scan_clouds,
                                      scan_tenants=scan_tenants)
 
+        if not scan_from_date and max_days:
+            _LOG.debug(f'Start stan date is not specified. Going to use '
+                       f'limitation from algorithm of {max_days} days')
+            scan_start_dt = datetime.utcnow() - timedelta(days=max_days)
+            scan_from_date = scan_start_dt.strftime(DATE_FORMAT)
+
+        filter_only_dates = self.get_scan_dates_list(
+            scan_from_date=scan_from_date,
+            scan_to_date=scan_to_date
+        )
+
         _LOG.debug(f'Listing objects in bucket \'{bucket_name}\'. '
                    f'from paths: \'{paths}\'')
         s3_keys = []
-        if paths:
+        if paths and resource_type and filter_only_dates:
+            s3_keys = self._list_objects_by_dates(
+                bucket_name=bucket_name,
+                paths=paths,
+                # all the paths are built to the same depth
+                levels=self._get_date_folder_levels(path=paths[0],
+                                                    prefix=prefix),
+                dates=filter_only_dates
+            )
+        elif paths:
             for path in paths:
                 files = self.s3_client.list_objects(bucket_name=bucket_name,
                                                     prefix=path)
@@ -125,20 +482,13 @@ class StorageService:
         else:
             files = self.s3_client.list_objects(bucket_name=bucket_name)
             s3_keys.extend(files)
+        if key_sizes is not None:
+            key_sizes.update((obj['Key'], obj['Size']) for obj in s3_keys
+                             if 'Size' in obj)
         s3_keys = [obj['Key'] for obj in s3_keys if
                    obj.get('Key').endswith(CSV_EXTENSION)
                    or obj.get('Key').endswith(f'/{META_FILE_NAME}')]
 
-        if not scan_from_date and max_days:
-            _LOG.debug(f'Start stan date is not specified. Going to use '
-                       f'limitation from algorithm of {max_days} days')
-            scan_start_dt = datetime.utcnow() - timedelta(days=max_days)
-            scan_from_date = scan_start_dt.strftime(DATE_FORMAT)
-
-        filter_only_dates = self.get_scan_dates_list(
-            scan_from_date=scan_from_date,
-            scan_to_date=scan_to_date
-        )
         if filter_only_dates:
             s3_keys = [key for key in s3_keys if key.split('/')[-2]
                        in filter_only_dates]
@@ -147,6 +497,13 @@ class StorageService:
         s3_keys, meta_keys = self.divide_meta_files(
             s3_keys=s3_keys)
 
+        if exclude_instance_ids:
+            _LOG.debug(f'Excluding metrics of {len(exclude_instance_ids)} '
+                       f'instances')
+            s3_keys = [key for key in s3_keys if
+                       key.split('/')[-1].replace(CSV_EXTENSION, '')
+                       not in exclude_instance_ids]
+
         # for instances with insufficient metrics data:
         # {instance_id: List[s3_key]}
         insufficient_map = {}
@@ -173,30 +530,59 @@ class StorageService:
             unchanged_map = {instance_id: value for instance_id, value
                              in unchanged_map.items()
                              if instance_id not in insufficient_map}
+        return s3_keys, meta_keys, insufficient_map, unchanged_map
+
+    def _list_objects_by_dates(self, bucket_name, paths: List[str],
+                               levels: int, dates: List[str]) -> List[dict]:
+        """
+        Lists only the date folders of the scan window: folders between
+        the paths and date folders (tenants, regions) are discovered
+        level by level, then each of the date folders is listed. All the
+        listings of a level are concurrent. Objects are returned in
+        the order of their keys.
+        """
+        prefixes = [path.rstrip('/') + '/' for path in paths]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=LIST_WORKERS) as executor:
+            for _ in range(levels):
+                prefixes = list(itertools.chain.from_iterable(executor.map(
+                    lambda prefix: self.s3_client.list_common_prefixes(
+                        bucket_name=bucket_name, prefix=prefix),
+                    prefixes)))
+            date_prefixes = [f'{prefix}{date_str}/' for prefix in prefixes
+                             for date_str in dates]
+            _LOG.debug(f'Listing {len(date_prefixes)} date folders')
+            objects = executor.map(
+                lambda prefix: self.s3_client.list_objects(
+                    bucket_name=bucket_name, prefix=prefix) or [],
+                date_prefixes)
+            return list(itertools.chain.from_iterable(objects))
 
-        _LOG.debug(f'{len(s3_keys)} metric, {len(meta_keys)} meta '
-                   f'files found, downloading')
-        with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-            futures = []
-            for s3_key in itertools.chain(meta_keys, s3_keys):
-                path = s3_key.split('/')
-                if len(path) > 0 and path[0] == prefix:
-                    path = path[1:]
-                path = '/'.join(path[:-1])
-                output_folder_path = '/'.join((output_path, path))
-                os.makedirs(output_folder_path, exist_ok=True)
+    @staticmethod
+    def _get_date_folder_levels(path: str, prefix: str = None) -> int:
+        """
+        Amount of folders between the path built by _build_s3_paths and
+        date folders, derived from the depth of the path below the prefix
+        """
+        if prefix:
+            path = path[len(prefix):]
+        depth = len([folder for folder in path.split('/') if folder])
+        return DATE_FOLDER_DEPTH - 1 - depth
 
-                futures.append(executor.submit(
-                    self.s3_client.download_file,
-                    bucket_name=bucket_name,
-                    full_file_name=s3_key,
-                    output_folder_path=output_folder_path
-                ))
-        return insufficient_map, unchanged_map
+    @staticmethod
+    def _get_output_folder_path(output_path, prefix, s3_key):
+        path = s3_key.split('/')
+        if len(path) > 0 and path[0] == prefix:
+            path = path[1:]
+        path = '/'.join(path[:-1])
+        output_folder_path = '/'.join((output_path, path))
+        os.makedirs(output_folder_path, exist_ok=True)
+        return output_folder_path
 
     @profiler(execution_step=f's3_upload_job_results')
     def upload_job_results(self, job_id, storage: Storage,
-                           results_folder_path, tenant=None):
+                           results_folder_path, tenant=None,
+                           compress: bool = False):
         type_uploader_mapping = {
             S3Storage: self._upload_job_results_s3
         }
@@ -208,10 +594,16 @@ class StorageService:
                 reason=f'No downloader available for storage class '
                        f'\'{storage.__class__}\''
             )
-        return downloader(job_id, storage, results_folder_path, tenant)
+        return downloader(job_id, storage, results_folder_path, tenant,
+                          compress)
 
     def _upload_job_results_s3(self, job_id, storage, results_folder_path,
-                               tenant=None):
+                               tenant=None, compress: bool = False):
+        """
+        Uploads result files concurrently. Files are streamed from disk,
+        large ones in multiple parts. Compressed files keep their keys
+        and are stored with gzip content encoding.
+        """
         access = storage.access
         prefix = access.prefix
         bucket_name = access.bucket_name
@@ -229,16 +621,40 @@ class StorageService:
         if tenant:
             files = [file for file in files if file.split('/')[-2] == tenant]
 
-        for file in files:
-            file_key = file.replace(results_folder_path, '').strip('/')
-            s3_file_key = os.path.join(s3_folder_path, file_key)
-            with open(file, 'r') as f:
-                body = f.read()
-            self.s3_client.put_object(
-                bucket_name=bucket_name,
-                object_name=s3_file_key,
-                body=body
-            )
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=UPLOAD_WORKERS) as executor:
+            futures = []
+            for file in files:
+                file_key = file.replace(results_folder_path, '').strip('/')
+                futures.append(executor.submit(
+                    self._upload_file,
+                    bucket_name=bucket_name,
+                    s3_file_key=os.path.join(s3_folder_path, file_key),
+                    file_path=file,
+                    compress=compress
+                ))
+            for future in futures:
+                future.result()
+
+    def _upload_file(self, bucket_name, s3_file_key, file_path,
+                     compress: bool = False):
+        if not compress:
+            self.s3_client.upload_file(bucket_name=bucket_name,
+                                       object_name=s3_file_key,
+                                       file_path=file_path)
+            return
+        compressed_file_path = f'{file_path}{GZIP_EXTENSION}'
+        try:
+            with open(file_path, 'rb') as source, \
+                    gzip.open(compressed_file_path, 'wb') as target:
+                shutil.copyfileobj(source, target)
+            self.s3_client.upload_file(bucket_name=bucket_name,
+                                       object_name=s3_file_key,
+                                       file_path=compressed_file_path,
+                                       content_encoding=GZIP_ENCODING)
+        finally:
+            if os.path.exists(compressed_file_path):
+                os.remove(compressed_file_path)
 
     @staticmethod
     def _build_s3_paths(prefix, resource_type,
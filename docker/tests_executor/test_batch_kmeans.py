@@ -0,0 +1,102 @@
+import os
+
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse)
+
+
+class TestBatchKMeans(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'batch_kmeans'
+
+        length = POINTS_IN_DAY * 14
+        instance_id_series = constant_to_series(
+            value=self.instance_id,
+            length=length
+        )
+        instance_type_series = constant_to_series(
+            value='t2.medium',
+            length=length
+        )
+        timestamp_series = generate_timestamp_series(length=length)
+        cpu_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=50,
+            scale=10,
+            size=length
+        )
+        memory_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=60,
+            scale=10,
+            size=length
+        )
+        net_output_load_series = constant_to_series(-1, length)
+        avg_disk_iops = constant_to_series(-1, length)
+        max_disk_iops = constant_to_series(-1, length)
+        df_data = {
+            'instance_id': instance_id_series,
+            'instance_type': instance_type_series,
+            'timestamp': timestamp_series,
+            'cpu_load': cpu_load_series,
+            'memory_load': memory_load_series,
+            'net_output_load': net_output_load_series,
+            'avg_disk_iops': avg_disk_iops,
+            'max_disk_iops': max_disk_iops,
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+        self.create_plots()
+
+    def test_batch_kmeans(self):
+        from services.clustering_service import ClusteringService, \
+            CLUSTERING_ENGINE_NUMPY
+        from services.day_matrix import DayMatrix
+
+        df = self.metrics_service.load_df(
+            path=self.metrics_file_path,
+            algorithm=self.algorithm
+        )
+        days = self.metrics_service.divide_by_days(
+            df=df, skip_incomplete_corner_days=True,
+            step_minutes=5)
+        day_matrix = DayMatrix.from_days(
+            days=days, columns=self.algorithm.metric_attributes,
+            step_minutes=5).rolling_mean(window=2)
+        day_indexes = list(range(len(days)))
+
+        clustering_service = ClusteringService(
+            engine=CLUSTERING_ENGINE_NUMPY, seed=1)
+        clusterings = clustering_service.cluster_days(
+            day_matrix=day_matrix, day_indexes=day_indexes,
+            algorithm=self.algorithm)
+        self.assertEqual(len(clusterings), len(days))
+
+        # same seed gives the same result, regardless of the batch
+        self.assertEqual(clusterings, clustering_service.cluster_days(
+            day_matrix=day_matrix, day_indexes=day_indexes,
+            algorithm=self.algorithm))
+        self.assertEqual(clusterings[3:5], clustering_service.cluster_days(
+            day_matrix=day_matrix, day_indexes=[3, 4],
+            algorithm=self.algorithm))
+
+        for day_index, (labels, centroids) in enumerate(clusterings):
+            self.assertEqual(len(labels), len(days[day_index]))
+            self.assertTrue(set(labels) <= set(range(len(centroids))))
+            day_df = days[day_index][
+                list(self.algorithm.metric_attributes)].rolling(
+                window=2, min_periods=1).mean()
+            expected_clusters = self.clustering_service. \
+                get_optimal_clusters_number(df=day_df,
+                                            algorithm=self.algorithm)
+            self.assertEqual(len(centroids), expected_clusters)
@@ -0,0 +1,119 @@
+import os
+from unittest.mock import patch
+
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse,
+                                  replay_operations_for)
+
+
+class TestClusteringCache(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'clustering_cache'
+
+        length = POINTS_IN_DAY * 14
+        instance_id_series = constant_to_series(
+            value=self.instance_id,
+            length=length
+        )
+        instance_type_series = constant_to_series(
+            value='t2.medium',
+            length=length
+        )
+        timestamp_series = generate_timestamp_series(length=length)
+        cpu_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=50,
+            scale=10,
+            size=length
+        )
+        memory_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=60,
+            scale=10,
+            size=length
+        )
+        net_output_load_series = constant_to_series(-1, length)
+        avg_disk_iops = constant_to_series(-1, length)
+        max_disk_iops = constant_to_series(-1, length)
+        df_data = {
+            'instance_id': instance_id_series,
+            'instance_type': instance_type_series,
+            'timestamp': timestamp_series,
+            'cpu_load': cpu_load_series,
+            'memory_load': memory_load_series,
+            'net_output_load': net_output_load_series,
+            'avg_disk_iops': avg_disk_iops,
+            'max_disk_iops': max_disk_iops,
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+        self.create_plots()
+
+        from services.clustering_cache_service import ClusteringCacheService
+        from services.metrics_service import MetricsService
+        self.metrics_service = MetricsService(
+            clustering_service=self.clustering_service,
+            clustering_cache_service=ClusteringCacheService()
+        )
+
+    def _divide_on_periods(self):
+        df = self.metrics_service.load_df(
+            path=self.metrics_file_path,
+            algorithm=self.algorithm
+        )
+        return self.metrics_service.divide_on_periods(
+            df=df,
+            algorithm=self.algorithm,
+            instance_id=self.instance_id
+        )
+
+    @patch('services.clustering_cache_service.'
+           'ClusteringCacheService._write_operations',
+           side_effect=replay_operations_for(
+               'models.clustering_cache.DayClustering'))
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_clustering_cache(self, write_operations):
+        with patch.object(self.clustering_service, 'cluster_days',
+                          wraps=self.clustering_service.cluster_days) \
+                as cluster_days:
+            periods = self._divide_on_periods()
+            clustered_days = cluster_days.call_args.kwargs['day_indexes']
+            self.assertTrue(len(clustered_days) > 0)
+            # clustered days are saved with a single bulk write
+            self.assertEqual(write_operations.call_count, 1)
+            self.assertEqual(len(write_operations.call_args.kwargs[
+                                     'operations']), len(clustered_days))
+
+            cached_periods = self._divide_on_periods()
+            clustered_days = cluster_days.call_args.kwargs['day_indexes']
+            self.assertEqual(clustered_days, [])
+
+        *periods, centroids = periods
+        *cached_periods, cached_centroids = cached_periods
+        self.assertEqual(centroids, cached_centroids)
+        for load_periods, cached_load_periods in zip(periods,
+                                                     cached_periods):
+            self.assertEqual(len(load_periods), len(cached_load_periods))
+            for period, cached_period in zip(load_periods,
+                                             cached_load_periods):
+                pd.testing.assert_frame_equal(period, cached_period)
+
+        # cached days are not reused with another seed of the engine
+        settings_hash = self.metrics_service.clustering_cache_service. \
+            get_settings_hash
+        self.assertNotEqual(
+            settings_hash(algorithm=self.algorithm,
+                          engine=self.clustering_service.engine, seed=0),
+            settings_hash(algorithm=self.algorithm,
+                          engine=self.clustering_service.engine, seed=1))
@@ -0,0 +1,126 @@
+import os
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.metrics import adjusted_rand_score
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_scheduled_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse)
+
+
+class TestClusteringEngines(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'clustering_engines'
+
+        length = POINTS_IN_DAY * 14
+        timestamp_series = generate_timestamp_series(length=length)
+        work_hours = (9, 10, 11, 12, 13, 14, 15, 16, 17)
+        df_data = {
+            'instance_id': constant_to_series(self.instance_id, length),
+            'instance_type': constant_to_series('t2.medium', length),
+            'timestamp': timestamp_series,
+            'cpu_load': generate_scheduled_metric_series(
+                distribution='normal',
+                timestamp_series=timestamp_series,
+                work_days=(0, 1, 2, 3, 4), work_hours=work_hours,
+                work_kwargs=dict(loc=50, scale=5),
+                idle_kwargs=dict(loc=5, scale=1)),
+            'memory_load': generate_scheduled_metric_series(
+                distribution='normal',
+                timestamp_series=timestamp_series,
+                work_days=(0, 1, 2, 3, 4), work_hours=work_hours,
+                work_kwargs=dict(loc=60, scale=5),
+                idle_kwargs=dict(loc=7, scale=1)),
+            'net_output_load': constant_to_series(-1, length),
+            'avg_disk_iops': constant_to_series(-1, length),
+            'max_disk_iops': constant_to_series(-1, length),
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+
+    @staticmethod
+    def _get_wcss(records: np.ndarray, labels) -> float:
+        labels = np.asarray(labels)
+        return sum(((records[labels == label] -
+                     records[labels == label].mean(axis=0)) ** 2).sum()
+                   for label in np.unique(labels))
+
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_clustering_engines(self):
+        from services.batch_kmeans import BatchKMeans
+        from services.clustering_service import ClusteringService, \
+            CLUSTERING_ENGINE_NUMPY, CLUSTERING_ENGINE_SKLEARN
+        from services.day_matrix import DayMatrix
+
+        # batched engine is the default one
+        self.assertEqual(ClusteringService().engine, CLUSTERING_ENGINE_NUMPY)
+
+        df = self.metrics_service.load_df(
+            path=self.metrics_file_path,
+            algorithm=self.algorithm
+        )
+        days = self.metrics_service.divide_by_days(
+            df=df, skip_incomplete_corner_days=True,
+            step_minutes=5)
+        day_matrix = DayMatrix.from_days(
+            days=days, columns=self.algorithm.metric_attributes
+        ).rolling_mean(window=2)
+        day_indexes = list(range(len(days)))
+        clustering_settings = self.algorithm.clustering_settings
+
+        numpy_clusterings = ClusteringService(
+            engine=CLUSTERING_ENGINE_NUMPY).cluster_days(
+            day_matrix=day_matrix, day_indexes=day_indexes,
+            algorithm=self.algorithm)
+        sklearn_clusterings = ClusteringService(
+            engine=CLUSTERING_ENGINE_SKLEARN).cluster_days(
+            day_matrix=day_matrix, day_indexes=day_indexes,
+            algorithm=self.algorithm)
+
+        values, mask = day_matrix.get_padded_records(day_indexes=day_indexes)
+        inertia, _, _ = BatchKMeans(
+            max_clusters=clustering_settings.max_clusters,
+            n_init=clustering_settings.wcss_kmeans_n_init,
+            max_iter=clustering_settings.wcss_kmeans_max_iter,
+            init=clustering_settings.wcss_kmeans_init.value
+        ).fit(values=values, mask=mask,
+              seeds=[[0, day_index] for day_index in day_indexes])
+
+        for day_index in day_indexes:
+            records = day_matrix.get_day_records(day_index=day_index)
+            numpy_labels, numpy_centroids = numpy_clusterings[day_index]
+            sklearn_labels, sklearn_centroids = \
+                sklearn_clusterings[day_index]
+            n_clusters = len(sklearn_centroids)
+            # same number of clusters is chosen at the knee
+            self.assertEqual(len(numpy_centroids), n_clusters)
+
+            # WCSS of the elbow fits up to the chosen number of clusters
+            for clusters in range(1, n_clusters + 1):
+                expected = KMeans(
+                    n_clusters=clusters,
+                    init=clustering_settings.wcss_kmeans_init.value,
+                    max_iter=clustering_settings.wcss_kmeans_max_iter,
+                    n_init=clustering_settings.wcss_kmeans_n_init,
+                    random_state=0).fit(records).inertia_
+                self.assertLessEqual(inertia[day_index, clusters - 1],
+                                     expected * 1.01 + 1e-6)
+
+            # labels agree with the sklearn engine, the batched fit is
+            # not worse than its single initialization fit
+            self.assertGreaterEqual(
+                adjusted_rand_score(numpy_labels, sklearn_labels), 0.9)
+            self.assertLessEqual(
+                self._get_wcss(records, numpy_labels),
+                self._get_wcss(records, sklearn_labels) * 1.01 + 1e-6)
@@ -0,0 +1,56 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.utils import InMemoryS3Client
+
+
+class TestDatedS3Listing(BaseExecutorTest):
+    def test_dated_s3_listing(self):
+        from services.storage_service import StorageService, DATE_FORMAT
+
+        today = date.today()
+        dates = [(today - timedelta(days=days)).strftime(DATE_FORMAT)
+                 for days in range(0, 30)]
+        keys = []
+        for customer in ('customer', 'customer_2'):
+            for cloud in ('aws', 'azure'):
+                for tenant in ('TENANT', 'TENANT_2'):
+                    for region in ('eu-central-1', 'eu-west-1'):
+                        folder = f'metrics/instance/{customer}/{cloud}/' \
+                                 f'{tenant}/{region}'
+                        for date_str in dates:
+                            keys.append(f'{folder}/{date_str}/i-1.csv')
+                            keys.append(
+                                f'{folder}/{date_str}/meta_info.json')
+        window = dates[:8]
+        data_source = SimpleNamespace(access=SimpleNamespace(
+            prefix='metrics', bucket_name='bucket'))
+
+        # (scan_customer, scan_clouds, scan_tenants), expected key folders
+        scans = (
+            ((None, [], []), ()),
+            (('customer', [], []), ('customer',)),
+            (('customer', ['aws'], []), ('customer', 'aws')),
+            (('customer', ['aws'], ['ALL']), ('customer', 'aws')),
+            (('customer', ['aws'], ['TENANT']),
+             ('customer', 'aws', 'TENANT')),
+        )
+        for (scan_customer, scan_clouds, scan_tenants), folders in scans:
+            s3_client = InMemoryS3Client(objects=dict.fromkeys(keys, b''))
+            storage_service = StorageService(s3_client=s3_client)
+            s3_keys, meta_keys, *_ = storage_service._list_metric_keys_s3(
+                data_source=data_source, resource_type='INSTANCE',
+                scan_customer=scan_customer, scan_clouds=scan_clouds,
+                scan_tenants=scan_tenants, max_days=7)
+
+            expected = [key for key in sorted(keys)
+                        if tuple(key.split('/')[2:2 + len(folders)])
+                        == folders and key.split('/')[-2] in window]
+            self.assertEqual(s3_keys, [key for key in expected
+                                       if key.endswith('.csv')])
+            self.assertEqual(meta_keys, [key for key in expected
+                                         if key.endswith('meta_info.json')])
+            # only the date folders of the window are listed
+            self.assertTrue(all(prefix.split('/')[-2] >= min(window)
+                                for prefix in s3_client.listed_prefixes))
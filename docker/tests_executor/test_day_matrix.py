@@ -0,0 +1,145 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse)
+
+
+class TestDayMatrix(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'day_matrix'
+
+        length = POINTS_IN_DAY * 14 + POINTS_IN_DAY // 2
+        instance_id_series = constant_to_series(
+            value=self.instance_id,
+            length=length
+        )
+        instance_type_series = constant_to_series(
+            value='t2.medium',
+            length=length
+        )
+        timestamp_series = generate_timestamp_series(length=length)
+        cpu_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=50,
+            scale=1,
+            size=length
+        )
+        memory_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=60,
+            scale=0.8,
+            size=length
+        )
+        # absolute network output in bytes
+        net_output_load_series = constant_to_series(100 * 1024 * 1024,
+                                                    length)
+        avg_disk_iops = constant_to_series(-1, length)
+        max_disk_iops = constant_to_series(-1, length)
+        df_data = {
+            'instance_id': instance_id_series,
+            'instance_type': instance_type_series,
+            'timestamp': timestamp_series,
+            'cpu_load': cpu_load_series,
+            'memory_load': memory_load_series,
+            'net_output_load': net_output_load_series,
+            'avg_disk_iops': avg_disk_iops,
+            'max_disk_iops': max_disk_iops,
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+
+    def test_day_matrix(self):
+        from services.day_matrix import DayMatrix
+
+        df = self.metrics_service.load_df(
+            path=self.metrics_file_path,
+            algorithm=self.algorithm
+        )
+        step_minutes = self.algorithm.recommendation_settings. \
+            record_step_minutes
+        days = self.metrics_service.divide_by_days(
+            df=df, skip_incomplete_corner_days=True,
+            step_minutes=step_minutes)
+        expected_days = [group for _, group in df.groupby(df.index.date)]
+        # incomplete last day is skipped
+        self.assertEqual(len(days), len(expected_days) - 1)
+        for day_df, expected_day_df in zip(days, expected_days):
+            pd.testing.assert_frame_equal(day_df, expected_day_df)
+
+        metric_attrs = list(self.algorithm.metric_attributes)
+        day_matrix = DayMatrix.from_days(days=days, columns=metric_attrs,
+                                         step_minutes=step_minutes)
+        self.assertEqual(len(day_matrix), len(days))
+        self.assertEqual(list(day_matrix.dates),
+                         [np.datetime64(day.index[0].date(), 'D')
+                          for day in days])
+
+        smoothed = day_matrix.rolling_mean(window=2)
+        values, mask = day_matrix.get_padded_records(
+            day_indexes=list(range(len(days))))
+        for index, day_df in enumerate(days):
+            day_records = day_df[metric_attrs].to_numpy(dtype=np.float64)
+            np.testing.assert_array_equal(
+                day_matrix.get_day_records(day_index=index), day_records)
+            self.assertEqual(mask[index].sum(), len(day_df))
+            np.testing.assert_array_equal(values[index][mask[index]],
+                                          day_records)
+
+            expected = day_df[metric_attrs].rolling(
+                window=2, min_periods=1).mean()
+            np.testing.assert_allclose(
+                smoothed.get_day_records(day_index=index),
+                expected.to_numpy())
+
+            # records of each day are placed in their time of day slots
+            minutes = day_df.index.hour * 60 + day_df.index.minute
+            dense_slots = np.flatnonzero(day_matrix.mask[index])
+            np.testing.assert_array_equal(dense_slots,
+                                          minutes // step_minutes)
+            np.testing.assert_array_equal(
+                day_matrix.values[index][day_matrix.mask[index]],
+                day_records)
+        self.assertEqual(day_matrix.values.shape,
+                         (len(days), 24 * 60 // step_minutes,
+                          len(metric_attrs)))
+
+        # records off the step grid and days longer than 24 hours (DST
+        # end) keep all of their records
+        index = pd.date_range(
+            start=pd.Timestamp('2024-10-27', tz='Europe/Berlin'),
+            periods=25 * 60 // step_minutes, freq=f'{step_minutes}Min')
+        index = index.insert(1, index[0] + pd.Timedelta(minutes=2))
+        day_df = pd.DataFrame({attr: np.arange(len(index), dtype=float)
+                               for attr in metric_attrs}, index=index)
+        day_matrix = DayMatrix.from_days(days=[day_df], columns=metric_attrs,
+                                         step_minutes=step_minutes)
+        self.assertEqual(day_matrix.mask.sum(), len(day_df))
+        np.testing.assert_array_equal(
+            day_matrix.values[0][day_matrix.mask[0]],
+            day_df[metric_attrs].to_numpy())
+        self.assertGreater(day_matrix.slots_per_day,
+                           24 * 60 // step_minutes)
+
+        # load levels of all days are classified by cluster centroids
+        thresholds = self.algorithm.recommendation_settings.thresholds
+        labels = np.arange(len(day_df)) % 4
+        centroids = [[thresholds[0] - 1], [thresholds[1]], [],
+                     [thresholds[2] + 1]]
+        levels, mask = self.metrics_service.get_load_levels(
+            day_matrix=day_matrix, clusterings=[(labels, centroids)],
+            thresholds=thresholds)
+        np.testing.assert_array_equal(levels[0][mask[0]],
+                                      np.array([0, 2, -1, 3])[labels])
+        self.assertTrue((levels[~mask] == -1).all())
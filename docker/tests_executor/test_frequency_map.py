@@ -0,0 +1,83 @@
+import numpy as np
+
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestFrequencyMap(BaseExecutorTest):
+    def test_frequency_map(self):
+        from commons.constants import WEEK_DAYS
+        from services.schedule.active_schedule_period import \
+            ActiveSchedulePeriod
+        from services.schedule.schedule_item import ScheduleItem
+
+        step_minutes = 5
+        # (weekday, time from, time to, probability)
+        periods = [
+            # shut down at night on two Mondays
+            ('Monday', '00:00', '08:55', 0.8),
+            ('Monday', '18:00', '00:00', 0.8),
+            ('Monday', '00:00', '08:55', 0.6),
+            ('Monday', '18:00', '00:00', 0.6),
+            # running for 10 minutes only on Wednesdays
+            ('Wednesday', '00:00', '09:55', 0.5),
+            ('Wednesday', '10:10', '00:00', 0.5),
+            ('Wednesday', '00:00', '09:55', 0.5),
+            ('Wednesday', '10:10', '00:00', 0.5),
+            # single shutdown on Thursday is not frequent enough
+            ('Thursday', '12:00', '13:00', 0.9),
+        ]
+        active_schedule_periods = [
+            ActiveSchedulePeriod(instance_id='frequency_map',
+                                 weekday=weekday, time_from=time_from,
+                                 time_to=time_to, probability=probability,
+                                 action='shutdown')
+            for weekday, time_from, time_to, probability in periods]
+        # periods without an action are not counted
+        active_schedule_periods.append(ActiveSchedulePeriod(
+            instance_id='frequency_map', weekday='Friday',
+            time_from='00:00', time_to='00:00', probability=1, action=None))
+
+        frequency_map = self.schedule_service._generate_frequency_map(
+            active_schedule_periods=active_schedule_periods,
+            action='shutdown', record_step_minutes=step_minutes)
+
+        time_points = self.schedule_service._get_day_time_points(
+            record_step_minutes=step_minutes)
+        counts = np.zeros((len(WEEK_DAYS), len(time_points)))
+        probabilities = np.zeros((len(WEEK_DAYS), len(time_points)))
+        for weekday, time_from, time_to, probability in periods:
+            start_index = time_points.index(time_from)
+            end_index = time_points.index(time_to) or len(time_points) - 1
+            for index in range(start_index, end_index + 1):
+                counts[WEEK_DAYS.index(weekday), index] += 1
+                probabilities[WEEK_DAYS.index(weekday), index] += probability
+        np.testing.assert_array_equal(frequency_map.counts, counts)
+        np.testing.assert_allclose(frequency_map.probabilities,
+                                   probabilities)
+        # day views share the weekday rows of the map
+        np.testing.assert_array_equal(frequency_map['Monday'].counts,
+                                      counts[WEEK_DAYS.index('Monday')])
+
+        expected_schedules = {
+            'Monday': [ScheduleItem(weekdays=['Monday'], start='09:00',
+                                    stop='17:55', probability=0.7)],
+            'Tuesday': [ScheduleItem(weekdays=['Tuesday'], start='00:00',
+                                     stop='00:00', probability=0)],
+            'Wednesday': [],
+            # stop at the end of the day is 00:00, so the rest of the day
+            # is outside of the schedule
+            'Thursday': [ScheduleItem(weekdays=['Thursday'], start='00:00',
+                                      stop='00:00', probability=0.9)],
+        }
+        for weekday, expected_schedule in expected_schedules.items():
+            schedule = frequency_map[weekday].get_day_schedule(
+                processed_days=14)
+            self.assertEqual(schedule, expected_schedule)
+
+        # shorter periods are kept with a lower minimum duration
+        schedule = frequency_map['Wednesday'].get_day_schedule(
+            processed_days=14, minimum_duration_minutes=5)
+        self.assertEqual(schedule, [ScheduleItem(
+            weekdays=['Wednesday'], start='10:00', stop='10:05',
+            probability=0.5)])
+        self.assertIsNone(frequency_map['Holiday'])
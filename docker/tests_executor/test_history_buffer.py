@@ -0,0 +1,114 @@
+import datetime
+from unittest.mock import patch
+
+from pymongo import DeleteMany, UpdateOne
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.utils import replay_operations_for
+
+
+class TestHistoryBuffer(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        from models.recommendation_history import RecommendationHistory
+        from services.recommendation_history_service import \
+            RecommendationHistoryService
+
+        self.resource_id = 'history_buffer'
+        RecommendationHistory.objects(resource_id=self.resource_id).delete()
+        self.history_service = RecommendationHistoryService(batch_size=3)
+
+        now = datetime.datetime.utcnow()
+        # recent recommendation, its older duplicate and a recommendation
+        # with feedback, which must stay untouched
+        for job_id, added_at, feedback_status in (
+                ('job-1', now - datetime.timedelta(minutes=1), None),
+                ('job-0', now - datetime.timedelta(minutes=2), None),
+                ('job-f', now - datetime.timedelta(minutes=3), 'APPLIED')):
+            RecommendationHistory(
+                resource_id=self.resource_id,
+                resource_type='INSTANCE',
+                job_id=job_id,
+                added_at=added_at,
+                recommendation_type='SCHEDULE',
+                feedback_status=feedback_status,
+                feedback_dt=now if feedback_status else None
+            ).save()
+        self.recent_id = RecommendationHistory.objects(
+            resource_id=self.resource_id, job_id='job-1').first().id
+
+    def _create(self, actions):
+        return self.history_service.create(
+            resource_id=self.resource_id, job_id='job-2',
+            customer='customer', tenant='tenant', region='eu-central-1',
+            current_instance_type='t2.medium',
+            savings={'current_monthly_price_usd': 10},
+            schedule=[{'start': '09:00', 'stop': '18:00'}],
+            recommended_shapes=[{'name': 't3.small'}],
+            actions=actions, instance_meta={},
+            last_metric_capture_date=datetime.date.today())
+
+    @patch('services.recommendation_history_service.'
+           'RecommendationHistoryService._write_operations',
+           side_effect=replay_operations_for(
+               'models.recommendation_history.RecommendationHistory'))
+    def test_history_buffer(self, write_operations):
+        from models.recommendation_history import RecommendationHistory
+
+        items = self._create(actions=['SCHEDULE', 'SCALE_DOWN'])
+        self.assertFalse(self.history_service.save_buffered(
+            recommendations=items))
+        # nothing is written until the batch size is reached
+        self.assertEqual(RecommendationHistory.objects(
+            resource_id=self.resource_id).count(), 3)
+
+        items.extend(self._create(actions=['SCALE_DOWN']))
+        self.assertTrue(self.history_service.save_buffered(
+            recommendations=items[2:]))
+        operations = write_operations.call_args.kwargs['operations']
+        # the older duplicate is deleted before the updates
+        self.assertIsInstance(operations[0], DeleteMany)
+        self.assertEqual([type(operation) for operation in operations[1:]],
+                         [UpdateOne] * 3)
+        # the second scale down item updates the document upserted by
+        # the first one
+        self.assertEqual(
+            [bool(operation._upsert) for operation in operations[1:]],
+            [False, True, False])
+
+        documents = {
+            (item.job_id, item.recommendation_type.value): item
+            for item in RecommendationHistory.objects(
+                resource_id=self.resource_id)
+        }
+        self.assertEqual(set(documents), {
+            ('job-2', 'SCHEDULE'), ('job-2', 'SCALE_DOWN'),
+            ('job-f', 'SCHEDULE')})
+        schedule = documents[('job-2', 'SCHEDULE')]
+        self.assertEqual(schedule.id, self.recent_id)
+        self.assertEqual(schedule.recommendation,
+                         [{'start': '09:00', 'stop': '18:00'}])
+        # both scale down items are upserted into a single document
+        scale_down = documents[('job-2', 'SCALE_DOWN')]
+        self.assertEqual([item.id for item in items],
+                         [self.recent_id, scale_down.id, scale_down.id])
+        self.assertEqual(scale_down.current_month_price_usd, 10)
+
+        # feedback fields of the upsert filter are not inserted
+        inserted = RecommendationHistory._get_collection().find_one(
+            {'_id': scale_down.id})
+        self.assertNotIn('feedback_dt', inserted)
+        self.assertNotIn('feedback_status', inserted)
+
+        self.history_service.flush()
+        self.assertEqual(write_operations.call_count, 1)
+
+        # items of a failed tenant are dropped, not flushed with the
+        # next tenant
+        self.assertFalse(self.history_service.save_buffered(
+            recommendations=self._create(actions=['SCHEDULE'])))
+        self.history_service.clear_buffer()
+        self.history_service.flush()
+        self.assertEqual(write_operations.call_count, 1)
+        self.assertEqual(RecommendationHistory.objects(
+            resource_id=self.resource_id).count(), 3)
@@ -0,0 +1,179 @@
+import json
+import os
+import shutil
+from collections import Counter
+from types import SimpleNamespace
+from unittest.mock import patch, MagicMock
+
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series,
+                                  replay_operations_for)
+
+JOB_ID = 'job_resume'
+TENANT = 'TENANT'
+REGION = 'eu-central-1'
+INSTANCE_IDS = ('job_resume_0', 'job_resume_1', 'job_resume_2',
+                'job_resume_3')
+
+
+class TestJobResume(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        from models.job_journal import JobJournalItem
+        from models.recommendation_history import RecommendationHistory
+
+        self.algorithm.resource_type = 'INSTANCE'
+        # shape prices are not populated, savings are mocked instead
+        self.algorithm.recommendation_settings.ignore_savings = False
+        self.work_dir = os.path.join(self.metrics_dir_root, JOB_ID)
+        self.tenant_dir = os.path.join(self.work_dir, 'metrics', 'instance',
+                                       'customer', 'aws', TENANT)
+        length = POINTS_IN_DAY * 14
+        self.metrics = {}
+        for index, instance_id in enumerate(INSTANCE_IDS):
+            self.metrics[instance_id] = pd.DataFrame({
+                'instance_id': constant_to_series(instance_id, length),
+                'instance_type': constant_to_series('t2.medium', length),
+                'timestamp': generate_timestamp_series(length=length),
+                'cpu_load': generate_constant_metric_series(
+                    distribution='normal', loc=30 + index * 10, scale=1,
+                    size=length),
+                'memory_load': generate_constant_metric_series(
+                    distribution='normal', loc=40, scale=0.8, size=length),
+                'net_output_load': constant_to_series(1024, length),
+                'avg_disk_iops': constant_to_series(-1, length),
+                'max_disk_iops': constant_to_series(-1, length),
+            })
+        JobJournalItem.objects(job_id=JOB_ID).delete()
+        RecommendationHistory.objects(job_id=JOB_ID).delete()
+        self.excluded = []
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _download_metrics(self, output_path, exclude_instance_ids, **kwargs):
+        self.excluded.append(sorted(exclude_instance_ids))
+        date_dir = os.path.join(self.tenant_dir, REGION, 'date')
+        os.makedirs(date_dir, exist_ok=True)
+        for instance_id, df in self.metrics.items():
+            if instance_id not in exclude_instance_ids:
+                df.to_csv(os.path.join(date_dir, f'{instance_id}.csv'),
+                          index=False)
+        return {}, {}
+
+    def _run(self, reports_dir, fail_after=None):
+        import executor
+        from models.parent_attributes import LicensesParentMeta
+
+        process_instances = executor.process_instances
+
+        def interrupted_process_instances(**kwargs):
+            # the job is killed after the given amount of instances
+            for index, item in enumerate(process_instances(**kwargs)):
+                if index == fail_after:
+                    raise RuntimeError('Job interrupted')
+                yield item
+
+        licensed_application = SimpleNamespace(
+            customer_id='customer', meta=SimpleNamespace(cloud='AWS'))
+        history_service = executor.recommendation_service. \
+            recommendation_history_service
+        self.journal_writes = MagicMock(side_effect=replay_operations_for(
+            'models.job_journal.JobJournalItem'))
+        with patch('executor.JOB_ID', JOB_ID), \
+                patch.dict(os.environ, {'STREAM_METRICS': 'false',
+                                        'AWS_BATCH_JOB_ID': JOB_ID}), \
+                patch.object(executor.recommendation_service.saving_service,
+                             'calculate_savings', return_value={}), \
+                patch.object(executor.storage_service, 'download_metrics',
+                             side_effect=self._download_metrics), \
+                patch.object(executor.storage_service, 'upload_job_results',
+                             MagicMock()), \
+                patch.object(history_service, 'batch_size', 1), \
+                patch('services.recommendation_history_service.'
+                      'RecommendationHistoryService._write_operations',
+                      side_effect=replay_operations_for(
+                          'models.recommendation_history.'
+                          'RecommendationHistory')), \
+                patch('services.job_journal_service.'
+                      'JobJournalService._write_operations',
+                      self.journal_writes), \
+                patch('executor.process_instances',
+                      interrupted_process_instances):
+            try:
+                executor.process_tenant_instances(
+                    metrics_dir=os.path.join(self.work_dir, 'metrics'),
+                    reports_dir=reports_dir,
+                    input_storage=SimpleNamespace(name='input'),
+                    output_storage=SimpleNamespace(name='output'),
+                    parent_meta=LicensesParentMeta(),
+                    application=None,
+                    licensed_application=licensed_application,
+                    algorithm=self.algorithm,
+                    tenant=TENANT)
+            finally:
+                executor.recommendation_service.close_reports()
+                shutil.rmtree(os.path.join(self.work_dir, 'metrics'))
+
+    def _read_reports(self, reports_dir):
+        file_path = os.path.join(reports_dir, 'customer', 'aws', TENANT,
+                                 f'{REGION}.jsonl')
+        with open(file_path) as f:
+            return [json.loads(line) for line in f]
+
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_job_resume(self):
+        from models.job_journal import JobJournalItem
+        from models.recommendation_history import RecommendationHistory
+
+        first_reports_dir = os.path.join(self.work_dir, 'reports_1')
+        with self.assertRaises(RuntimeError):
+            self._run(reports_dir=first_reports_dir, fail_after=2)
+        journaled = sorted(item.resource_id for item in
+                           JobJournalItem.objects(job_id=JOB_ID))
+        self.assertEqual(len(journaled), 2)
+        history = RecommendationHistory.objects(job_id=JOB_ID)
+        self.assertEqual({item.resource_id for item in history},
+                         set(journaled))
+
+        # restarted job gets a new work dir, reports of the journaled
+        # instances are restored from the journal
+        reports_dir = os.path.join(self.work_dir, 'reports_2')
+        self._run(reports_dir=reports_dir)
+        self.assertEqual(self.excluded, [[], journaled])
+        # remaining instances are journaled with bulk upserts
+        journaled_ids = [
+            operation._filter['resource_id']
+            for call in self.journal_writes.call_args_list
+            for operation in call.kwargs['operations']
+        ]
+        self.assertEqual(sorted(journaled_ids),
+                         sorted(set(INSTANCE_IDS) - set(journaled)))
+        for call in self.journal_writes.call_args_list:
+            self.assertTrue(all(operation._upsert for operation in
+                                call.kwargs['operations']))
+
+        reports = self._read_reports(reports_dir=reports_dir)
+        self.assertEqual(sorted(report['resource_id'] for report in reports),
+                         sorted(INSTANCE_IDS))
+        first_reports = {report['resource_id']: report for report in
+                         self._read_reports(reports_dir=first_reports_dir)}
+        for report in reports:
+            if report['resource_id'] in journaled:
+                self.assertEqual(report, first_reports[report['resource_id']])
+        self.assertEqual(sorted(item.resource_id for item in
+                                JobJournalItem.objects(job_id=JOB_ID)),
+                         sorted(INSTANCE_IDS))
+
+        # history items of each instance are saved once
+        history = RecommendationHistory.objects(job_id=JOB_ID)
+        self.assertEqual({item.resource_id for item in history},
+                         set(INSTANCE_IDS))
+        counts = Counter((item.resource_id, item.recommendation_type)
+                         for item in history)
+        self.assertEqual(set(counts.values()), {1})
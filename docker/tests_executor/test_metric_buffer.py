@@ -0,0 +1,110 @@
+import os
+import shutil
+
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series,
+                                  InMemoryS3Client)
+
+
+class TestMetricBuffer(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'metric_buffer'
+
+        length = POINTS_IN_DAY * 14
+        df = pd.DataFrame({
+            'instance_id': constant_to_series(value=self.instance_id,
+                                              length=length),
+            'instance_type': constant_to_series(value='t2.medium',
+                                                length=length),
+            'timestamp': generate_timestamp_series(length=length),
+            'cpu_load': generate_constant_metric_series(
+                distribution='normal', loc=50, scale=1, size=length),
+            'memory_load': generate_constant_metric_series(
+                distribution='normal', loc=60, scale=0.8, size=length),
+            'net_output_load': constant_to_series(1024, length),
+            'avg_disk_iops': constant_to_series(-1, length),
+            'max_disk_iops': constant_to_series(-1, length),
+        })
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+
+        self.objects = {}
+        for day in range(14):
+            day_df = df.iloc[day * POINTS_IN_DAY:(day + 1) * POINTS_IN_DAY]
+            s3_key = (f'metrics/buffer/customer/aws/tenant/region/'
+                      f'2024-01-{day + 1:02}/{self.instance_id}.csv')
+            self.objects[s3_key] = day_df.to_csv(index=False).encode()
+        self.output_path = os.path.join(self.metrics_dir_root, 'buffer')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.output_path, ignore_errors=True)
+
+    def test_metric_buffer(self):
+        from services.metric_buffer import MetricBuffer, MemoryCeiling
+        from services.storage_service import StorageService
+
+        storage_service = StorageService(
+            s3_client=InMemoryS3Client(objects=self.objects))
+        day_size = max(len(content) for content in self.objects.values())
+        memory_ceiling = MemoryCeiling(limit_bytes=day_size * 10)
+        instance_files = storage_service._iter_instance_downloads_s3(
+            bucket_name='bucket', prefix='metrics',
+            output_path=self.output_path,
+            instance_keys_map={self.instance_id: sorted(self.objects)},
+            buffer_size=1, memory_ceiling=memory_ceiling,
+            key_sizes={key: len(content)
+                       for key, content in self.objects.items()})
+
+        instance_id, metric_files = next(instance_files)
+        self.assertEqual(instance_id, self.instance_id)
+        buffers = [item for item in metric_files
+                   if isinstance(item, MetricBuffer)]
+        file_paths = [item for item in metric_files
+                      if not isinstance(item, MetricBuffer)]
+        # memory is reserved by listed sizes before the download,
+        # files above the memory ceiling are spilled to disk
+        self.assertEqual(len(buffers), 10)
+        self.assertEqual(len(file_paths), 4)
+        self.assertTrue(all(os.path.isfile(path) for path in file_paths))
+        self.assertFalse(any(os.path.exists(item.path) for item in buffers))
+
+        merged_file_path = self.metrics_service.merge_instance_metric_files(
+            metric_files=metric_files, algorithm=self.algorithm)
+        self.assertEqual(merged_file_path, max(
+            getattr(item, 'path', item) for item in metric_files))
+        merged_df = self.metrics_service.read_metrics(
+            metric_file_path=merged_file_path, algorithm=self.algorithm)
+        file_df = self.metrics_service.read_metrics(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm)
+        pd.testing.assert_frame_equal(merged_df.reset_index(drop=True),
+                                      file_df.reset_index(drop=True))
+
+        # buffers are released once the next instance is requested
+        self.assertIsNone(next(instance_files, None))
+        self.assertEqual(memory_ceiling.used_bytes, 0)
+
+        # reserved memory is released if the consumer stops iterating,
+        # including downloads of instances not consumed yet
+        memory_ceiling = MemoryCeiling(limit_bytes=day_size * 28)
+        keys = sorted(self.objects)
+        instance_files = storage_service._iter_instance_downloads_s3(
+            bucket_name='bucket', prefix='metrics',
+            output_path=self.output_path,
+            instance_keys_map={'first': keys, 'second': keys},
+            buffer_size=2, memory_ceiling=memory_ceiling,
+            key_sizes={key: len(content)
+                       for key, content in self.objects.items()})
+        _, metric_files = next(instance_files)
+        self.assertTrue(all(isinstance(item, MetricBuffer)
+                            for item in metric_files))
+        instance_files.close()
+        self.assertEqual(memory_ceiling.used_bytes, 0)
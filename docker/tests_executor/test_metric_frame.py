@@ -0,0 +1,111 @@
+import os
+from unittest.mock import patch
+
+import pandas as pd
+
+from commons.constants import ACTION_EMPTY
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse)
+
+
+class TestMetricFrame(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'metric_frame'
+
+        length = POINTS_IN_DAY * 14
+        instance_id_series = constant_to_series(
+            value=self.instance_id,
+            length=length
+        )
+        instance_type_series = constant_to_series(
+            value='t2.medium',
+            length=length
+        )
+        timestamp_series = generate_timestamp_series(length=length)
+        cpu_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=50,
+            scale=1,
+            size=length
+        )
+        memory_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=60,
+            scale=0.8,
+            size=length
+        )
+        # absolute network output in bytes
+        net_output_load_series = constant_to_series(100 * 1024 * 1024,
+                                                    length)
+        avg_disk_iops = constant_to_series(-1, length)
+        max_disk_iops = constant_to_series(-1, length)
+        df_data = {
+            'instance_id': instance_id_series,
+            'instance_type': instance_type_series,
+            'timestamp': timestamp_series,
+            'cpu_load': cpu_load_series,
+            'memory_load': memory_load_series,
+            'net_output_load': net_output_load_series,
+            'avg_disk_iops': avg_disk_iops,
+            'max_disk_iops': max_disk_iops,
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+        self.create_plots()
+
+        from services.reformat_service import ReformatService
+        self.reformat_service = ReformatService(
+            shape_service=self.shape_service,
+            metrics_service=self.metrics_service
+        )
+
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_metric_frame(self):
+        metric_frame = self.metrics_service.validate_metric_file(
+            algorithm=self.algorithm,
+            metric_file_path=self.metrics_file_path)
+        self.reformat_service.to_relative_values(
+            metrics_file_path=self.metrics_file_path,
+            algorithm=self.algorithm,
+            metric_frame=metric_frame)
+
+        frame_result, _ = self.recommendation_service.process_instance(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm,
+            reports_dir=self.reports_path,
+            metric_frame=metric_frame
+        )
+
+        # legacy flow: relative values are written back to the metric file
+        self.reformat_service.to_relative_values(
+            metrics_file_path=self.metrics_file_path,
+            algorithm=self.algorithm)
+        file_df = self.metrics_service.read_metrics(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm,
+            parse_index=False)
+        pd.testing.assert_frame_equal(metric_frame.df, file_df)
+
+        file_result, _ = self.recommendation_service.process_instance(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm,
+            reports_dir=self.reports_path
+        )
+
+        self.assert_resource_id(
+            result=frame_result,
+            resource_id=self.instance_id
+        )
+        self.assert_stats(result=frame_result)
+        self.assert_action(result=frame_result,
+                           expected_actions=[ACTION_EMPTY])
+        self.assertEqual(frame_result, file_result)
@@ -0,0 +1,176 @@
+import os
+import shutil
+from unittest.mock import patch
+
+import pandas as pd
+
+from commons.constants import ACTION_EMPTY
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse)
+
+
+class TestMetricStore(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'metric_store'
+
+        length = POINTS_IN_DAY * 14
+        instance_id_series = constant_to_series(
+            value=self.instance_id,
+            length=length
+        )
+        instance_type_series = constant_to_series(
+            value='t2.medium',
+            length=length
+        )
+        timestamp_series = generate_timestamp_series(length=length)
+        cpu_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=50,
+            scale=1,
+            size=length
+        )
+        memory_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=60,
+            scale=0.8,
+            size=length
+        )
+        # absolute network output in bytes
+        net_output_load_series = constant_to_series(100 * 1024 * 1024,
+                                                    length)
+        avg_disk_iops = constant_to_series(-1, length)
+        max_disk_iops = constant_to_series(-1, length)
+        df_data = {
+            'instance_id': instance_id_series,
+            'instance_type': instance_type_series,
+            'timestamp': timestamp_series,
+            'cpu_load': cpu_load_series,
+            'memory_load': memory_load_series,
+            'net_output_load': net_output_load_series,
+            'avg_disk_iops': avg_disk_iops,
+            'max_disk_iops': max_disk_iops,
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+
+        self.daily_dirs = []
+        self.daily_file_paths = []
+        self._write_daily_files(df=df)
+
+    def _write_daily_files(self, df):
+        region_dir = os.path.dirname(self.metrics_dir)
+        self.daily_dirs.clear()
+        self.daily_file_paths.clear()
+        for day in range(14):
+            day_df = df.iloc[day * POINTS_IN_DAY:(day + 1) * POINTS_IN_DAY]
+            day_dir = os.path.join(region_dir, f'store_day_{day:02}')
+            os.makedirs(day_dir, exist_ok=True)
+            day_file_path = os.path.join(day_dir, f'{self.instance_id}.csv')
+            day_df.to_csv(day_file_path, sep=',', index=False)
+            self.daily_dirs.append(day_dir)
+            self.daily_file_paths.append(day_file_path)
+
+    def tearDown(self) -> None:
+        for day_dir in self.daily_dirs:
+            shutil.rmtree(day_dir, ignore_errors=True)
+
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_metric_store(self):
+        from services.metric_store import MetricStore
+
+        merged_file_path = self.metrics_service.merge_instance_metric_files(
+            metric_files=self.daily_file_paths,
+            algorithm=self.algorithm)
+        self.assertEqual(merged_file_path, self.daily_file_paths[-1])
+        self.assertIsNotNone(MetricStore.read(merged_file_path))
+        # merged file and its store both hold all days
+        self.assertEqual(len(pd.read_csv(merged_file_path)), len(self.df))
+        self.assertEqual(len(MetricStore.read(merged_file_path)),
+                         len(self.df))
+        for file_path in self.daily_file_paths[:-1]:
+            self.assertFalse(os.path.exists(file_path))
+
+        store_df = self.metrics_service.read_metrics(
+            metric_file_path=merged_file_path,
+            algorithm=self.algorithm)
+        file_df = self.metrics_service.read_metrics(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm)
+        pd.testing.assert_frame_equal(store_df.reset_index(drop=True),
+                                      file_df.reset_index(drop=True))
+        self.assertTrue((store_df.index == file_df.index).all())
+
+        store_result, _ = self.recommendation_service.process_instance(
+            metric_file_path=merged_file_path,
+            algorithm=self.algorithm,
+            reports_dir=self.reports_path
+        )
+        file_result, _ = self.recommendation_service.process_instance(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm,
+            reports_dir=self.reports_path
+        )
+        self.assert_resource_id(
+            result=store_result,
+            resource_id=self.instance_id
+        )
+        self.assert_action(result=store_result,
+                           expected_actions=[ACTION_EMPTY])
+        self.assertEqual(store_result, file_result)
+
+        # metric file rewritten from the store data invalidates the
+        # store and is parsed again with all of its days
+        self.metrics_service.write_metric_file(
+            df=self.metrics_service.read_metrics(
+                metric_file_path=merged_file_path,
+                algorithm=self.algorithm, parse_index=False),
+            metric_file_path=merged_file_path,
+            algorithm=self.algorithm)
+        self.assertIsNone(MetricStore.read(merged_file_path))
+        rewritten_df = self.metrics_service.read_metrics(
+            metric_file_path=merged_file_path,
+            algorithm=self.algorithm)
+        pd.testing.assert_frame_equal(rewritten_df, file_df,
+                                      check_categorical=False)
+
+        # store is built for a single daily file as well
+        self._write_daily_files(df=pd.read_csv(self.metrics_file_path))
+        merged_file_path = self.metrics_service.merge_instance_metric_files(
+            metric_files=self.daily_file_paths[-1:],
+            algorithm=self.algorithm)
+        self.assertEqual(merged_file_path, self.daily_file_paths[-1])
+        self.assertEqual(len(MetricStore.read(merged_file_path)),
+                         POINTS_IN_DAY)
+
+        # same-size rewrite keeping the mtime makes the store stale
+        stat = os.stat(merged_file_path)
+        with open(merged_file_path, 'rb') as f:
+            content = f.read()
+        last = content.rstrip(b'\n')[-1:]
+        with open(merged_file_path, 'wb') as f:
+            f.write(content.rstrip(b'\n')[:-1] +
+                    (b'1' if last != b'1' else b'2') +
+                    content[len(content.rstrip(b'\n')):])
+        os.utime(merged_file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(os.stat(merged_file_path).st_size, stat.st_size)
+        self.assertIsNone(MetricStore.read(merged_file_path))
+
+        with patch.object(MetricStore, 'write', side_effect=OSError):
+            merged_file_path = \
+                self.metrics_service.merge_instance_metric_files(
+                    metric_files=self.daily_file_paths,
+                    algorithm=self.algorithm)
+        self.assertIsNone(MetricStore.read(merged_file_path))
+        # merged csv is read once the store can not be built
+        self.assertEqual(len(pd.read_csv(merged_file_path)), len(self.df))
+        for file_path in self.daily_file_paths[:-1]:
+            self.assertFalse(os.path.exists(file_path))
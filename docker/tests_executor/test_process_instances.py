@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series,
+                                  init_shapes_worker)
+
+LOADS = (30, 40, 50, 60)
+
+
+class TestProcessInstances(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.instances_dir = os.path.join(self.metrics_dir_root,
+                                          'process_instances')
+        os.makedirs(self.instances_dir, exist_ok=True)
+        length = POINTS_IN_DAY * 14
+        self.metric_file_paths = []
+        for index, load in enumerate(LOADS):
+            instance_id = f'process_instances_{index}'
+            df = pd.DataFrame({
+                'instance_id': constant_to_series(instance_id, length),
+                'instance_type': constant_to_series('t2.medium', length),
+                'timestamp': generate_timestamp_series(length=length),
+                'cpu_load': generate_constant_metric_series(
+                    distribution='normal', loc=load, scale=1, size=length),
+                'memory_load': generate_constant_metric_series(
+                    distribution='normal', loc=load, scale=0.8,
+                    size=length),
+                'net_output_load': constant_to_series(1024, length),
+                'avg_disk_iops': constant_to_series(-1, length),
+                'max_disk_iops': constant_to_series(-1, length),
+            })
+            metric_file_path = os.path.join(self.instances_dir,
+                                            f'{instance_id}.csv')
+            df.to_csv(metric_file_path, sep=',', index=False)
+            self.metric_file_paths.append(metric_file_path)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.instances_dir, ignore_errors=True)
+
+    def _process(self, workers, metric_file_paths=None, environ=None):
+        import executor
+
+        contexts = []
+        with open(self._get_aws_instance_data_path(), 'r') as f:
+            aws_instances_data = json.load(f)
+
+        class RecordingProcessPoolExecutor(ProcessPoolExecutor):
+            def __init__(self, max_workers, initializer, initargs,
+                         mp_context):
+                contexts.append(mp_context.get_start_method())
+                super().__init__(max_workers=max_workers,
+                                 mp_context=mp_context,
+                                 initializer=init_shapes_worker,
+                                 initargs=(initializer, initargs,
+                                           aws_instances_data))
+
+        environ = {'EXECUTOR_WORKERS': str(workers), 'mock': 'true',
+                   'r8s_mongodb_connection_uri': 'mongodb://localhost/testdb',
+                   **(environ or {})}
+        if metric_file_paths is None:
+            metric_file_paths = iter(self.metric_file_paths)
+        with patch.dict(os.environ, environ), \
+                patch('executor.ProcessPoolExecutor',
+                      RecordingProcessPoolExecutor):
+            # metric files are given lazily, as they are streamed
+            results = list(executor.process_instances(
+                metric_file_paths=metric_file_paths,
+                algorithm=self.algorithm, reports_dir=self.reports_path,
+                instance_meta_mapping={}, parent_meta=None,
+                feedback_mapping={}))
+        return contexts, results
+
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_process_instances(self):
+        contexts, serial_results = self._process(workers=1)
+        self.assertEqual(contexts, [])
+
+        contexts, results = self._process(workers=2)
+        # workers are started without forking the current process
+        self.assertEqual(contexts, ['forkserver'])
+        # results are yielded in the order of submission
+        self.assertEqual([item[0] for item in results],
+                         self.metric_file_paths)
+        for _, result, _, is_valid in results:
+            self.assertTrue(is_valid)
+            self.assert_stats(result=result)
+        self.assertEqual(results, serial_results)
+
+        consumed = []
+
+        def metric_file_paths():
+            for metric_file_path in self.metric_file_paths:
+                consumed.append(metric_file_path)
+                yield metric_file_path
+
+        import executor
+        yielded = []
+        original = executor.process_instances
+
+        def recording_process_instances(**kwargs):
+            for item in original(**kwargs):
+                yielded.append(len(consumed))
+                yield item
+
+        with patch('executor.process_instances',
+                   recording_process_instances):
+            _, results = self._process(
+                workers=2, metric_file_paths=metric_file_paths(),
+                environ={'METRICS_STREAM_BUFFER': '0'})
+        self.assertEqual([item[0] for item in results],
+                         self.metric_file_paths)
+        # at most workers + buffer instances are submitted ahead, the
+        # next one is taken only after the head instance is yielded
+        self.assertLessEqual(yielded[0], 3)
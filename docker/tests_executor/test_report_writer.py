@@ -0,0 +1,61 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestReportWriter(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.reports_dir = os.path.join(self.metrics_dir_root, 'reports')
+        self.tenant_dir = os.path.join(self.reports_dir, 'customer', 'aws',
+                                       'tenant')
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.reports_dir, ignore_errors=True)
+
+    def _write(self, writer, region, index):
+        writer.write(reports_dir=self.reports_dir, customer='customer',
+                     cloud='aws', tenant='tenant', region=region,
+                     item={'resource_id': f'{region}-{index}'})
+
+    def _read(self, region):
+        with open(os.path.join(self.tenant_dir, f'{region}.jsonl')) as f:
+            return [json.loads(line) for line in f]
+
+    def test_report_writer(self):
+        from services.report_writer import ReportWriter
+
+        regions = ('eu-central-1', 'eu-west-1')
+        writer = ReportWriter()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            for index in range(500):
+                for region in regions:
+                    executor.submit(self._write, writer, region, index)
+        # items are buffered until the writer is closed
+        self.assertEqual(self._read(regions[0]), [])
+        writer.close()
+        for region in regions:
+            self.assertEqual(
+                sorted(item['resource_id'] for item in self._read(region)),
+                sorted(f'{region}-{index}' for index in range(500)))
+
+        # files are reopened in append mode after the writer is closed
+        self._write(writer, regions[0], 500)
+        writer.close()
+        self.assertEqual(len(self._read(regions[0])), 501)
+        self.assertEqual(len(self._read(regions[1])), 500)
+
+        # items are written as compact json lines
+        item = {'resource_id': 'nested', 'stats': {'load': [0.5, None]}}
+        writer.write(reports_dir=self.reports_dir, customer='customer',
+                     cloud='aws', tenant='tenant', region=regions[1],
+                     item=item)
+        writer.close()
+        with open(os.path.join(self.tenant_dir, f'{regions[1]}.jsonl'),
+                  'rb') as f:
+            last_line = f.readlines()[-1]
+        self.assertEqual(last_line, json.dumps(
+            item, separators=(',', ':')).encode() + b'\n')
@@ -0,0 +1,57 @@
+import gzip
+import os
+import shutil
+from types import SimpleNamespace
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.utils import InMemoryS3Client
+
+
+class TestResultsUpload(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.results_dir = os.path.join(self.metrics_dir_root, 'results')
+        self.reports = {}
+        for tenant in ('tenant_1', 'tenant_2'):
+            tenant_dir = os.path.join(self.results_dir, 'customer', 'AWS',
+                                      tenant)
+            os.makedirs(tenant_dir, exist_ok=True)
+            for region in ('eu-central-1', 'eu-west-1'):
+                file_path = os.path.join(tenant_dir, f'{region}.jsonl')
+                content = f'{{"tenant": "{tenant}"}}\n'.encode() * 100
+                with open(file_path, 'wb') as f:
+                    f.write(content)
+                self.reports[f'job/customer/AWS/{tenant}/{region}.jsonl'] = \
+                    content
+        self.storage = SimpleNamespace(access=SimpleNamespace(
+            prefix=None, bucket_name='bucket'))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.results_dir, ignore_errors=True)
+
+    def _upload(self, compress, tenant=None):
+        from services.storage_service import StorageService
+
+        s3_client = InMemoryS3Client()
+        StorageService(s3_client=s3_client)._upload_job_results_s3(
+            job_id='job', storage=self.storage,
+            results_folder_path=self.results_dir, tenant=tenant,
+            compress=compress)
+        return {key: (content, s3_client.content_encodings[key])
+                for key, content in s3_client.objects.items()}
+
+    def test_results_upload(self):
+        objects = self._upload(compress=False)
+        self.assertEqual(objects, {key: (content, 'utf-8') for key, content
+                                   in self.reports.items()})
+
+        objects = self._upload(compress=True, tenant='tenant_1')
+        self.assertEqual(set(objects), {key for key in self.reports
+                                        if '/tenant_1/' in key})
+        for key, (content, content_encoding) in objects.items():
+            self.assertEqual(content_encoding, 'gzip')
+            self.assertLess(len(content), len(self.reports[key]))
+            self.assertEqual(gzip.decompress(content), self.reports[key])
+        # temporary compressed files are removed
+        for _, _, files in os.walk(self.results_dir):
+            self.assertTrue(all(file.endswith('.jsonl') for file in files))
@@ -0,0 +1,69 @@
+import os
+import shutil
+import time
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.utils import InMemoryS3Client
+
+
+class TestS3ObjectCache(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.cache_dir = os.path.join(self.metrics_dir_root, 's3_cache')
+        self.output_dir = os.path.join(self.metrics_dir_root, 's3_output')
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.objects = {f'metrics/2024-01-0{day}/instance.csv':
+                        f'day {day}'.encode() * 10 for day in range(1, 4)}
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def _download_all(self, object_cache):
+        from services.storage_service import StorageService
+
+        s3_client = InMemoryS3Client(objects=self.objects)
+        storage_service = StorageService(s3_client=s3_client,
+                                         object_cache=object_cache)
+        for s3_key in sorted(self.objects):
+            file_path = storage_service._download_file(
+                bucket_name='bucket', s3_key=s3_key,
+                output_folder_path=self.output_dir)
+            with open(file_path, 'rb') as f:
+                self.assertEqual(f.read(), self.objects[s3_key])
+            # keeps the order of use of cache entries apart
+            time.sleep(0.01)
+        return s3_client.downloaded_keys
+
+    def test_s3_object_cache(self):
+        from services.s3_object_cache import S3ObjectCache, TMP_EXTENSION
+
+        keys = sorted(self.objects)
+        # without the cache objects are always downloaded
+        self.assertEqual(self._download_all(None), keys)
+        self.assertEqual(self._download_all(
+            S3ObjectCache(cache_dir=self.cache_dir, max_size_bytes=1024)),
+            keys)
+        # unchanged objects are taken from the cache of the previous job
+        object_cache = S3ObjectCache(cache_dir=self.cache_dir,
+                                     max_size_bytes=1024)
+        self.assertEqual(object_cache.size_bytes, 150)
+        self.assertEqual(self._download_all(object_cache), [])
+
+        self.objects[keys[-1]] = b'updated'
+        self.assertEqual(self._download_all(object_cache), [keys[-1]])
+
+        # least recently used entries are evicted above the size limit
+        object_cache = S3ObjectCache(cache_dir=self.cache_dir,
+                                     max_size_bytes=200)
+        self.objects[keys[-1]] = b'updated' * 20
+        self.assertEqual(self._download_all(object_cache), [keys[-1]])
+        self.assertEqual(object_cache.size_bytes, 190)
+        self.assertIsNone(object_cache.get_etag(bucket_name='bucket',
+                                                key=keys[0]))
+        self.assertIsNotNone(object_cache.get_etag(bucket_name='bucket',
+                                                   key=keys[1]))
+        # temporary files are replaced by the entries
+        self.assertFalse([file_name for file_name in
+                          os.listdir(self.cache_dir)
+                          if file_name.endswith(TMP_EXTENSION)])
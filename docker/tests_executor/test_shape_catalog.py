@@ -0,0 +1,70 @@
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestShapeCatalog(BaseExecutorTest):
+    def test_shape_catalog(self):
+        from models.base_model import CloudEnum
+        from models.shape import Shape
+        from services.shape_catalog import ShapeCatalog
+
+        catalog = self.shape_service.get_catalog(
+            cloud=CloudEnum.CLOUD_AWS.value,
+            resource_type=self.algorithm.resource_type)
+        # catalog is loaded once per cloud and resource type
+        self.assertIs(catalog, self.shape_service.get_catalog(
+            cloud=CloudEnum.CLOUD_AWS.value,
+            resource_type=self.algorithm.resource_type))
+        self.assertEqual(len(catalog), len(self.shape_service.list(
+            cloud=CloudEnum.CLOUD_AWS.value)))
+        self.assertEqual(catalog.get('t3.2xlarge').name, 't3.2xlarge')
+        self.assertIsNone(catalog.get('unknown.shape'))
+
+        ranges = {
+            'cpu_min': 2, 'cpu_max': 8,
+            'memory_min': 4, 'memory_max': 32,
+            'net_output_min': 1000, 'disk_iops_min': 5000
+        }
+        shapes = catalog.shapes[::2]
+        is_suitable = catalog.get_suitable_mask(
+            positions=catalog.get_positions(shapes=shapes), **ranges)
+
+        expected = [
+            2 <= shape.cpu <= 8 and 4 <= shape.memory <= 32
+            and bool(shape.network_throughput)
+            and shape.network_throughput >= 1000
+            and bool(shape.iops) and shape.iops >= 5000
+            for shape in shapes
+        ]
+        self.assertEqual(is_suitable.tolist(), expected)
+        self.assertTrue(any(expected))
+
+        positions = catalog.get_positions(shapes=shapes)
+        is_series = catalog.get_prefix_mask(positions=positions, prefix='t3.')
+        self.assertEqual(is_series.tolist(),
+                         [shape.name.startswith('t3.') for shape in shapes])
+        self.assertTrue(is_series.any())
+        is_family = catalog.get_family_mask(positions=positions,
+                                            family_type=shapes[0].family_type)
+        self.assertEqual(
+            is_family.tolist(),
+            [shape.family_type == shapes[0].family_type for shape in shapes])
+        self.assertEqual(
+            catalog.sort_by_size(shapes=shapes, positions=positions),
+            sorted(shapes, key=lambda shape: (shape.cpu, shape.memory)))
+
+        # shapes outside of the catalog are indexed separately
+        unknown_shape = Shape(name='unknown.shape', cpu=4, memory=16)
+        shapes_catalog = ShapeCatalog.for_shapes(
+            shapes=shapes + [unknown_shape], catalog=catalog)
+        self.assertIsNot(shapes_catalog, catalog)
+        self.assertEqual(
+            shapes_catalog.get_positions(shapes=[unknown_shape]).tolist(),
+            [len(shapes)])
+        self.assertIs(ShapeCatalog.for_shapes(shapes=shapes, catalog=catalog),
+                      catalog)
+
+        # catalogs are reloaded once cleared
+        self.shape_service.clear_catalogs()
+        self.assertIsNot(catalog, self.shape_service.get_catalog(
+            cloud=CloudEnum.CLOUD_AWS.value,
+            resource_type=self.algorithm.resource_type))
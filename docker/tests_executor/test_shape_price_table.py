@@ -0,0 +1,49 @@
+from unittest.mock import patch
+
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestShapePriceTable(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        from models.shape_price import ShapePrice, DEFAULT_CUSTOMER, OSEnum
+
+        prices = [
+            (DEFAULT_CUSTOMER, 't3.small', 'eu-central-1', 0.024),
+            (DEFAULT_CUSTOMER, 't3.medium', 'eu-central-1', 0.048),
+            (DEFAULT_CUSTOMER, 't3.medium', 'eu-west-1', 0.046),
+            ('test', 't3.medium', 'eu-central-1', 0.04),
+            ('other', 't3.small', 'eu-central-1', 0.02),
+        ]
+        for customer, name, region, on_demand in prices:
+            ShapePrice(customer=customer, cloud='AWS', name=name,
+                       region=region, os=OSEnum.OS_LINUX,
+                       on_demand=on_demand).save()
+
+    def test_shape_price_table(self):
+        from models.shape_price import ShapePrice, OSEnum
+
+        with patch.object(ShapePrice, 'objects',
+                          wraps=ShapePrice.objects) as objects:
+            small = self.shape_price_service.get(
+                customer='test', name='t3.small', region='eu-central-1',
+                os=OSEnum.OS_LINUX.value)
+            medium = self.shape_price_service.get(
+                customer='test', name='t3.medium', region='eu-central-1',
+                os=OSEnum.OS_LINUX.value)
+            missing = self.shape_price_service.get(
+                customer='test', name='t3.large', region='eu-central-1',
+                os=OSEnum.OS_LINUX.value)
+            # prices of a customer, region and os are loaded once
+            self.assertEqual(objects.call_count, 1)
+
+        # DEFAULT price is used unless the customer has its own
+        self.assertEqual(small.on_demand, 0.024)
+        self.assertEqual(medium.on_demand, 0.04)
+        self.assertIsNone(missing)
+
+        west = self.shape_price_service.get_price_table(
+            customer='test', region='eu-west-1', os=OSEnum.OS_LINUX.value)
+        self.assertEqual({name: price.on_demand
+                          for name, price in west.items()},
+                         {'t3.medium': 0.046})
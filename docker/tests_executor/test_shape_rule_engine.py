@@ -0,0 +1,35 @@
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestShapeRuleEngine(BaseExecutorTest):
+    def test_shape_rule_engine(self):
+        from models.base_model import CloudEnum
+        from services.shape_rule_engine import CompiledShapeRule
+
+        shapes = list(self.shape_service.list(
+            cloud=CloudEnum.CLOUD_AWS.value))
+        rule = {'field': 'name', 'value': 'c6a.*', 'condition': 'match'}
+        compiled = CompiledShapeRule.from_rule(rule=rule)
+        # rules are compiled once and shared
+        self.assertIs(compiled, CompiledShapeRule.from_rule(rule=dict(rule)))
+        self.assertEqual(
+            [shape.name for shape in compiled.find_matching(shapes)],
+            [shape.name for shape in shapes
+             if shape.name.startswith('c6a.') and shape.name != 'c6a.'])
+
+        for condition, expected in (
+                ('contains', lambda value: 'graviton' in value.lower()),
+                ('not_contains', lambda value: 'graviton' not in value.lower()),
+                ('equal', lambda value: value.lower() == 'aws graviton')):
+            compiled = CompiledShapeRule.from_rule(rule={
+                'field': 'physical_processor', 'value': 'Graviton'
+                if condition != 'equal' else 'AWS Graviton',
+                'condition': condition})
+            self.assertEqual(
+                compiled.find_matching(shapes),
+                [shape for shape in shapes if shape.physical_processor
+                 and expected(shape.physical_processor)])
+
+        unknown = CompiledShapeRule.from_rule(rule={
+            'field': 'name', 'value': 'c5', 'condition': 'unknown'})
+        self.assertEqual(unknown.find_matching(shapes), [])
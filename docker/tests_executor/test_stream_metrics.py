@@ -0,0 +1,98 @@
+import os
+import shutil
+from datetime import date, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.utils import InMemoryS3Client
+
+
+class TestStreamMetrics(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        from services.storage_service import DATE_FORMAT
+
+        self.output_path = os.path.join(self.metrics_dir_root, 'stream')
+        self.folder = 'metrics/instance/customer/aws/TENANT/eu-central-1'
+        self.dates = [(date.today() - timedelta(days=days)).strftime(
+            DATE_FORMAT) for days in range(8)]
+        self.objects = {}
+        for date_str in self.dates:
+            self.objects[f'{self.folder}/{date_str}/meta_info.json'] = b'{}'
+            for instance_id in ('i-1', 'i-2', 'i-3', 'i-4'):
+                self.objects[f'{self.folder}/{date_str}/{instance_id}.csv'] \
+                    = f'{instance_id},{date_str}\n'.encode()
+        # a single daily file of the instance fails to download
+        self.failing_key = f'{self.folder}/{self.dates[3]}/i-3.csv'
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.output_path, ignore_errors=True)
+
+    def _stream(self, memory_limit_mb, buffer_size=1, slow_keys=()):
+        from services.metric_buffer import MemoryCeiling
+        from services.storage_service import StorageService
+
+        ceilings = []
+
+        class RecordingMemoryCeiling(MemoryCeiling):
+            def __init__(self, limit_bytes: int):
+                super().__init__(limit_bytes=limit_bytes)
+                ceilings.append(self)
+
+        storage_service = StorageService(s3_client=InMemoryS3Client(
+            objects=self.objects, failing_keys=[self.failing_key],
+            slow_keys=slow_keys))
+        data_source = SimpleNamespace(access=SimpleNamespace(
+            prefix='metrics', bucket_name='bucket'))
+        with patch('services.storage_service.MemoryCeiling',
+                   RecordingMemoryCeiling):
+            _, _, instance_files = storage_service._stream_metrics_s3(
+                data_source=data_source, output_path=self.output_path,
+                resource_type='INSTANCE', scan_customer='customer',
+                scan_clouds=['aws'], scan_tenants=['TENANT'], max_days=7,
+                buffer_size=buffer_size, memory_limit_mb=memory_limit_mb)
+            memory_ceiling, = ceilings
+            for instance_id, metric_files in instance_files:
+                yield instance_id, metric_files, memory_ceiling.used_bytes
+            self.assertEqual(memory_ceiling.used_bytes, 0)
+
+    def test_stream_metrics(self):
+        from services.metric_buffer import MetricBuffer
+
+        for memory_limit_mb in (0, 1):
+            instances = list(self._stream(memory_limit_mb=memory_limit_mb))
+            # instances are yielded in the order of their keys, the one
+            # with a failed download is skipped
+            self.assertEqual([item[0] for item in instances],
+                             ['i-1', 'i-2', 'i-4'])
+            for instance_id, metric_files, used_bytes in instances:
+                self.assertEqual(sorted(
+                    getattr(item, 'path', item).split('/')[-2]
+                    for item in metric_files), sorted(self.dates))
+                is_buffer = [isinstance(item, MetricBuffer)
+                             for item in metric_files]
+                # buffers of an instance are held until the next one
+                if memory_limit_mb:
+                    self.assertTrue(all(is_buffer))
+                    self.assertEqual(used_bytes, sum(
+                        item.size for item in metric_files))
+                else:
+                    self.assertFalse(any(is_buffer))
+                    self.assertEqual(used_bytes, 0)
+            # downloaded files of the skipped instance are removed
+            for date_str in self.dates:
+                folder = os.path.join(self.output_path,
+                                      self.folder.split('/', 1)[1], date_str)
+                self.assertTrue(os.path.isfile(
+                    os.path.join(folder, 'meta_info.json')))
+                self.assertFalse(os.path.exists(
+                    os.path.join(folder, 'i-3.csv')))
+            shutil.rmtree(self.output_path)
+
+        # the first instance downloads last, but it is still yielded first
+        slow_keys = [key for key in self.objects if key.endswith('i-1.csv')]
+        instances = list(self._stream(memory_limit_mb=1, buffer_size=4,
+                                      slow_keys=slow_keys))
+        self.assertEqual([item[0] for item in instances],
+                         ['i-1', 'i-2', 'i-4'])
@@ -0,0 +1,58 @@
+import datetime
+
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestTenantFeedbackMap(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        from models.recommendation_history import RecommendationHistory
+
+        self.tenant = 'feedback_tenant'
+        RecommendationHistory.objects(
+            tenant__in=[self.tenant, 'other_tenant']).delete()
+
+        now = datetime.datetime.utcnow()
+        for tenant, resource_id, recommendation_type, feedback_status in (
+                (self.tenant, 'instance-1', 'SCHEDULE', 'DONT_RECOMMEND'),
+                (self.tenant, 'instance-1', 'SCALE_DOWN', 'APPLIED'),
+                (self.tenant, 'instance-2', 'SHUTDOWN', 'WRONG'),
+                (self.tenant, 'instance-3', 'SCALE_UP', None),
+                ('other_tenant', 'instance-4', 'SCHEDULE', 'APPLIED')):
+            RecommendationHistory(
+                resource_id=resource_id,
+                resource_type='INSTANCE',
+                tenant=tenant,
+                job_id='job',
+                added_at=now,
+                recommendation_type=recommendation_type,
+                recommendation=[{'name': 't3.small'}],
+                current_instance_type='t3.medium',
+                feedback_status=feedback_status,
+                feedback_dt=now if feedback_status else None
+            ).save()
+
+    def test_tenant_feedback_map(self):
+        from services.recommendation_history_service import \
+            RecommendationHistoryService
+
+        feedback_map = self.recommendation_history_service. \
+            get_tenant_feedback_map(tenant=self.tenant)
+
+        # only the tenant recommendations with feedback are prefetched
+        self.assertEqual(set(feedback_map), {'instance-1', 'instance-2'})
+        self.assertEqual(
+            {item.recommendation_type.value
+             for item in feedback_map['instance-1']},
+            {'SCHEDULE', 'SCALE_DOWN'})
+
+        applied = RecommendationHistoryService.filter_applied(
+            recommendations=feedback_map['instance-1'])
+        self.assertEqual(len(applied), 1)
+        self.assertEqual(applied[0].recommendation, [{'name': 't3.small'}])
+        self.assertIsNotNone(applied[0].feedback_dt)
+        # fields unused by feedback adjustments are not loaded
+        self.assertIsNone(applied[0].current_instance_type)
+
+        self.assertTrue(RecommendationHistoryService.is_shutdown_forbidden(
+            recommendations=feedback_map['instance-2']))
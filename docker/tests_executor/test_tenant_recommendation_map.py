@@ -0,0 +1,48 @@
+import datetime
+
+from tests_executor.base_executor_test import BaseExecutorTest
+
+
+class TestTenantRecommendationMap(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        from models.recommendation_history import RecommendationHistory
+
+        self.tenant = 'recommendation_tenant'
+        RecommendationHistory.objects(tenant=self.tenant).delete()
+
+        now = datetime.datetime.utcnow()
+        for resource_id, job_id, minutes, recommendation_type in (
+                ('instance-1', 'job-2', 1, 'SCHEDULE'),
+                ('instance-1', 'job-2', 2, 'SCALE_DOWN'),
+                ('instance-1', 'job-1', 3, 'SCHEDULE'),
+                ('instance-2', 'job-1', 4, 'SHUTDOWN')):
+            RecommendationHistory(
+                resource_id=resource_id,
+                resource_type='INSTANCE',
+                tenant=self.tenant,
+                job_id=job_id,
+                added_at=now - datetime.timedelta(minutes=minutes),
+                recommendation_type=recommendation_type,
+                instance_meta={'resourceId': resource_id}
+            ).save()
+
+    def test_tenant_recommendation_map(self):
+        recommendations_map = self.recommendation_history_service. \
+            get_tenant_recommendation(tenant=self.tenant)
+
+        self.assertEqual(list(recommendations_map),
+                         ['instance-1', 'instance-2'])
+        # only the last job recommendations are kept, the most recent first
+        self.assertEqual(
+            [(item.job_id, item.recommendation_type.value)
+             for item in recommendations_map['instance-1']],
+            [('job-2', 'SCHEDULE'), ('job-2', 'SCALE_DOWN')])
+        # kept recommendations are loaded in full
+        self.assertEqual(recommendations_map['instance-2'][0].instance_meta,
+                         {'resourceId': 'instance-2'})
+
+        all_jobs_map = self.recommendation_history_service. \
+            get_tenant_recommendation(tenant=self.tenant,
+                                      filter_only_last_job=False)
+        self.assertEqual(len(all_jobs_map['instance-1']), 3)
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+
+from tests_executor.base_executor_test import BaseExecutorTest
+
+STEP_MINUTES_OPTIONS = [5, 10]
+
+
+def get_time_ranges_by_rows(df, step_minutes_options):
+    """
+    Row by row segmentation of the frame into periods of allowed steps
+    """
+    dfs_ = []
+    start, end, last = None, None, None
+    for timestamp in df.index:
+        if start is None:
+            start = timestamp
+        elif (timestamp - last).total_seconds() // 60 \
+                in step_minutes_options:
+            end = timestamp
+        elif end is not None:
+            dfs_.append(df[(df.index >= start) & (df.index <= end)])
+            start, end = timestamp, None
+        last = timestamp
+    if end is not None:
+        dfs_.append(df[(df.index >= start) & (df.index <= end)])
+
+    min_step = min(step_minutes_options)
+    for index, df_ in enumerate(dfs_):
+        if (df_.index[1] - df_.index[0]).seconds // 60 != min_step:
+            dfs_[index] = df_.asfreq(freq=f'{min_step}Min', method='ffill')
+    return dfs_
+
+
+class TestTimeRanges(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+        self.rng = np.random.default_rng(seed=8)
+
+    def _generate_df(self, steps):
+        index = pd.Timestamp('2023-01-02') + pd.to_timedelta(
+            np.concatenate(([0], np.cumsum(steps))), unit='min')
+        return pd.DataFrame({'cpu_load': self.rng.uniform(0, 100,
+                                                          len(index))},
+                            index=pd.DatetimeIndex(index, name='timestamp'))
+
+    def test_time_ranges(self):
+        # two runs of 5 minute steps split by a 47 minute gap, the row
+        # after the gap which starts a 30 minute gap is kept in the
+        # second period
+        df = self._generate_df(steps=[5, 5, 5, 47, 30, 5, 5, 10])
+        periods = self.metrics_service.get_time_ranges(
+            df=df.copy(), step_minutes_options=STEP_MINUTES_OPTIONS)
+        self.assertEqual(len(periods), 2)
+        pd.testing.assert_frame_equal(periods[0], df.iloc[0:4])
+        self.assertEqual(periods[1].index[0], df.index[4])
+        self.assertEqual(periods[1].index[-1], df.index[-1])
+        # period starting with a 30 minute step is filled with 5 minutes
+        self.assertTrue((np.diff(periods[1].index.asi8) ==
+                         5 * 60 * 10 ** 9).all())
+
+        self.assertEqual(self.metrics_service.get_time_ranges(
+            df=df.iloc[:1].copy(),
+            step_minutes_options=STEP_MINUTES_OPTIONS), [])
+
+        for _ in range(20):
+            steps = self.rng.choice([5, 5, 5, 5, 10, 10, 30, 47], size=500)
+            df = self._generate_df(steps=steps)
+            expected = get_time_ranges_by_rows(
+                df=df, step_minutes_options=STEP_MINUTES_OPTIONS)
+            # unsorted frame is sorted in place before the segmentation
+            shuffled = df.sample(frac=1, random_state=self.rng.integers(100))
+            periods = self.metrics_service.get_time_ranges(
+                df=shuffled, step_minutes_options=STEP_MINUTES_OPTIONS)
+
+            self.assertEqual(len(periods), len(expected))
+            for period, expected_period in zip(periods, expected):
+                pd.testing.assert_frame_equal(period, expected_period)
@@ -0,0 +1,96 @@
+import os
+from unittest.mock import patch
+
+import pandas as pd
+
+from commons.constants import ACTION_EMPTY
+from tests_executor.base_executor_test import BaseExecutorTest
+from tests_executor.constants import POINTS_IN_DAY
+from tests_executor.utils import (generate_constant_metric_series,
+                                  constant_to_series,
+                                  generate_timestamp_series, dateparse)
+
+
+class TestTimestampMilliseconds(BaseExecutorTest):
+    def setUp(self) -> None:
+        super().setUp()
+
+        self.instance_id = 'timestamp_milliseconds'
+
+        length = POINTS_IN_DAY * 14
+        instance_id_series = constant_to_series(
+            value=self.instance_id,
+            length=length
+        )
+        instance_type_series = constant_to_series(
+            value='t2.medium',
+            length=length
+        )
+        timestamp_series = generate_timestamp_series(length=length)
+        cpu_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=50,
+            scale=1,
+            size=length
+        )
+        memory_load_series = generate_constant_metric_series(
+            distribution='normal',
+            loc=60,
+            scale=0.8,
+            size=length
+        )
+        # absolute network output in bytes
+        net_output_load_series = constant_to_series(100 * 1024 * 1024,
+                                                    length)
+        avg_disk_iops = constant_to_series(-1, length)
+        max_disk_iops = constant_to_series(-1, length)
+        df_data = {
+            'instance_id': instance_id_series,
+            'instance_type': instance_type_series,
+            'timestamp': timestamp_series,
+            'cpu_load': cpu_load_series,
+            'memory_load': memory_load_series,
+            'net_output_load': net_output_load_series,
+            'avg_disk_iops': avg_disk_iops,
+            'max_disk_iops': max_disk_iops,
+        }
+        df = pd.DataFrame(df_data)
+        self.metrics_file_path = os.path.join(self.metrics_dir,
+                                              f'{self.instance_id}.csv')
+        df.to_csv(self.metrics_file_path, sep=',', index=False)
+        self.df = pd.read_csv(self.metrics_file_path, parse_dates=True,
+                              date_parser=dateparse, index_col='timestamp')
+
+        df['timestamp'] = df['timestamp'] * 1000
+        self.ms_metrics_file_path = os.path.join(
+            self.metrics_dir, f'{self.instance_id}_ms.csv')
+        df.to_csv(self.ms_metrics_file_path, sep=',', index=False)
+
+    @patch.dict(os.environ, {'KMP_DUPLICATE_LIB_OK': "TRUE"})
+    def test_timestamp_milliseconds(self):
+        df = self.metrics_service.read_metrics(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm)
+        ms_df = self.metrics_service.read_metrics(
+            metric_file_path=self.ms_metrics_file_path,
+            algorithm=self.algorithm)
+        pd.testing.assert_frame_equal(df, ms_df)
+        pd.testing.assert_index_equal(df.index, self.df.index)
+
+        metric_frame = self.metrics_service.read_metric_frame(
+            metric_file_path=self.ms_metrics_file_path,
+            algorithm=self.algorithm)
+        frame_df = self.metrics_service.index_by_timestamp(
+            df=metric_frame.df, algorithm=self.algorithm)
+        pd.testing.assert_frame_equal(df, frame_df)
+
+        result, _ = self.recommendation_service.process_instance(
+            metric_file_path=self.metrics_file_path,
+            algorithm=self.algorithm,
+            reports_dir=self.reports_path
+        )
+        self.assert_resource_id(
+            result=result,
+            resource_id=self.instance_id
+        )
+        self.assert_action(result=result, expected_actions=[ACTION_EMPTY])
@@ -1,9 +1,14 @@
+import hashlib
+import importlib
+import os
 import random
+import threading
 from datetime import datetime, timedelta, timezone
 from functools import wraps
 import time
 
 from pandas.tseries import offsets
+from pymongo import DeleteMany, UpdateOne
 
 from tests_executor.constants import DAYS_IN_WEEK, POINTS_IN_DAY
 from tests_executor.distributions import Distributions
@@ -100,3 +105,116 @@ def timeit(func):
             f'Took {total_time:.4f} seconds')
         return result
     return timeit_wrapper
+
+
+def replay_operations(collection, operations: list):
+    """
+    Applies bulk write operations one by one, mongomock does not accept
+    bulk updates of the pinned pymongo version
+    """
+    for operation in operations:
+        if isinstance(operation, DeleteMany):
+            collection.delete_many(operation._filter)
+        elif isinstance(operation, UpdateOne):
+            collection.update_one(operation._filter, operation._doc,
+                                  upsert=operation._upsert)
+        else:
+            raise TypeError(f'Unexpected operation: {operation}')
+
+
+def replay_operations_for(document_path: str):
+    """
+    Returns a side effect for a patched `_write_operations` of a service.
+    It replays the operations on the collection of the document class
+    given by its import path, e.g. 'models.job_journal.JobJournalItem',
+    the class is imported on the first write as the tests do with models.
+    """
+    module_name, class_name = document_path.rsplit('.', 1)
+
+    def _replay(operations: list):
+        document_cls = getattr(importlib.import_module(module_name),
+                               class_name)
+        replay_operations(collection=document_cls._get_collection(),
+                          operations=operations)
+    return _replay
+
+
+class InMemoryS3Client:
+    """
+    S3 client of tests keeping objects as {key: bytes} in memory. Downloads
+    of the failing keys raise ConnectionError, downloads of the slow keys
+    are delayed. Listed prefixes, downloaded keys and content encodings
+    of uploaded objects are recorded.
+    """
+    def __init__(self, objects: dict = None, failing_keys=(),
+                 slow_keys=(), delay: float = 0.2):
+        self.objects = {} if objects is None else objects
+        self.failing_keys = set(failing_keys)
+        self.slow_keys = set(slow_keys)
+        self.delay = delay
+        self.listed_prefixes = []
+        self.downloaded_keys = []
+        self.content_encodings = {}
+        self.lock = threading.Lock()
+
+    def list_objects(self, bucket_name, prefix=None):
+        self.listed_prefixes.append(prefix)
+        return [{'Key': key, 'Size': len(content)}
+                for key, content in sorted(self.objects.items())
+                if key.startswith(prefix or '')] or None
+
+    def list_common_prefixes(self, bucket_name, prefix=None, delimiter='/'):
+        prefix = prefix or ''
+        return sorted({
+            prefix + key[len(prefix):].split(delimiter)[0] + delimiter
+            for key in self.objects if key.startswith(prefix)
+            and delimiter in key[len(prefix):]})
+
+    def get_file_content(self, bucket_name, full_file_name, decode=False):
+        if full_file_name in self.failing_keys:
+            raise ConnectionError(f'Failed to download {full_file_name}')
+        if full_file_name in self.slow_keys:
+            time.sleep(self.delay)
+        with self.lock:
+            self.downloaded_keys.append(full_file_name)
+        return self.objects[full_file_name]
+
+    def download_file(self, bucket_name, full_file_name, output_folder_path):
+        content = self.get_file_content(bucket_name=bucket_name,
+                                        full_file_name=full_file_name)
+        file_path = os.path.join(output_folder_path,
+                                 full_file_name.split('/')[-1])
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return file_path
+
+    def download_changed_file(self, bucket_name, full_file_name, file_path,
+                              etag=None):
+        object_etag = hashlib.md5(self.objects[full_file_name]).hexdigest()
+        if etag == object_etag:
+            return False, etag
+        content = self.get_file_content(bucket_name=bucket_name,
+                                        full_file_name=full_file_name)
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return True, object_etag
+
+    def upload_file(self, bucket_name, object_name, file_path,
+                    content_encoding='utf-8'):
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        with self.lock:
+            self.objects[object_name] = content
+            self.content_encodings[object_name] = content_encoding
+
+
+def init_shapes_worker(initializer, initargs: tuple,
+                       aws_instances_data: list):
+    """
+    Initializer of executor worker processes in tests. Mocked database
+    of the test process is not shared with the workers, so shapes are
+    populated in each of them after the worker connection is opened.
+    """
+    initializer(*initargs)
+    from tests_executor.base_executor_test import BaseExecutorTest
+    BaseExecutorTest.populate_shapes(aws_instances_data=aws_instances_data)
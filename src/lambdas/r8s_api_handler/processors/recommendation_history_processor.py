@@ -7,7 +7,7 @@ from commons.log_helper import get_logger
 from lambdas.r8s_api_handler.processors.abstract_processor import \
     AbstractCommandProcessor
 from models.recommendation_history import RecommendationTypeEnum, \
-    FeedbackStatusEnum
+    FeedbackStatusEnum, RecommendationHistory
 from services.abstract_api_handler_lambda import PARAM_USER_CUSTOMER
 from services.recommendation_history_service import \
     RecommendationHistoryService
@@ -38,12 +38,12 @@ class RecommendationHistoryProcessor(AbstractCommandProcessor):
                 recommendation_type=recommendation_type)
 
         _LOG.debug(f'Searching for recommendations')
-        recommendations = self.recommendation_history_service.list(
+        recommendations = list(self.recommendation_history_service.list(
             customer=customer,
             resource_id=instance_id,
             recommendation_type=recommendation_type,
             job_id=job_id
-        )
+        ).as_pymongo())
 
         if not recommendations:
             _LOG.warning(f'No recommendation found matching given query.')
@@ -53,7 +53,7 @@ class RecommendationHistoryProcessor(AbstractCommandProcessor):
             )
 
         _LOG.debug(f'Describing recommendation dto')
-        response = [recommendation.get_dto()
+        response = [RecommendationHistory.get_raw_dto(document=recommendation)
                     for recommendation in recommendations]
 
         _LOG.debug(f'Response: {response}')
@@ -132,11 +132,11 @@ class ReportGenerator(AbstractLambda):
         processing_from_date, processing_to_date = \
             self.get_processing_date_range(processing_days)
 
-        recommendations = self.recommendation_service.list(
+        recommendations = list(self.recommendation_service.list(
             customer=customer.name,
             tenant=tenant.name,
             from_dt=processing_from_date
-        )
+        ).exclude('instance_meta'))
         if not recommendations:
             _LOG.error(f'No recommendations found '
                        f'for tenant \'{tenant.name}\'')
@@ -90,12 +90,18 @@ class RecommendationHistory(BaseModel):
     meta = {
         'indexes': [
             'resource_id',
-            'customer',
             ('resource_id', 'job_id'),
             {
                 'fields': ['resource_id', 'added_at', 'recommendation_type'],
                 'unique': True
             },
+            # recent recommendations and feedback of a resource
+            ('resource_id', 'resource_type', '-added_at'),
+            # past recommendations of a tenant
+            ('tenant', 'resource_type', '-added_at'),
+            # recommendations listing
+            ('customer', 'tenant', '-added_at'),
+            ('customer', 'job_id', 'recommendation_type', '-added_at'),
             {
                 'fields': ['added_at'],
                 'expireAfterSeconds': 3600 * 24 * 30 * 3  # 3 months
@@ -107,7 +113,23 @@ class RecommendationHistory(BaseModel):
 
     def get_dto(self):
         recommendation_dto = super(RecommendationHistory, self).get_dto()
+        return self._format_dates(recommendation_dto=recommendation_dto)
 
+    @classmethod
+    def get_raw_dto(cls, document: dict):
+        """
+        Dto of a raw document (queried with as_pymongo), built without
+        loading the document into the model
+        """
+        recommendation_dto = dict(document)
+        recommendation_dto['_id'] = str(recommendation_dto.pop('_id'))
+
+        for attr in cls.dto_skip_attrs:
+            recommendation_dto.pop(attr, None)
+        return cls._format_dates(recommendation_dto=recommendation_dto)
+
+    @staticmethod
+    def _format_dates(recommendation_dto: dict):
         dt_attributes = ('added_at', 'feedback_dt', 'last_metric_capture_date')
 
         for attribute_name in dt_attributes:
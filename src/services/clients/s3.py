@@ -1,3 +1,4 @@
+import gzip
 import json
 import os
 
@@ -11,6 +12,7 @@ from commons.constants import DOCKER_SERVICE_MODE, \
 from commons.log_helper import get_logger
 
 UTF_8_ENCODING = 'utf-8'
+GZIP_ENCODING = 'gzip'
 
 _LOG = get_logger('s3client')
 
@@ -132,17 +134,16 @@ class S3Client:
             Bucket=bucket_name,
             Key=full_file_name
         )
-        streaming_body = response.get('Body')
-        if streaming_body:
-            return json.loads(streaming_body.read())
+        body = self._read_body(response)
+        if body is not None:
+            return json.loads(body)
 
     def get_json_lines_file_content(self, bucket_name, full_file_name):
         response = self.client.get_object(
             Bucket=bucket_name,
             Key=full_file_name
         )
-        streaming_body = response.get('Body')
-        body = streaming_body.read()
+        body = self._read_body(response)
         lines = body.decode().split('\n')
         return [json.loads(line) for line in lines if line.strip()]
 
@@ -160,10 +161,24 @@ class S3Client:
             Bucket=bucket_name,
             Key=full_file_name
         )
-        streaming_body = response.get('Body')
+        body = self._read_body(response)
         if decode:
-            return streaming_body.read().decode(UTF_8_ENCODING)
-        return streaming_body.read()
+            return body.decode(UTF_8_ENCODING)
+        return body
+
+    @staticmethod
+    def _read_body(response):
+        """
+        Reads the object body, gzip-compressed objects
+        are decompressed transparently.
+        """
+        streaming_body = response.get('Body')
+        if not streaming_body:
+            return
+        body = streaming_body.read()
+        if response.get('ContentEncoding') == GZIP_ENCODING:
+            return gzip.decompress(body)
+        return body
 
     def put_object_encrypted(self, bucket_name, object_name, body):
         return self.client.put_object(
@@ -36,6 +36,11 @@ class RecommendationHistoryService:
              job_id: str = None, from_dt: datetime = None,
              to_dt: datetime = None,
              recommendation_type: str = None):
+        """
+        Recommendations matching the given filters. Returns a queryset,
+        callers narrow it down with only()/exclude() or read raw
+        documents with as_pymongo()
+        """
         query_params = {
             CUSTOMER_ATTR: customer,
             TENANT_ATTR: tenant,
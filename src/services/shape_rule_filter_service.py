@@ -1,37 +1,20 @@
-import re
 from typing import List
 
 from commons.constants import CLOUD_ATTR
 from commons.log_helper import get_logger
 from models.parent_attributes import LicensesParentMeta
 from models.shape import Shape
+from services.shape_rule_engine import CompiledShapeRule, ACTION_ATTR
 
 _LOG = get_logger('r8s-shape-rules-filter-service')
 
-FIELD_ATTR = 'field'
-VALUE_ATTR = 'value'
-ACTION_ATTR = 'action'
-CONDITION_ATTR = 'condition'
 ALLOW = 'allow'
 DENY = 'deny'
 PRIORITIZE = 'prioritize'
 
-CONDITION_MATCH = 'match'
-CONDITION_CONTAINS = 'contains'
-CONDITION_NOT_CONTAINS = 'not_contains'
-CONDITION_EQUAL = 'equal'
-
 
 class ShapeRulesFilterService:
 
-    def __init__(self):
-        self.condition_processor_mapping = {
-            CONDITION_MATCH: self._match_condition,
-            CONDITION_CONTAINS: self._contains_condition,
-            CONDITION_NOT_CONTAINS: self._not_contains_condition,
-            CONDITION_EQUAL: self._equal_condition,
-        }
-
     def get_allowed_instance_types(self, cloud: str,
                                    parent_meta: LicensesParentMeta,
                                    instances_data: List[Shape]):
@@ -99,56 +82,13 @@ class ShapeRulesFilterService:
             priority_instances.extend(matching_instances)
         return priority_instances
 
-    def _find_matching(self, instances_data, filter_):
-        matching_instances = []
-
-        for instance in instances_data:
-
-            matches = self._instance_match(
-                instance_data=instance,
-                filter_=filter_)
-            if matches:
-                matching_instances.append(instance)
-        return matching_instances
-
-    def _instance_match(self, instance_data, filter_):
-        filter_key = filter_.get(FIELD_ATTR)
-        filter_value = filter_.get(VALUE_ATTR)
-        instance_value = getattr(instance_data, filter_key, None)
-        condition = filter_.get(CONDITION_ATTR)
-
-        if not filter_value or not instance_value:
-            return False
-        processor = self.condition_processor_mapping.get(condition)
-        if not processor:
-            return False
-        return processor(instance_value=instance_value, value=filter_value)
+    @staticmethod
+    def _find_matching(instances_data, filter_):
+        return CompiledShapeRule.from_rule(rule=filter_).find_matching(
+            shapes=instances_data)
 
     @staticmethod
     def filter_by_action(shape_rules: list, action):
         if not shape_rules:
             return []
         return [f for f in shape_rules if f.get(ACTION_ATTR) == action]
-
-    @staticmethod
-    def _match_condition(instance_value: str, value: str):
-        value = value.replace('.', r'\.').replace('*', '.+')
-        return bool(re.match(value, instance_value))
-
-    @staticmethod
-    def _contains_condition(instance_value: str, value: str):
-        if not value or not isinstance(value, str):
-            return False
-        return value.lower() in instance_value.lower()
-
-    @staticmethod
-    def _not_contains_condition(instance_value: str, value: str):
-        if not value or not isinstance(value, str):
-            return False
-        return value.lower() not in instance_value.lower()
-
-    @staticmethod
-    def _equal_condition(instance_value: str, value: str):
-        if not value or not isinstance(value, str):
-            return False
-        return value.lower() == instance_value.lower()